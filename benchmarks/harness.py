@@ -0,0 +1,167 @@
+"""A small pytest-benchmark style runner.
+
+Each benchmark times a target over several rounds, after a warmup, and
+reports min/max/mean/stddev/median/IQR per call. Results are written in
+pytest-benchmark's JSON layout, so `pytest-benchmark compare` and other tools
+reading it work on them, and compare() checks a run against a saved one.
+"""
+import json
+import time
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# A round is repeated until it takes at least this long, so that fast targets
+# are not measured at the resolution of the clock
+MIN_ROUND_TIME = 0.005
+# Medians slower than the baseline by more than this fraction are regressions
+REGRESSION_THRESHOLD = 0.2
+
+def _commit_info(root: str) -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(['git', *args], cwd=root, capture_output=True, text=True).stdout.strip()
+    return {
+        'id': git('rev-parse', 'HEAD') or None,
+        'branch': git('rev-parse', '--abbrev-ref', 'HEAD') or None,
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+def _machine_info() -> Dict[str, Any]:
+    return {
+        'node': platform.node(),
+        'processor': platform.processor(),
+        'machine': platform.machine(),
+        'python_implementation': platform.python_implementation(),
+        'python_version': platform.python_version(),
+        'system': platform.system(),
+        'release': platform.release(),
+    }
+
+def _stats(timings: List[float], iterations: int) -> Dict[str, Any]:
+    """Statistics of per-call times, from the total time of each round."""
+    per_call = sorted(timing / iterations for timing in timings)
+    if len(per_call) > 1:
+        q1, _, q3 = statistics.quantiles(per_call, n=4)
+    else:
+        q1 = q3 = per_call[0]
+    mean = statistics.fmean(per_call)
+    return {
+        'min': per_call[0],
+        'max': per_call[-1],
+        'mean': mean,
+        'stddev': statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        'rounds': len(per_call),
+        'median': statistics.median(per_call),
+        'iqr': q3 - q1,
+        'q1': q1,
+        'q3': q3,
+        'iterations': iterations,
+        'ops': 1 / mean if mean else 0.0,
+        'total': sum(timings),
+    }
+
+class Runner:
+    """Collects the results of the benchmarks run through it."""
+
+    def __init__(self, root: str, only: Optional[List[str]] = None):
+        self.root = root
+        self.only = only
+        self.benchmarks: List[Dict[str, Any]] = []
+
+    def selected(self, name: str) -> bool:
+        return not self.only or any(pattern in name for pattern in self.only)
+
+    def __call__(self, group: str, name: str, target: Callable[[], Any], rounds: int = 20,
+                 warmup_rounds: int = 1, extra_info: Optional[Dict[str, Any]] = None) -> None:
+        """Time target, calling it as many times per round as needed for MIN_ROUND_TIME."""
+        if not self.selected(name):
+            return
+        for _ in range(warmup_rounds):
+            target()
+        iterations = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                target()
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_ROUND_TIME:
+                break
+            iterations *= 10 if elapsed < MIN_ROUND_TIME / 10 else 2
+        timings = [elapsed]
+        for _ in range(rounds - 1):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                target()
+            timings.append(time.perf_counter() - start)
+        self._record(group, name, timings, iterations, extra_info)
+
+    def pedantic(self, group: str, name: str, target: Callable[..., Any],
+                 setup: Optional[Callable[[], Any]] = None, rounds: int = 5,
+                 warmup_rounds: int = 0, extra_info: Optional[Dict[str, Any]] = None) -> None:
+        """Time one call of target per round, after an untimed setup.
+
+        Whatever setup returns is passed to target, as pytest-benchmark's
+        pedantic mode does with (args, kwargs).
+        """
+        if not self.selected(name):
+            return
+        timings = []
+        for round_number in range(warmup_rounds + rounds):
+            args = setup() if setup else None
+            start = time.perf_counter()
+            target(*args) if args is not None else target()
+            elapsed = time.perf_counter() - start
+            if round_number >= warmup_rounds:
+                timings.append(elapsed)
+        self._record(group, name, timings, 1, extra_info)
+
+    def _record(self, group: str, name: str, timings: List[float], iterations: int,
+                extra_info: Optional[Dict[str, Any]]) -> None:
+        stats = _stats(timings, iterations)
+        self.benchmarks.append({
+            'group': group,
+            'name': name,
+            'fullname': f'{group}::{name}',
+            'params': None,
+            'param': None,
+            'extra_info': extra_info or {},
+            'options': {'timer': 'perf_counter', 'min_round_time': MIN_ROUND_TIME},
+            'stats': stats,
+        })
+        print(f"{group + '::' + name:<56} median {stats['median'] * 1000:10.3f} ms  "
+              f"iqr {stats['iqr'] * 1000:9.3f} ms  ({stats['rounds']} x {iterations})", flush=True)
+
+    def results(self) -> Dict[str, Any]:
+        return {
+            'machine_info': _machine_info(),
+            'commit_info': _commit_info(self.root),
+            'benchmarks': self.benchmarks,
+            'datetime': datetime.now().isoformat(timespec='seconds'),
+            'version': 'news-aggr-benchmarks',
+        }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """Benchmarks whose median got slower than the baseline's by more than threshold.
+
+    Benchmarks run with other parameters (extra_info, e.g. a different row
+    count) than in the baseline are not compared.
+    """
+    previous = {benchmark['fullname']: benchmark for benchmark in baseline.get('benchmarks', [])}
+    regressions = []
+    for benchmark in results['benchmarks']:
+        match = previous.get(benchmark['fullname'])
+        if not match or match['extra_info'] != benchmark['extra_info'] or not match['stats']['median']:
+            continue
+        before = match['stats']
+        change = benchmark['stats']['median'] / before['median'] - 1
+        if change > threshold:
+            regressions.append({'name': benchmark['fullname'], 'baseline': before['median'],
+                                'median': benchmark['stats']['median'], 'change': change})
+    return regressions
+
+def write_results(results: Dict[str, Any], path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,326 @@
+"""Microbenchmarks of the hot paths.
+
+Runs offline: YouTube Data API calls are answered from recorded responses in
+benchmarks/fixtures, artefacts come from recorded LangGraph output, and
+publishing goes to a local bare repository. Covers:
+
+- normalize: parse_duration and format_datetime on API values
+- ingest: get_new_videos_from_youtuber payload processing, store_new_video
+  inserts and updates
+- query: get_videos filters and pagination on a seeded table (1M rows by default)
+- render: style_html on artefacts
+- publish: publish_artefacts_to_github with both backends, with and without changes
+
+    python benchmarks/hot_paths.py [--database-url URL] [--rows 1000000]
+                                   [--only NAME ...] [--output FILE] [--compare FILE]
+
+DATABASE_URL defaults to a SQLite file in the temp directory, which keeps the
+seeded rows between runs. The publish remote and repository caches are made
+afresh in a scratch directory for each run and removed after it. A local MySQL works too; point it at a scratch
+database, since tables are created and benchmark rows written there.
+Results are saved as JSON in pytest-benchmark's layout, under .benchmarks/
+unless --output is given; --compare exits with status 1 when a median is
+more than 20% slower than in the given results.
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+sys.path.insert(0, ROOT)
+
+from harness import Runner, compare, write_results, REGRESSION_THRESHOLD
+from standin import init_git_remote
+
+# Rows of the youtube_videos table queried by get_videos
+DEFAULT_ROWS = 1_000_000
+SEED_BATCH_SIZE = 10_000
+SEED_CHANNELS = 200
+# Videos stored per store_new_video round
+UPSERT_BATCH_SIZE = 500
+# Days of artefacts published per publish round
+PUBLISH_DAYS = 7
+# Prefixes and source of the rows written by the benchmarks
+SEED_PREFIX = 'seed-'
+UPSERT_PREFIX = 'bench-'
+ARTEFACT_SOURCE = 'benchmark'
+ARTEFACT_SOURCE_ID_BASE = 900_000_000
+
+RECORDED_CHANNEL_ID = 'UCcefcZRL2oaA_uBNeo5UOWg'
+
+def load_fixture(name: str) -> Any:
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return json.load(f)
+
+class RecordedResponse:
+    """The parts of requests.Response the services use."""
+
+    def __init__(self, text: str):
+        self.status_code = 200
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+@contextmanager
+def replay_youtube_api() -> Iterator[None]:
+    """Answer requests.get calls to the YouTube Data API with the recorded responses."""
+    import requests
+    recorded = {}
+    for endpoint in ('search', 'videos'):
+        with open(os.path.join(FIXTURES, f'youtube_{endpoint}.json'), encoding='utf-8') as f:
+            recorded[endpoint] = f.read()
+
+    def get(url, *args, **kwargs):
+        endpoint = urlparse(url).path.rsplit('/', 1)[-1]
+        if endpoint not in recorded:
+            raise RuntimeError(f"No recorded response for {url}")
+        return RecordedResponse(recorded[endpoint])
+
+    original = requests.get
+    requests.get = get
+    try:
+        yield
+    finally:
+        requests.get = original
+
+def configure(args: argparse.Namespace, workdir: str, scratch: str) -> None:
+    """Point the settings at the benchmark database and publish remote, before main is imported."""
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['YOUTUBE_API_KEY'] = 'recorded'
+    os.environ['GIT_PUBLISH_REPO'] = init_git_remote(os.path.join(scratch, 'publish-remote.git'))
+    for variable in ('GIT_AUTHOR_NAME', 'GIT_COMMITTER_NAME'):
+        os.environ.setdefault(variable, 'news-aggr benchmarks')
+    for variable in ('GIT_AUTHOR_EMAIL', 'GIT_COMMITTER_EMAIL'):
+        os.environ.setdefault(variable, 'benchmarks@localhost')
+
+def bench_normalize(runner: Runner) -> None:
+    from services.youtube_service import parse_duration
+    from utils.main import format_datetime
+    items = load_fixture('youtube_videos.json')['items']
+    durations = [item['contentDetails']['duration'] for item in items]
+    published = [item['snippet']['publishedAt'] for item in items]
+
+    runner('normalize', 'parse_duration', lambda: [parse_duration(value) for value in durations],
+           extra_info={'values': len(durations)})
+    runner('normalize', 'format_datetime', lambda: [format_datetime(value) for value in published],
+           extra_info={'values': len(published)})
+
+def _video_rows(videos: List[Dict[str, Any]], count: int, prefix: str) -> List[Dict[str, Any]]:
+    """count videos shaped like the processed fixture, under distinct ids."""
+    rows = []
+    for i in range(count):
+        video = dict(videos[i % len(videos)])
+        video['video_id'] = f'{prefix}{i:07d}'
+        video['url'] = f"https://www.youtube.com/watch?v={video['video_id']}"
+        video['published_at'] = datetime.strptime(video['published_at'], '%Y-%m-%d %H:%M:%S')
+        rows.append(video)
+    return rows
+
+def bench_ingest(runner: Runner) -> None:
+    from models import db, YoutubeVideo
+    from services.youtube_service import get_new_videos_from_youtuber, store_new_video
+
+    with replay_youtube_api():
+        runner('ingest', 'get_new_videos_from_youtuber',
+               lambda: get_new_videos_from_youtuber(RECORDED_CHANNEL_ID, '2024-11-01T00:00:00Z', '2024-12-01T00:00:00Z'))
+        videos = get_new_videos_from_youtuber(RECORDED_CHANNEL_ID, '2024-11-01T00:00:00Z', '2024-12-01T00:00:00Z')
+
+    def clear():
+        YoutubeVideo.query.filter(YoutubeVideo.video_id.like(f'{UPSERT_PREFIX}%')).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.expunge_all()
+
+    def new_videos():
+        clear()
+        return (_video_rows(videos, UPSERT_BATCH_SIZE, UPSERT_PREFIX),)
+
+    def existing_videos():
+        rows = _video_rows(videos, UPSERT_BATCH_SIZE, UPSERT_PREFIX)
+        if YoutubeVideo.query.filter(YoutubeVideo.video_id.like(f'{UPSERT_PREFIX}%')).count() < len(rows):
+            clear()
+            db.session.execute(YoutubeVideo.__table__.insert(), rows)
+            db.session.commit()
+        db.session.expunge_all()
+        for row in rows:
+            row['title'] += f' ({random.random():.6f})'
+        return (rows,)
+
+    store_all = lambda rows: [store_new_video(row) for row in rows]
+    info = {'videos': UPSERT_BATCH_SIZE}
+    runner.pedantic('ingest', 'store_new_video_insert', store_all, setup=new_videos, warmup_rounds=1, extra_info=info)
+    runner.pedantic('ingest', 'store_new_video_update', store_all, setup=existing_videos, warmup_rounds=1, extra_info=info)
+    clear()
+
+def seed_videos(rows: int) -> None:
+    """Fill youtube_videos with seeded rows up to the requested count. Kept between runs."""
+    from models import db, YoutubeVideo
+    existing = YoutubeVideo.query.filter(YoutubeVideo.video_id.like(f'{SEED_PREFIX}%')).count()
+    if existing >= rows:
+        return
+    print(f"Seeding youtube_videos from {existing} to {rows} rows...", flush=True)
+    rnd = random.Random(existing)
+    start = datetime(2023, 1, 1)
+    # Spread the rows over two years
+    step = timedelta(days=730) / rows
+    for batch_start in range(existing, rows, SEED_BATCH_SIZE):
+        batch = []
+        for i in range(batch_start, min(batch_start + SEED_BATCH_SIZE, rows)):
+            channel = i % SEED_CHANNELS
+            batch.append({
+                'title': f'Seeded video {i}',
+                'video_id': f'{SEED_PREFIX}{i:09d}',
+                'published_at': start + step * i,
+                'channel_title': f'Channel {channel}',
+                'channel_id': f'UCseed{channel:018d}',
+                'url': f'https://www.youtube.com/watch?v={SEED_PREFIX}{i:09d}',
+                'thumbnail_url': f'https://i.ytimg.com/vi/{SEED_PREFIX}{i:09d}/hqdefault.jpg',
+                'description': f'Description of seeded video {i}. ' * 3,
+                'formatted_transcript': None,
+                'tags': ['seed', f'channel-{channel}'],
+                'duration': rnd.randint(60, 3 * 3600),
+            })
+        db.session.execute(YoutubeVideo.__table__.insert(), batch)
+        db.session.commit()
+
+def bench_query(runner: Runner, rows: int) -> None:
+    from services.youtube_service import get_videos
+    cases = {
+        'get_videos_latest': {},
+        'get_videos_month': {'start_date': '2024-03-01', 'end_date': '2024-03-31'},
+        'get_videos_channel': {'channel_id': f'UCseed{7:018d}'},
+        'get_videos_duration': {'duration_min': 600, 'duration_max': 1800},
+        'get_videos_deep_offset': {'offset': rows // 2},
+        'get_videos_full_text': {'start_date': '2024-03-01', 'end_date': '2024-03-31', 'include_full_text': True},
+    }
+    # Seeding takes a while, so only when a query benchmark runs
+    if not any(runner.selected(name) for name in cases):
+        return
+    seed_videos(rows)
+    for name, kwargs in cases.items():
+        runner('query', name, lambda kwargs=kwargs: get_videos(**kwargs), rounds=5,
+               extra_info={'rows': rows, **{key: str(value) for key, value in kwargs.items()}})
+
+def bench_render(runner: Runner) -> None:
+    from utils.md2html import style_html
+    artefacts = load_fixture('langgraph_artefacts.json')
+    runner('render', 'style_html', lambda: [style_html(artefact['full_text']) for artefact in artefacts],
+           rounds=10, extra_info={'artefacts': len(artefacts)})
+
+def seed_artefacts() -> List[datetime]:
+    """Store the recorded artefacts, rendered, under each of PUBLISH_DAYS days."""
+    from models import db, Artefact
+    from utils.main import content_hash
+    from utils.md2html import style_html, RENDERER_VERSION
+    Artefact.query.filter_by(source=ARTEFACT_SOURCE).delete(synchronize_session=False)
+    recorded = load_fixture('langgraph_artefacts.json')
+    rendered = [str(style_html(artefact['full_text'])) for artefact in recorded]
+    days = [datetime(2024, 11, 1) + timedelta(days=day) for day in range(PUBLISH_DAYS)]
+    for day_number, day in enumerate(days):
+        for i, artefact in enumerate(recorded):
+            db.session.add(Artefact(
+                title=artefact['title'], source=ARTEFACT_SOURCE,
+                source_id=ARTEFACT_SOURCE_ID_BASE + day_number * len(recorded) + i,
+                full_text=artefact['full_text'], html=rendered[i],
+                full_text_hash=content_hash(artefact['full_text']), renderer_version=RENDERER_VERSION,
+                published_at=day + timedelta(hours=i)
+            ))
+    db.session.commit()
+    return days
+
+def bench_publish(runner: Runner, scratch: str) -> None:
+    from models import db, Artefact
+    from services.publisher_service import publish_artefacts_to_github
+    backends = ('worktree', 'tree')
+    if not any(runner.selected(f'publish_{backend}_{case}') for backend in backends for case in ('changed', 'unchanged')):
+        return
+    days = seed_artefacts()
+
+    def change_html():
+        # A new revision of every artefact, so each round commits and pushes
+        marker = f'<!-- {random.random():.9f} -->'
+        for artefact in Artefact.query.filter_by(source=ARTEFACT_SOURCE).all():
+            artefact.html = artefact.html.split('<!--')[0] + marker
+        db.session.commit()
+        db.session.expunge_all()
+
+    for backend in backends:
+        repo_path = os.path.join(scratch, f'publish-cache-{backend}')
+        publish = lambda backend=backend, repo_path=repo_path: publish_artefacts_to_github(
+            days[0], repo_path=repo_path, end_date=days[-1], backend=backend)
+        info = {'backend': backend, 'days': len(days), 'artefacts': Artefact.query.filter_by(source=ARTEFACT_SOURCE).count()}
+        # The first round clones the repository cache
+        runner.pedantic('publish', f'publish_{backend}_changed', publish, setup=change_html,
+                        rounds=5, warmup_rounds=1, extra_info=info)
+        runner.pedantic('publish', f'publish_{backend}_unchanged', publish, rounds=5, warmup_rounds=1, extra_info=info)
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = os.path.join(tempfile.gettempdir(), 'news-aggr-benchmarks')
+    os.makedirs(workdir, exist_ok=True)
+    # Publish caches left by an earlier run, possibly by an older version, are not reused
+    scratch = tempfile.mkdtemp(prefix='news-aggr-benchmarks-')
+    try:
+        configure(args, workdir, scratch)
+
+        import logging
+        from main import app
+        from models import db
+        from models.db import create_tables
+        app.logger.setLevel(logging.WARNING)
+
+        runner = Runner(ROOT, args.only)
+        with app.app_context():
+            create_tables()
+            bench_normalize(runner)
+            bench_ingest(runner)
+            bench_query(runner, args.rows)
+            bench_render(runner)
+            bench_publish(runner, scratch)
+            db.session.remove()
+        return runner.results()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to a SQLite file in the temp directory')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='rows seeded for the get_videos benchmarks')
+    parser.add_argument('--only', nargs='+', help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='results of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='slowdown of the median counted as a regression, as a fraction')
+    args = parser.parse_args()
+
+    results = run(args)
+
+    output = args.output
+    if not output:
+        commit = (results['commit_info']['id'] or 'nocommit')[:8]
+        output = os.path.join(ROOT, '.benchmarks', f"hot_paths-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    write_results(results, output)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']}: {regression['baseline'] * 1000:.3f} ms -> "
+                  f"{regression['median'] * 1000:.3f} ms (+{regression['change']:.0%})")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
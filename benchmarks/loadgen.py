@@ -0,0 +1,218 @@
+"""Open-loop load generator for the app's endpoints.
+
+Sends requests at a fixed target rate (or with Poisson arrivals), drawn from a
+weighted mix of scenarios, whatever the latency of earlier ones. Latency is
+measured from when a request was due rather than when it was sent, so a
+saturated server shows up in the tail instead of lowering the offered load.
+Reports throughput and p50/p90/p99/p99.9 latency per scenario and overall.
+
+Run the app against benchmarks/standin.py, then e.g.:
+
+    python benchmarks/loadgen.py --url http://127.0.0.1:5000 --rps 50 --duration 60 \\
+        --mix videos=10,channel=3,notify=2,new_videos=1 --standin http://127.0.0.1:8950
+
+Before the run, it creates PRIMED_CHANNELS channels through /youtube/channel/find
+and ingests their videos, so scenarios that need ids have some.
+"""
+import sys
+import json
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+PRIMED_CHANNELS = 5
+DEFAULT_MIX = 'videos=10,channel=3,notify=2,find_channel=1,new_videos=1'
+DEFAULT_TIMEOUT = 120
+PERCENTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99, 'p99.9': 0.999}
+
+def _today() -> str:
+    return datetime.utcnow().strftime('%Y-%m-%d')
+
+# Each scenario returns (method, path, json body) for a request
+SCENARIOS = {
+    'root': lambda ctx, rnd: ('GET', '/', None),
+    'videos': lambda ctx, rnd: ('GET', f'/youtube/videos?limit=50&offset={rnd.randrange(0, 500, 50)}', None),
+    'videos_filtered': lambda ctx, rnd: (
+        'GET', f"/youtube/videos?start_date={_today()}&end_date={_today()}&channel_id={rnd.choice(ctx['channel_ids'])}", None),
+    'channel': lambda ctx, rnd: ('GET', f"/youtube/channel/{rnd.choice(ctx['channel_ids'])}", None),
+    'find_channel': lambda ctx, rnd: ('GET', f"/youtube/channel/find/standin{rnd.randrange(1000)}", None),
+    'new_videos': lambda ctx, rnd: ('POST', f"/youtube/new_videos?prev=0&handle={rnd.choice(ctx['handles'])}", {}),
+    'batch_transcribe': lambda ctx, rnd: ('GET', '/youtube/batch_transcribe?limit=2', None),
+    'artefact': lambda ctx, rnd: (
+        'POST', '/artefact/', {'source': 'youtube_videos', 'source_id': rnd.choice(ctx['video_ids']), 'update': True}),
+    'publish': lambda ctx, rnd: ('POST', '/publisher/publish', {'start_date': _today(), 'backend': 'tree'}),
+    'notify': lambda ctx, rnd: ('GET', f"/?notify={ctx['standin']}/feishu/hook", None),
+    'metrics': lambda ctx, rnd: ('GET', '/metrics', None),
+}
+
+# Ids a scenario picks from, collected by prime()
+REQUIRES = {'videos_filtered': 'channel_ids', 'channel': 'channel_ids', 'new_videos': 'handles', 'artefact': 'video_ids'}
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name}; one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+async def prime(session, url: str) -> Dict[str, Any]:
+    """Create channels and ingest their videos, and collect ids for the scenarios."""
+    ctx: Dict[str, Any] = {'channel_ids': [], 'handles': [], 'video_ids': []}
+    for i in range(PRIMED_CHANNELS):
+        async with session.get(f'{url}/youtube/channel/find/standin{i}') as response:
+            if response.status < 300:
+                channel = await response.json()
+                ctx['channel_ids'].append(channel['channel_id'])
+                ctx['handles'].append(channel['handle'])
+    for handle in ctx['handles']:
+        async with session.post(f'{url}/youtube/new_videos?prev=0&handle={handle}', json={}) as response:
+            await response.read()
+    async with session.get(f'{url}/youtube/videos?limit=500') as response:
+        if response.status < 300:
+            ctx['video_ids'] = [video['id'] for video in (await response.json())['videos']]
+    return ctx
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+def summarize(samples: List[Tuple[str, Any, float]], elapsed: float) -> Dict[str, Any]:
+    """Throughput, errors and latency percentiles of (scenario, status, seconds) samples."""
+    def stats(rows):
+        latencies = sorted(latency for _, status, latency in rows if status != 'dropped')
+        ok = sum(1 for _, status, _ in rows if isinstance(status, int) and status < 400)
+        statuses: Dict[str, int] = {}
+        for _, status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'requests': len(rows),
+            'ok': ok,
+            'error_rate': round(1 - ok / len(rows), 4) if rows else 0.0,
+            'throughput_rps': round(ok / elapsed, 2) if elapsed else 0.0,
+            'statuses': statuses,
+            'latency_ms': {
+                **{name: round(_percentile(latencies, p) * 1000, 1) for name, p in PERCENTILES.items() if latencies},
+                'mean': round(statistics.fmean(latencies) * 1000, 1) if latencies else None,
+                'max': round(latencies[-1] * 1000, 1) if latencies else None,
+            },
+        }
+    by_scenario: Dict[str, List] = {}
+    for sample in samples:
+        by_scenario.setdefault(sample[0], []).append(sample)
+    return {'overall': stats(samples), 'scenarios': {name: stats(rows) for name, rows in sorted(by_scenario.items())}}
+
+async def run_load(url: str, rps: float, duration: float, weights: Dict[str, float], standin: str,
+                   warmup: float = 0.0, poisson: bool = False, max_in_flight: int = 1000,
+                   timeout: float = DEFAULT_TIMEOUT, seed: int = 0) -> Dict[str, Any]:
+    import aiohttp
+    rnd = random.Random(seed)
+    names, scenario_weights = list(weights), list(weights.values())
+    samples: List[Tuple[str, Any, float]] = []
+    send_lag: List[float] = []
+    in_flight: set = set()
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        ctx = await prime(session, url)
+        ctx['standin'] = standin
+        for name in names:
+            if name in REQUIRES and not ctx[REQUIRES[name]]:
+                raise RuntimeError(f"Priming found no {REQUIRES[name]} for the {name} scenario; is the app using the stand-in?")
+        loop = asyncio.get_running_loop()
+
+        async def send(name: str, due: float, record: bool):
+            method, path, body = SCENARIOS[name](ctx, rnd)
+            send_lag.append(loop.time() - due)
+            try:
+                async with session.request(method, url + path, json=body) as response:
+                    await response.read()
+                    status: Any = response.status
+            except asyncio.TimeoutError:
+                status = 'timeout'
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            if record:
+                samples.append((name, status, loop.time() - due))
+
+        start = loop.time()
+        end = start + warmup + duration
+        due = start
+        while due < end:
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = rnd.choices(names, scenario_weights)[0]
+            record = due >= start + warmup
+            if len(in_flight) >= max_in_flight:
+                if record:
+                    samples.append((name, 'dropped', 0.0))
+            else:
+                task = asyncio.create_task(send(name, due, record))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            due += rnd.expovariate(rps) if poisson else 1 / rps
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        elapsed = loop.time() - start - warmup
+
+    results = summarize(samples, elapsed)
+    results.update({
+        'target_rps': rps,
+        'offered_rps': round(len(samples) / duration, 2) if duration else 0.0,
+        'duration_s': duration,
+        'elapsed_s': round(elapsed, 2),
+        # How late requests went out; large values mean this client could not keep up
+        'send_lag_ms': {'p99': round(_percentile(sorted(send_lag), 0.99) * 1000, 1) if send_lag else None},
+        'mix': weights,
+    })
+    return results
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"target {results['target_rps']} rps, offered {results['offered_rps']} rps over {results['duration_s']}s "
+          f"(send lag p99 {results['send_lag_ms']['p99']} ms)")
+    header = f"{'scenario':<18}{'requests':>9}{'ok rps':>9}{'errors':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'p99.9':>9}{'max':>9}"
+    print(header)
+    rows = list(results['scenarios'].items()) + [('overall', results['overall'])]
+    for name, stats in rows:
+        latency = stats['latency_ms']
+        cell = lambda key: f"{latency[key]:>9.0f}" if latency.get(key) is not None else f"{'-':>9}"
+        print(f"{name:<18}{stats['requests']:>9}{stats['throughput_rps']:>9.1f}{stats['error_rate']:>8.1%}"
+              f"{cell('p50')}{cell('p90')}{cell('p99')}{cell('p99.9')}{cell('max')}")
+    failures = {status: count for status, count in results['overall']['statuses'].items()
+                if not (status.isdigit() and int(status) < 400)}
+    if failures:
+        print(f"failures: {failures}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='base URL of the app')
+    parser.add_argument('--rps', type=float, required=True, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds measured')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of load before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"weighted scenarios, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--standin', default='http://127.0.0.1:8950', help='base URL of benchmarks/standin.py')
+    parser.add_argument('--poisson', action='store_true', help='exponential inter-arrival times instead of a fixed rate')
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='requests beyond this are dropped')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds per request')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load(args.url.rstrip('/'), args.rps, args.duration, parse_mix(args.mix),
+                                   args.standin.rstrip('/'), args.warmup, args.poisson, args.max_in_flight,
+                                   args.timeout, args.seed))
+    results['timestamp'] = datetime.now().isoformat(timespec='seconds')
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if results['overall']['ok'] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Stand-in for the external services, for local load tests.
+
+One aiohttp server fakes everything the app calls:
+
+- the YouTube Data API: /youtube/v3/search, videos, channels and playlistItems
+- the transcription service: GET /transcribe (YT_DLP_HOST)
+- the LangGraph service: POST /process (WPA_LANGGRAPH_HOST)
+- Feishu webhooks: POST /feishu/<anything>, as the app's ?notify= URL
+- GitHub: a local bare repository, whose pre-receive hook adds push latency and rejections
+
+Each of them has a latency distribution (lognormal, from a p50 and a p99),
+an error rate and payload sizes, set in PROFILES and overridable with
+--profile FILE (JSON of the same shape) or --set name.field=value. The
+profiles can also be changed while running with POST /_standin/profile, and
+GET /_standin/stats counts the calls served.
+
+    python benchmarks/standin.py [--port 8950] [--latency-scale 1.0] [--set yt_dlp.error_rate=0.1]
+
+On start it prints the environment to run the app against it.
+"""
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import argparse
+import asyncio
+import subprocess
+import tempfile
+from copy import deepcopy
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+# p50/p99 latencies in milliseconds, error rates as fractions, sizes in items or characters
+PROFILES: Dict[str, Dict[str, Any]] = {
+    'youtube.search': {'p50_ms': 120, 'p99_ms': 600, 'error_rate': 0.0, 'error_status': 403, 'items': 10},
+    'youtube.videos': {'p50_ms': 100, 'p99_ms': 500, 'error_rate': 0.0, 'error_status': 500, 'description_chars': 1500},
+    'youtube.channels': {'p50_ms': 80, 'p99_ms': 400, 'error_rate': 0.0, 'error_status': 500},
+    'youtube.playlistItems': {'p50_ms': 80, 'p99_ms': 400, 'error_rate': 0.0, 'error_status': 500, 'items': 50},
+    'yt_dlp': {'p50_ms': 8000, 'p99_ms': 45000, 'error_rate': 0.02, 'error_status': 500, 'transcript_chars': 30000},
+    'langgraph': {'p50_ms': 20000, 'p99_ms': 90000, 'error_rate': 0.02, 'error_status': 500, 'text_chars': 6000},
+    # Feishu answers errors with HTTP 200 and a non-zero code
+    'feishu': {'p50_ms': 60, 'p99_ms': 300, 'error_rate': 0.01, 'error_status': 200},
+    'git': {'p50_ms': 400, 'p99_ms': 2000, 'error_rate': 0.0},
+}
+# z-score of the 99th percentile of a normal distribution
+Z_99 = 2.326
+DEFAULT_PORT = 8950
+DEFAULT_GIT_REPO = os.path.join(tempfile.gettempdir(), 'news-aggr-standin.git')
+
+WORDS = ("the future of ai agents startups founders product market fit scaling compute inference models "
+         "reasoning open source infrastructure developer tools robotics energy distribution hiring growth").split()
+
+def sample_latency(profile: Dict[str, Any], scale: float = 1.0) -> float:
+    """A latency in seconds from the lognormal distribution with the profile's p50 and p99."""
+    p50, p99 = profile.get('p50_ms', 0), profile.get('p99_ms', 0)
+    if p50 <= 0:
+        return 0.0
+    sigma = max(0.0, math.log(max(p99, p50) / p50) / Z_99)
+    return random.lognormvariate(math.log(p50), sigma) / 1000 * scale
+
+def load_profiles(path: Optional[str], overrides: list) -> Dict[str, Dict[str, Any]]:
+    profiles = deepcopy(PROFILES)
+    if path:
+        with open(path) as f:
+            for name, values in json.load(f).items():
+                profiles.setdefault(name, {}).update(values)
+    for override in overrides:
+        key, value = override.split('=', 1)
+        name, field = key.rsplit('.', 1)
+        if name not in profiles:
+            raise ValueError(f"Unknown profile {name}; one of {', '.join(profiles)}")
+        profiles[name][field] = json.loads(value)
+    return profiles
+
+def init_git_remote(path: str, profile_path: Optional[str] = None) -> str:
+    """A bare repository with one commit. With a profile file, pushes go through its git profile."""
+    if not os.path.exists(os.path.join(path, 'HEAD')):
+        work = path + '-init'
+        git = lambda *args, cwd=None: subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+        git('init', '--bare', '--initial-branch=main', path)
+        git('init', '--initial-branch=main', work)
+        with open(os.path.join(work, 'README.md'), 'w') as f:
+            f.write('# Published artefacts\n')
+        git('add', 'README.md', cwd=work)
+        git('-c', 'user.name=standin', '-c', 'user.email=standin@localhost', 'commit', '-m', 'Initial commit', cwd=work)
+        git('push', path, 'main', cwd=work)
+        subprocess.run(['rm', '-rf', work], check=True)
+    if not profile_path:
+        return path
+    hook = os.path.join(path, 'hooks', 'pre-receive')
+    with open(hook, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" git-hook "{profile_path}"\n')
+    os.chmod(hook, 0o755)
+    return path
+
+def git_hook(profile_path: str) -> int:
+    """pre-receive hook: wait like a remote would, and sometimes reject the push."""
+    with open(profile_path) as f:
+        state = json.load(f)
+    profile = state['profiles']['git']
+    time.sleep(sample_latency(profile, state['latency_scale']))
+    if random.random() < profile.get('error_rate', 0):
+        print("stand-in: push rejected", file=sys.stderr)
+        return 1
+    return 0
+
+class StandIn:
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], latency_scale: float, profile_path: str):
+        self.profiles = profiles
+        self.latency_scale = latency_scale
+        self.profile_path = profile_path
+        self.stats: Dict[str, Dict[str, int]] = {}
+        rnd = random.Random(46)
+        # Payload text is sliced from one block instead of generated per call
+        self.text = ' '.join(rnd.choice(WORDS) for _ in range(100_000))
+        self.save_profiles()
+
+    def save_profiles(self):
+        # Read by the git hook on every push
+        with open(self.profile_path, 'w') as f:
+            json.dump({'profiles': self.profiles, 'latency_scale': self.latency_scale}, f)
+
+    def text_for(self, key: str, length: int) -> str:
+        start = zlib.crc32(key.encode()) % (len(self.text) - length) if length < len(self.text) else 0
+        return self.text[start:start + length]
+
+    async def serve(self, name: str, request, respond):
+        """Wait the profile's latency, then answer with an error or with respond()."""
+        from aiohttp import web
+        profile = self.profiles[name]
+        counts = self.stats.setdefault(name, {'requests': 0, 'errors': 0})
+        counts['requests'] += 1
+        await asyncio.sleep(sample_latency(profile, self.latency_scale))
+        if random.random() < profile.get('error_rate', 0):
+            counts['errors'] += 1
+            if name == 'feishu':
+                return web.json_response({'code': 11232, 'msg': 'frequency limited', 'data': {}})
+            return web.json_response({'error': {'code': profile.get('error_status', 500), 'message': 'stand-in error'}},
+                                     status=profile.get('error_status', 500))
+        return web.json_response(await respond(profile))
+
+    def video_item(self, video_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        rnd = random.Random(zlib.crc32(video_id.encode()))
+        # Published today, so that date-range ingestion finds them
+        published = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(seconds=rnd.randint(0, 86399))
+        # About a quarter are shorts, which the app skips
+        seconds = rnd.randint(15, 59) if rnd.random() < 0.25 else rnd.randint(180, 3 * 3600)
+        duration = f"PT{seconds // 3600}H{seconds % 3600 // 60}M{seconds % 60}S"
+        thumbnails = {size: {'url': f'https://i.ytimg.com/vi/{video_id}/{size}.jpg'} for size in ('default', 'high', 'maxres')}
+        return {
+            'kind': 'youtube#video', 'id': video_id,
+            'snippet': {
+                'publishedAt': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'channelId': 'UCstandin', 'channelTitle': 'Stand-in channel',
+                'title': self.text_for(video_id, 60).strip().capitalize(),
+                'description': self.text_for(video_id + 'd', profile.get('description_chars', 1500)),
+                'thumbnails': thumbnails, 'tags': rnd.sample(WORDS, rnd.randint(0, 8)),
+                'defaultAudioLanguage': 'en',
+            },
+            'contentDetails': {'duration': duration},
+        }
+
+    def routes(self):
+        from aiohttp import web
+
+        async def search(request):
+            async def respond(profile):
+                key = f"{request.query.get('channelId')}{request.query.get('publishedAfter')}"
+                ids = [f"{zlib.crc32(f'{key}{i}'.encode()):011x}"[:11] for i in range(profile.get('items', 10))]
+                return {'kind': 'youtube#searchListResponse',
+                        'items': [{'id': {'kind': 'youtube#video', 'videoId': video_id}, 'snippet': {}} for video_id in ids]}
+            return await self.serve('youtube.search', request, respond)
+
+        async def videos(request):
+            async def respond(profile):
+                ids = [video_id for video_id in request.query.get('id', '').split(',') if video_id]
+                return {'kind': 'youtube#videoListResponse', 'items': [self.video_item(video_id, profile) for video_id in ids]}
+            return await self.serve('youtube.videos', request, respond)
+
+        async def channels(request):
+            async def respond(profile):
+                handle = request.query.get('forHandle') or request.query.get('id') or '@standin'
+                return {'kind': 'youtube#channelListResponse', 'items': [{
+                    'id': f"UC{zlib.crc32(handle.encode()):022d}",
+                    'snippet': {'title': handle.lstrip('@'), 'description': self.text_for(handle, 300),
+                                'customUrl': handle if handle.startswith('@') else f'@{handle}',
+                                'publishedAt': '2015-06-01T00:00:00Z',
+                                'thumbnails': {'default': {'url': 'https://yt3.ggpht.com/standin.jpg'}}}
+                }]}
+            return await self.serve('youtube.channels', request, respond)
+
+        async def playlist_items(request):
+            async def respond(profile):
+                key = request.query.get('playlistId', '')
+                return {'kind': 'youtube#playlistItemListResponse', 'items': [
+                    {'snippet': {'resourceId': {'kind': 'youtube#video', 'videoId': f"{zlib.crc32(f'{key}{i}'.encode()):011x}"[:11]}}}
+                    for i in range(profile.get('items', 50))
+                ]}
+            return await self.serve('youtube.playlistItems', request, respond)
+
+        async def transcribe(request):
+            async def respond(profile):
+                url = request.query.get('url', '')
+                return {'download_url': f'https://example.invalid/audio/{zlib.crc32(url.encode())}.m4a',
+                        'formatted_transcript': self.text_for(url, profile.get('transcript_chars', 30000))}
+            return await self.serve('yt_dlp', request, respond)
+
+        async def process(request):
+            body = await request.json()
+            async def respond(profile):
+                title = body.get('metadata', {}).get('title') or 'Stand-in artefact'
+                text = self.text_for(title, profile.get('text_chars', 6000))
+                paragraphs = [text[i:i + 400] for i in range(0, len(text), 400)]
+                full_text = '\n\n'.join([f"# {title}", "## 亮点", '\n'.join(f"- {p[:80]}" for p in paragraphs[:5]),
+                                         "## 摘要", *paragraphs[5:8], "## 详细对话", *paragraphs[8:]])
+                return {'title': title, 'full_text': full_text}
+            return await self.serve('langgraph', request, respond)
+
+        async def feishu(request):
+            await request.read()
+            async def respond(profile):
+                return {'code': 0, 'msg': 'success', 'data': {}}
+            return await self.serve('feishu', request, respond)
+
+        async def stats(request):
+            return web.json_response(self.stats)
+
+        async def update_profile(request):
+            for name, values in (await request.json()).items():
+                self.profiles.setdefault(name, {}).update(values)
+            self.save_profiles()
+            return web.json_response(self.profiles)
+
+        return [
+            web.get('/youtube/v3/search', search),
+            web.get('/youtube/v3/videos', videos),
+            web.get('/youtube/v3/channels', channels),
+            web.get('/youtube/v3/playlistItems', playlist_items),
+            web.get('/transcribe', transcribe),
+            web.post('/process', process),
+            web.post('/feishu/{path:.*}', feishu),
+            web.get('/_standin/stats', stats),
+            web.post('/_standin/profile', update_profile),
+        ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', default='serve', choices=('serve', 'git-hook'))
+    parser.add_argument('hook_profile', nargs='?', help=argparse.SUPPRESS)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--profile', help='JSON file overriding PROFILES')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME.FIELD=VALUE',
+                        help='override one profile value, e.g. yt_dlp.p50_ms=500')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='multiply every latency, e.g. 0.01')
+    parser.add_argument('--git-repo', default=DEFAULT_GIT_REPO, help='bare repository standing in for GitHub')
+    args = parser.parse_args()
+
+    if args.command == 'git-hook':
+        sys.exit(git_hook(args.hook_profile))
+
+    from aiohttp import web
+    profile_path = os.path.join(os.path.dirname(os.path.abspath(args.git_repo)), 'news-aggr-standin-profile.json')
+    standin = StandIn(load_profiles(args.profile, args.set), args.latency_scale, profile_path)
+    git_repo = init_git_remote(os.path.abspath(args.git_repo), profile_path)
+
+    base = f'http://{args.host}:{args.port}'
+    print("Run the app against the stand-in with:")
+    print(f"  export YOUTUBE_API_HOST={base} YOUTUBE_API_KEY=standin")
+    print(f"  export YT_DLP_HOST={base} WPA_LANGGRAPH_HOST={base}")
+    print(f"  export GIT_PUBLISH_REPO={git_repo}")
+    print(f"and pass ?notify={base}/feishu/hook for webhooks.", flush=True)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.add_routes(standin.routes())
+    web.run_app(app, host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == '__main__':
+    main()
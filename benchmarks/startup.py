@@ -0,0 +1,132 @@
+"""Startup time benchmark.
+
+Measures how long `import main` takes, with a per-package breakdown from
+`python -X importtime`, and the time from launching gunicorn to the first
+successful response. Both are checked against a budget; the script exits
+with status 1 when either is over.
+
+    python benchmarks/startup.py [--runs 5] [--output startup.json]
+
+DATABASE_URL defaults to an in-memory SQLite database, so no service needs
+to be running.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets in milliseconds, overridable with --import-budget / --first-request-budget
+IMPORT_BUDGET_MS = 1000
+FIRST_REQUEST_BUDGET_MS = 3000
+# Packages listed in the breakdown
+BREAKDOWN_SIZE = 15
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    return env
+
+def measure_import() -> Tuple[float, Dict[str, float]]:
+    """Import main in a fresh interpreter.
+
+    Returns:
+        The cumulative import time of main in milliseconds, and the time spent
+        importing each top-level package (self times summed), in milliseconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=ROOT, env=_env(), capture_output=True, text=True, check=True)
+    total = 0.0
+    packages: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1000
+        if name.strip() == 'main' and not name[1:].startswith(' '):
+            total = int(cumulative_us) / 1000
+    return total, packages
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def measure_first_request(timeout: float = 30.0) -> float:
+    """Start a single gunicorn worker and time until GET / succeeds, in milliseconds."""
+    port = _free_port()
+    env = _env()
+    env.update({'WEB_BIND': f'127.0.0.1:{port}', 'WEB_WORKERS': '1', 'WEB_LOG_LEVEL': 'warning'})
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"No response within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def run(runs: int, import_budget: float, first_request_budget: float) -> Dict[str, Any]:
+    imports: List[Tuple[float, Dict[str, float]]] = [measure_import() for _ in range(runs)]
+    import_times = [total for total, _ in imports]
+    # Break down the median run rather than averaging noise across runs
+    median_run = sorted(imports, key=lambda run: run[0])[len(imports) // 2]
+    breakdown = dict(sorted(median_run[1].items(), key=lambda item: item[1], reverse=True)[:BREAKDOWN_SIZE])
+    first_requests = [measure_first_request() for _ in range(runs)]
+
+    import_ms = statistics.median(import_times)
+    first_request_ms = statistics.median(first_requests)
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'runs': runs,
+        'import_ms': round(import_ms, 1),
+        'import_runs_ms': [round(value, 1) for value in import_times],
+        'import_breakdown_ms': {name: round(value, 1) for name, value in breakdown.items()},
+        'first_request_ms': round(first_request_ms, 1),
+        'first_request_runs_ms': [round(value, 1) for value in first_requests],
+        'budget_ms': {'import': import_budget, 'first_request': first_request_budget},
+        'passed': import_ms <= import_budget and first_request_ms <= first_request_budget,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET_MS, help='milliseconds')
+    parser.add_argument('--first-request-budget', type=float, default=FIRST_REQUEST_BUDGET_MS, help='milliseconds')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run(args.runs, args.import_budget, args.first_request_budget)
+
+    print(f"import main: {results['import_ms']:.0f} ms (budget {args.import_budget:.0f} ms)")
+    for name, value in results['import_breakdown_ms'].items():
+        print(f"  {name:<24} {value:8.1f} ms")
+    print(f"first request: {results['first_request_ms']:.0f} ms (budget {args.first_request_budget:.0f} ms)")
+    print("PASS" if results['passed'] else "OVER BUDGET")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if results['passed'] else 1)
+
+if __name__ == '__main__':
+    main()
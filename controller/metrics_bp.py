@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from utils.metrics import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of all workers."""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
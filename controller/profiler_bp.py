@@ -0,0 +1,20 @@
+from flask import Blueprint, abort, jsonify, send_from_directory
+from middleware.admin import admin_required
+from middleware.profiler import profile_dir
+from utils.profiler import list_profiles, PROFILE_SUFFIXES
+
+profiler_bp = Blueprint('profiler', __name__)
+
+@profiler_bp.route('/', methods=['GET'])
+@admin_required
+def list_profiles_endpoint():
+    """Saved request and job profiles of all workers, newest first."""
+    return jsonify({'directory': profile_dir(), 'profiles': list_profiles(profile_dir())})
+
+@profiler_bp.route('/<string:filename>', methods=['GET'])
+@admin_required
+def get_profile_file(filename):
+    """Download a profile file: .json summary, .pstats, .folded stacks or .svg flame graph."""
+    if not filename.endswith(PROFILE_SUFFIXES):
+        abort(404)
+    return send_from_directory(profile_dir(), filename)
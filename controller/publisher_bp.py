@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
-from services.publisher_service import publish_artefacts_to_github, process_artefacts_html
+import click
+from services.publisher_service import queue_publish_artefacts, process_artefacts_html, rebuild_site_manifest, PUBLISH_BACKENDS
 from datetime import datetime
 import traceback
 
@@ -7,25 +8,44 @@ publisher_bp = Blueprint('publisher', __name__)
 
 @publisher_bp.route('/publish', methods=['POST'])
 def publish_artefacts():
-    """Publish artefacts to GitHub within a date range."""
+    """Publish artefacts to GitHub within a date range.
+    
+    Parameters:
+        start_date: First date to publish (YYYY-MM-DD)
+        end_date: Last date to publish (optional, defaults to start_date).
+            All dates go into a single commit and push.
+            Publishes to the same repository are serialized, and duplicate
+            pending requests are coalesced into one run.
+        backend: 'worktree' (default) or 'tree' to build the commit in a bare
+            repository without a working tree
+    """
     data = request.get_json()
     
     # Validate input data
     start_date = data.get('start_date')
-    repo_path = data.get('repo_path', '/tmp/wpa-md-previews')
+    end_date = data.get('end_date')
+    backend = data.get('backend', 'worktree')
     
     if not start_date:
         return jsonify({"error": "start_date is required."}), 400
 
-    # Parse date
+    if backend not in PUBLISH_BACKENDS:
+        return jsonify({"error": f"backend must be one of {', '.join(PUBLISH_BACKENDS)}."}), 400
+
+    # Parse dates
     try:
         start_date = datetime.strptime(start_date, '%Y-%m-%d')
+        if end_date:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d')
             
     except ValueError as e:
         return jsonify({"error": "Dates must be in YYYY-MM-DD format."}), 400
 
+    if end_date and end_date < start_date:
+        return jsonify({"error": "end_date must not be before start_date."}), 400
+
     try:
-        result = publish_artefacts_to_github(start_date, repo_path)
+        result = queue_publish_artefacts(start_date, end_date=end_date, backend=backend)
         return jsonify(result), 200
         
     except Exception as e:
@@ -36,10 +56,15 @@ def publish_artefacts():
 
 @publisher_bp.route('/process_html', methods=['POST'])
 def process_html():
-    """Process artefacts and generate HTML content."""
+    """Process artefacts and generate HTML content.
+    
+    Only artefacts whose full_text or renderer version changed are re-rendered,
+    unless force=true is passed.
+    """
     try:
         # Get date from request parameters
         date_str = request.args.get('date')
+        force = request.args.get('force', 'false').lower() in ('1', 'true', 'yes')
         
         # Convert date string to datetime if provided
         start_date = None
@@ -52,7 +77,7 @@ def process_html():
                 }), 400
         
         # Process artefacts
-        result = process_artefacts_html(start_date)
+        result = process_artefacts_html(start_date, force=force)
         return jsonify(result), 200
         
     except Exception as e:
@@ -60,4 +85,11 @@ def process_html():
         return jsonify({
             "error": "An error occurred while processing artefacts",
             "details": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@publisher_bp.cli.command('rebuild-manifest')
+@click.option('--backend', type=click.Choice(PUBLISH_BACKENDS), default='worktree', show_default=True,
+              help='Publish repository cache to go through')
+def rebuild_manifest_command(backend):
+    """Rebuild manifest.json, archive.md and feed.xml from every published date."""
+    print(rebuild_site_manifest(backend=backend))
@@ -0,0 +1,54 @@
+from flask import Blueprint, request, jsonify, current_app
+from services.stats_service import get_daily_stats, get_channel_daily_stats, rebuild_stats
+from utils.main import parse_date_range
+
+stats_bp = Blueprint('stats', __name__)
+
+@stats_bp.route('/daily', methods=['GET'])
+def daily_stats():
+    """Videos, minutes, transcript coverage and artefacts per day, with totals over the range.
+
+    Parameters:
+        start_date, end_date: YYYY-MM-DD, inclusive (optional)
+        channel_id: Only count this channel's videos (optional)
+    """
+    dates, error = parse_date_range(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        stats = get_daily_stats(dates['start_date'], dates['end_date'], request.args.get('channel_id'))
+        return jsonify({
+            'start_date': request.args.get('start_date'),
+            'end_date': request.args.get('end_date'),
+            **stats
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving daily stats: {str(e)}")
+        return jsonify({"error": "An error occurred while retrieving daily stats"}), 500
+
+@stats_bp.route('/channels', methods=['GET'])
+def channel_stats():
+    """Videos, minutes and transcript coverage of each channel per day.
+
+    Parameters:
+        start_date, end_date: YYYY-MM-DD, inclusive (optional)
+        channel_id: Only this channel (optional)
+    """
+    dates, error = parse_date_range(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        rows = get_channel_daily_stats(dates['start_date'], dates['end_date'], request.args.get('channel_id'))
+        return jsonify({
+            'start_date': request.args.get('start_date'),
+            'end_date': request.args.get('end_date'),
+            'channels': rows
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving channel stats: {str(e)}")
+        return jsonify({"error": "An error occurred while retrieving channel stats"}), 500
+
+@stats_bp.cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the daily stats tables from youtube_videos and artefacts."""
+    print(rebuild_stats())
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
 from services.youtube_service import create_channel, get_channel, update_channel, delete_channel, find_and_store_channel_by_name, get_and_store_new_videos, update_missing_transcripts, get_videos
+from services.video_tag_service import get_tag_facets, rebuild_video_tags
 import traceback
 from datetime import datetime
+from utils.main import parse_date_range
 
 youtube_bp = Blueprint('youtube', __name__)
 
@@ -144,6 +146,7 @@ def list_videos():
         channel_id = request.args.get('channel_id')
         duration_min = request.args.get('duration_min', type=int)
         duration_max = request.args.get('duration_max', type=int)
+        tag = request.args.get('tag')
         limit = request.args.get('limit', default=50, type=int)
         offset = request.args.get('offset', default=0, type=int)
 
@@ -168,7 +171,8 @@ def list_videos():
             duration_min=duration_min,
             duration_max=duration_max,
             limit=limit,
-            offset=offset
+            offset=offset,
+            tag=tag
         )
 
         return jsonify(result), 200
@@ -176,3 +180,33 @@ def list_videos():
     except Exception as e:
         current_app.logger.error(f"Error retrieving videos: {str(e)}")
         return jsonify({"error": "An error occurred while retrieving videos"}), 500
+
+@youtube_bp.route('/videos/facets', methods=['GET'])
+def video_facets():
+    """Tag counts of the videos published from start_date through end_date (both optional).
+
+    Parameters:
+        start_date, end_date: YYYY-MM-DD, inclusive
+        limit: Number of tags, most used first (default 50)
+    """
+    try:
+        dates, error = parse_date_range(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        limit = request.args.get('limit', default=50, type=int)
+
+        tags = get_tag_facets(dates['start_date'], dates['end_date'], limit)
+        return jsonify({
+            'start_date': request.args.get('start_date'),
+            'end_date': request.args.get('end_date'),
+            'tags': tags
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving video facets: {str(e)}")
+        return jsonify({"error": "An error occurred while retrieving video facets"}), 500
+
+@youtube_bp.cli.command('rebuild-tags')
+def rebuild_tags_command():
+    """Rebuild video_tags and the daily tag counts from youtube_videos."""
+    print(rebuild_video_tags())
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import multiprocessing
+
+# Production server settings, overridable through the environment:
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# Most routes spend their time waiting on YouTube, the transcription and
+# LangGraph services, git and MySQL, so the default is a few processes with
+# several threads each. gevent serves many more concurrent requests per
+# process but needs `pip install gevent`.
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+bind = os.environ.get('WEB_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(f"WEB_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}")
+workers = int(os.environ.get('WEB_WORKERS', min(multiprocessing.cpu_count() * 2, 8)))
+threads = int(os.environ.get('WEB_THREADS', 8 if worker_class == 'gthread' else 1))
+# Concurrent requests per gevent worker
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', 200))
+
+# Import the app once in the master so workers fork with it loaded
+preload_app = True
+# Long enough for transcription and publish requests
+timeout = int(os.environ.get('WEB_TIMEOUT', 600))
+# In-flight requests get this long to finish on SIGTERM
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+# Recycle workers now and then, spread out so they do not restart together
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, or its locks and sockets stay blocking
+    from gevent import monkey
+    monkey.patch_all()
+
+# Workers write their metrics here so that /metrics on any of them covers all.
+# Must be set before prometheus_client is imported by the preloaded app.
+# The config is read again on SIGHUP, when the directory is already in use.
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    metrics_dir = os.path.join(tempfile.gettempdir(), 'news-aggr-metrics')
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        # Values of a previous run
+        os.remove(os.path.join(metrics_dir, name))
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+
+# Size each worker's DB pool for the requests it serves at once, unless the
+# environment or .env sets it
+from utils.settings import set_defaults
+set_defaults(
+    db_pool_size=min(worker_connections, 20) if worker_class == 'gevent' else threads,
+    db_max_overflow=2,
+)
+
+def post_fork(server, worker):
+    # Connections opened by the master during preload must not be shared
+    from main import app
+    from models import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def on_reload(server):
+    # SIGHUP restarts the workers from the preloaded master, so reload the
+    # settings there for the new workers to pick them up
+    from utils.settings import reload_settings
+    reload_settings()
+
+def child_exit(server, worker):
+    # Drop the live gauges of a worker that is gone; its counters are kept
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def worker_exit(server, worker):
+    # Deliver webhook notifications still waiting in the batch window, while
+    # the shared HTTP session is open
+    from utils.webhook_outbox import flush_webhook_outbox
+    flush_webhook_outbox()
+    # Close the shared HTTP session once in-flight requests are done
+    from utils.async_runtime import shutdown
+    shutdown()
+    # Stop the artefact render processes
+    from services.publisher_service import shutdown_render_pool
+    shutdown_render_pool()
+    # Export the worker's queued spans
+    from utils.tracing import shutdown_tracing
+    shutdown_tracing()
@@ -1,44 +1,78 @@
-import os
 import json
 import traceback
-from flask import Flask, current_app
+from flask import Flask, current_app, jsonify
 from models import db
-from utils.main import load_api_key
+from models.db import engine_options, replica_binds, pool_stats
+from utils.settings import get_settings, load_settings, install_reload_handler
 from controller.youtube_bp import youtube_bp
 from controller.artefact_bp import artefact_bp
 from controller.publisher_bp import publisher_bp
 from controller.batch_bp import batch_bp
+from controller.metrics_bp import metrics_bp
+from controller.profiler_bp import profiler_bp
+from controller.stats_bp import stats_bp
 from middleware.webhook import webhook_middleware
+from middleware.metrics import metrics_middleware
+from middleware.sql_profiler import sql_profiler_middleware
+from middleware.tracing import tracing_middleware
+from middleware.profiler import profiler_middleware
+from utils.tracing import setup_tracing
 
 app = Flask(__name__)
 
+# Load and validate the settings once; SIGHUP reloads them
+settings = load_settings()
+install_reload_handler()
+
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = load_api_key("database_url")
+app.config['SQLALCHEMY_DATABASE_URI'] = settings.database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if not settings.database_url.startswith('sqlite'):
+    # One pool per worker process, sized for the threads serving requests in it
+    pool_options = engine_options(settings.db_pool_size, settings.db_max_overflow, settings.db_pool_timeout,
+                                  settings.db_pool_recycle, settings.db_pool_pre_ping)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options
+    # Reads of read_only service calls go to the replicas
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(settings.replica_urls, pool_options)
 db.init_app(app)
 
+# Spans are only made when an exporter is configured
+if setup_tracing(settings.otel_traces_exporter, settings.otel_service_name, settings.trace_file,
+                 settings.otel_exporter_otlp_endpoint):
+    tracing_middleware(app)
+profiler_middleware(app)
+
 # Register webhook middleware
 app.after_request(webhook_middleware())
+sql_profiler_middleware(app)
+metrics_middleware(app)
 
 app.register_blueprint(youtube_bp, url_prefix='/youtube')
 app.register_blueprint(artefact_bp, url_prefix='/artefact')
 app.register_blueprint(publisher_bp, url_prefix='/publisher')
 app.register_blueprint(batch_bp, url_prefix='/batch')
+app.register_blueprint(metrics_bp)
+app.register_blueprint(profiler_bp, url_prefix='/profiles')
+app.register_blueprint(stats_bp, url_prefix='/stats')
 
 # BUCKET_NAME = 'keith_speech_to_text'
 # storage_client = storage.Client()
 # bucket = storage_client.bucket(BUCKET_NAME)
 
-# Print all environment variables when the app starts
-print("Starting Flask App with the following environment variables:")
-for key, value in os.environ.items():
-    print(f"{key}: {value}")
+# Log which settings are in effect, without secret values
+app.logger.info(f"Starting Flask App with settings: {settings.redacted()}")
 
 
 @app.route('/', methods=['GET'])
 def entry():
     return "hello"
 
+@app.route('/db/pool', methods=['GET'])
+def db_pool():
+    """Connection pool usage and checkout wait times, by bind."""
+    return jsonify(pool_stats())
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=get_settings().flask_debug, host='0.0.0.0', port=5000)
 
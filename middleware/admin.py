@@ -0,0 +1,24 @@
+import hmac
+from functools import wraps
+from typing import Callable
+from flask import jsonify, request
+from utils.settings import get_settings
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+def is_admin() -> bool:
+    """Whether the request carries ADMIN_TOKEN. Never true while no token is configured."""
+    token = get_settings().admin_token
+    sent = request.headers.get(ADMIN_TOKEN_HEADER)
+    if not token or not sent:
+        return False
+    return hmac.compare_digest(sent.encode('utf-8'), token.encode('utf-8'))
+
+def admin_required(view: Callable) -> Callable:
+    """Reject requests to a view that do not carry the admin token."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return jsonify({'error': f"{ADMIN_TOKEN_HEADER} header with the admin token required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
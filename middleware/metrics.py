@@ -0,0 +1,28 @@
+import time
+from flask import Flask, g, request
+from utils.metrics import REQUEST_DURATION, REQUEST_DB_QUERIES, REQUEST_DB_DURATION, start_request_queries, finish_request_queries
+
+def metrics_middleware(app: Flask) -> None:
+    """Record each request's latency and database queries, labelled by route.
+
+    Routes are labelled by their endpoint name (e.g. 'youtube.get_videos_endpoint')
+    rather than the URL, so path parameters do not multiply the series.
+    """
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = start_request_queries()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        token = g.pop('metrics_queries', None)
+        if start is None or token is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_DURATION.labels(endpoint, request.method, str(response.status_code)).observe(time.perf_counter() - start)
+        query_count, query_time = finish_request_queries(token)
+        REQUEST_DB_QUERIES.labels(endpoint).observe(query_count)
+        REQUEST_DB_DURATION.labels(endpoint).observe(query_time)
+        return response
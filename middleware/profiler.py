@@ -0,0 +1,52 @@
+from flask import Flask, current_app, g, jsonify, request
+from middleware.admin import is_admin, ADMIN_TOKEN_HEADER
+from utils.settings import get_settings
+from utils.profiler import start_profiling, DEFAULT_PROFILE_DIR
+
+# Query parameter or request header that profiles a request; the response
+# header names the saved profile
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'X-Profile'
+
+def profile_dir() -> str:
+    return get_settings().profile_dir or DEFAULT_PROFILE_DIR
+
+def profiler_middleware(app: Flask) -> None:
+    """Run a single request under the CPU sampler and tracemalloc when an admin asks for it.
+
+    Admins add ?profile=1 or an X-Profile header, with the X-Admin-Token
+    header. Other requests only pay for the check of the parameter and
+    header. Scheduled jobs are requests to their endpoints, so they are
+    profiled the same way. Profiles are listed at GET /profiles.
+    """
+
+    @app.before_request
+    def start_request_profile():
+        if PROFILE_PARAM not in request.args and PROFILE_HEADER not in request.headers:
+            return None
+        if not is_admin():
+            return jsonify({'error': f"Profiling requires the {ADMIN_TOKEN_HEADER} header"}), 403
+        run = start_profiling(f"{request.method} {request.path}")
+        if run is None:
+            # Another request of this worker is being profiled
+            g.profile_busy = True
+        else:
+            g.profile_run = run
+        return None
+
+    @app.after_request
+    def save_request_profile(response):
+        run = g.pop('profile_run', None)
+        if run is not None:
+            response.headers[PROFILE_HEADER] = run.stop(profile_dir())
+            current_app.logger.info(f"Profiled {run.label} as {run.name}")
+        elif g.pop('profile_busy', False):
+            response.headers[PROFILE_HEADER] = 'busy'
+        return response
+
+    @app.teardown_request
+    def stop_request_profile(error):
+        # after_request is skipped when building the response failed
+        run = g.pop('profile_run', None)
+        if run is not None:
+            run.stop(profile_dir())
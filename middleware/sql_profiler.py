@@ -0,0 +1,43 @@
+import json
+from flask import Flask, current_app, g, request
+from utils.settings import get_settings
+from utils.sql_profiler import start_profile, stop_profile
+
+# Request header that opts a request in, and response header with the summary
+PROFILE_HEADER = 'X-SQL-Profile'
+PROFILE_MODES = ('header', 'all')
+
+def sql_profiler_middleware(app: Flask) -> None:
+    """Profile the SQL of opted-in requests, as enabled by SQL_PROFILE.
+
+    The response gets a one-line summary in the X-SQL-Profile header. The full
+    report, with the statements run more than SQL_PROFILE_N_PLUS_ONE times and
+    the slow ones with their query plans, is logged. Register it before
+    metrics_middleware, so the EXPLAINs run after the request's queries are
+    counted.
+    """
+
+    @app.before_request
+    def start_sql_profile():
+        mode = get_settings().sql_profile
+        if mode not in PROFILE_MODES:
+            return
+        if mode == 'all' or request.headers.get(PROFILE_HEADER):
+            g.sql_profile = start_profile()
+
+    @app.after_request
+    def report_sql_profile(response):
+        token = g.pop('sql_profile', None)
+        if token is None:
+            return response
+        summary = stop_profile(token).summary()
+        response.headers[PROFILE_HEADER] = (
+            f"queries={summary['queries']}; query_ms={summary['query_ms']}; "
+            f"n_plus_one={len(summary['n_plus_one'])}; slow={len(summary['slow'])}"
+        )
+        message = f"SQL profile of {request.method} {request.path}: {json.dumps(summary, ensure_ascii=False)}"
+        if summary['n_plus_one'] or summary['slow']:
+            current_app.logger.warning(message)
+        else:
+            current_app.logger.info(message)
+        return response
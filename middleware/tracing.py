@@ -0,0 +1,31 @@
+from flask import Flask, g, request
+from utils.tracing import start_server_span, end_server_span
+
+def tracing_middleware(app: Flask) -> None:
+    """Serve each request in a server span, the parent of the spans made while serving it.
+
+    A traceparent header from the caller continues its trace. Register it
+    before the other middleware, so their work falls inside the span.
+    """
+
+    @app.before_request
+    def start_request_span():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.trace_span = start_server_span(f"{request.method} {route}", request.headers, {
+            'http.method': request.method,
+            'http.route': route,
+            'http.target': request.full_path.rstrip('?'),
+        })
+
+    @app.after_request
+    def record_status(response):
+        traced = g.get('trace_span')
+        if traced is not None:
+            traced[0].set_attribute('http.status_code', response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_request_span(error):
+        traced = g.pop('trace_span', None)
+        if traced is not None:
+            end_server_span(*traced, error=error)
@@ -1,3 +1,4 @@
 from .db import db
-from .youtube import YoutubeChannel, YoutubeVideo
-from .artefact import Artefact
\ No newline at end of file
+from .youtube import YoutubeChannel, YoutubeVideo, VideoTag, VideoTagDailyCount
+from .artefact import Artefact
+from .stats import ChannelDailyStats, ArtefactDailyStats
\ No newline at end of file
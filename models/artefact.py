@@ -1,7 +1,8 @@
 from sqlalchemy import Integer, String, DateTime, Text, SmallInteger
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column, validates
 from datetime import datetime
 from models.db import db
+from utils.main import parse_datetime
 
 class Artefact(db.Model):
     __tablename__ = 'artefacts'
@@ -12,11 +13,18 @@ class Artefact(db.Model):
     source_id: Mapped[int] = mapped_column(Integer, unique=True, nullable=False)
     full_text: Mapped[str] = mapped_column(Text)
     html: Mapped[str] = mapped_column(Text)
+    full_text_hash: Mapped[str] = mapped_column(String(64), nullable=True)  # Hash of the full_text the html was rendered from
+    renderer_version: Mapped[int] = mapped_column(Integer, nullable=True)  # md2html.RENDERER_VERSION the html was rendered with
     used: Mapped[int] = mapped_column(SmallInteger, default=0)
     published_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # create_artefact is also given to_dict() output, with timestamps as strings
+    @validates('published_at', 'created_at', 'updated_at')
+    def _parse_timestamps(self, key, value):
+        return parse_datetime(value)
+
     def __repr__(self) -> str:
         return f'<Artefact {self.title}>'
 
@@ -28,6 +36,8 @@ class Artefact(db.Model):
             'source_id': self.source_id,
             'full_text': self.full_text,
             'html': self.html,
+            'full_text_hash': self.full_text_hash,
+            'renderer_version': self.renderer_version,
             'used': self.used,
             'published_at': self.published_at.isoformat() if self.published_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -1,4 +1,209 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.pool import QueuePool
+
+# Bind keys of read replicas in SQLALCHEMY_BINDS
+REPLICA_BIND_PREFIX = 'replica_'
+# Checkout waits kept per pool for the percentiles
+POOL_WAIT_WINDOW = 1000
+# CREATE TABLE statements of the real tables, one file per table
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schemas')
+
+# Set while a service call that only reads is running
+_replica_reads: ContextVar[bool] = ContextVar('replica_reads', default=False)
+
+@contextmanager
+def replica_reads() -> Iterator[None]:
+    """Let SELECTs run inside this block go to a read replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+def read_only(func: Callable) -> Callable:
+    """Mark a service function that only reads, so it may be served by a replica."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return func(*args, **kwargs)
+    return wrapper
+
+class RoutingSession(Session):
+    """Session that sends reads of read_only service calls to a replica.
+
+    Everything else goes to the primary. Once the session has written, every
+    later read goes to the primary too, so a request always sees its own
+    writes. Flask-SQLAlchemy scopes sessions to the request, so this
+    stickiness ends with it. A session keeps to one replica, so its reads do
+    not go back in time by switching to a replica that lags further behind.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.wrote = False
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and not getattr(clause, 'is_select', False)):
+                self.wrote = True
+            elif _replica_reads.get() and not self.wrote and mapper is not None:
+                replica = self._replica_engine(mapper)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_engine(self, mapper):
+        # Only tables of the default database have replicas
+        if mapper.persist_selectable.metadata.info.get('bind_key') is not None:
+            return None
+        if self._replica is None:
+            replicas = [engine for key, engine in self._db.engines.items()
+                        if isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX)]
+            if not replicas:
+                return None
+            self._replica = random.choice(replicas)
+        return self._replica
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits: Deque[float] = deque(maxlen=POOL_WAIT_WINDOW)
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                self.waits.append(wait)
+
+    def recreate(self):
+        pool = super().recreate()
+        # Keep the counters across dispose(), e.g. after a worker fork
+        pool.checkouts, pool.wait_total, pool.wait_max = self.checkouts, self.wait_total, self.wait_max
+        return pool
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            waits = sorted(self.waits)
+            checkouts, wait_total, wait_max = self.checkouts, self.wait_total, self.wait_max
+        percentile = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2) if waits else None
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': max(0, self.overflow()),
+            'checkouts': checkouts,
+            'wait_avg_ms': round(wait_total / checkouts * 1000, 2) if checkouts else None,
+            'wait_p50_ms': percentile(0.5),
+            'wait_p99_ms': percentile(0.99),
+            'wait_max_ms': round(wait_max * 1000, 2),
+        }
+
+def increment_counters(model: Any, keys: Sequence[str], rows: Iterable[Dict[str, Any]]) -> None:
+    """Add to the counter columns of aggregate rows, creating missing rows, in the current transaction.
+
+    Each row names its key columns and the amounts to add to every other
+    column it has; all rows must have the same columns. The upsert is one
+    atomic statement per row, so concurrent writers never lose an update.
+    """
+    rows = sorted(rows, key=lambda row: tuple(row[key] for key in keys))
+    if not rows:
+        return
+    table = model.__table__
+    counters = [column for column in rows[0] if column not in keys]
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        statement = statement.on_duplicate_key_update({c: table.c[c] + statement.inserted[c] for c in counters})
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(index_elements=list(keys),
+                                                    set_={c: table.c[c] + statement.excluded[c] for c in counters})
+    else:
+        raise NotImplementedError(f"increment_counters does not support {dialect}")
+    # Sorted by key, so concurrent transactions lock rows in the same order
+    db.session.execute(statement, rows)
+
+def iter_batches(query: Any, id_column: Any, batch_size: int) -> Iterator[List[Any]]:
+    """Yield the rows of a query in batches ordered by id_column, which the rows must include.
+
+    Each batch is a separate keyset query, so no cursor stays open across
+    commits between batches and only one batch is held in memory.
+    """
+    last_id = 0
+    while True:
+        rows = query.filter(id_column > last_id).order_by(id_column).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        last_id = getattr(rows[-1], id_column.key)
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Pool usage and checkout waits of each engine of the current app, by bind key."""
+    stats = {}
+    for key, engine in db.engines.items():
+        if isinstance(engine.pool, TimedQueuePool):
+            stats[key or 'primary'] = engine.pool.stats()
+    return stats
+
+def engine_options(pool_size: int, max_overflow: int, pool_timeout: int, pool_recycle: int,
+                   pool_pre_ping: bool) -> Dict[str, Any]:
+    """SQLALCHEMY_ENGINE_OPTIONS for a pooled (non-SQLite) database."""
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pool_pre_ping
+    }
+
+def replica_binds(replica_urls: List[str], options: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """SQLALCHEMY_BINDS entries for the read replicas, with the same pool options."""
+    return {f'{REPLICA_BIND_PREFIX}{i}': {'url': url, **(options or {})} for i, url in enumerate(replica_urls)}
+
+def create_tables() -> None:
+    """Create missing tables, with the nullability of schemas/*.sql, for tests and benchmarks.
+
+    The models leave out nullable=True on several optional columns, which
+    create_all would turn into NOT NULL columns the real tables do not have.
+    """
+    for table in db.metadata.sorted_tables:
+        path = os.path.join(SCHEMA_DIR, f'{table.name}.sql')
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            definitions = {line.split()[0]: line for line in f.read().splitlines() if line.strip()}
+        for column in table.columns:
+            if not column.primary_key and column.name in definitions:
+                column.nullable = 'NOT NULL' not in definitions[column.name]
+    db.create_all()
 
 # Initialize the SQLAlchemy instance
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': RoutingSession})
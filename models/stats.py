@@ -0,0 +1,22 @@
+from sqlalchemy import Integer, String, Date
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import date
+from models.db import db
+
+class ChannelDailyStats(db.Model):
+    """Videos of a channel published on a day, kept up to date as videos and transcripts are stored."""
+    __tablename__ = 'channel_daily_stats'
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    channel_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    videos: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    duration_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    transcribed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class ArtefactDailyStats(db.Model):
+    """Artefacts of a source created on a day, kept up to date as artefacts are stored."""
+    __tablename__ = 'artefact_daily_stats'
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    source: Mapped[str] = mapped_column(String(50), primary_key=True)
+    artefacts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
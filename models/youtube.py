@@ -1,8 +1,9 @@
 import datetime
-from sqlalchemy import Integer, String, DateTime, Text, JSON
-from sqlalchemy.orm import Mapped, mapped_column
-from datetime import datetime
+from sqlalchemy import Integer, String, Date, DateTime, Text, JSON, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column, validates
+from datetime import date, datetime
 from models.db import db
+from utils.main import parse_datetime
 
 class YoutubeVideo(db.Model):
     __tablename__ = 'youtube_videos'
@@ -20,6 +21,10 @@ class YoutubeVideo(db.Model):
     tags: Mapped[str] = mapped_column(JSON)
     duration: Mapped[int] = mapped_column(Integer)
 
+    @validates('published_at')
+    def _parse_published_at(self, key, value):
+        return parse_datetime(value)
+
     def __repr__(self) -> str:
         return f'<Video {self.title}>' 
 
@@ -52,6 +57,10 @@ class YoutubeChannel(db.Model):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @validates('published_at')
+    def _parse_published_at(self, key, value):
+        return parse_datetime(value)
+
     def __repr__(self) -> str:
         return f'<YoutubeChannel {self.title}>'
 
@@ -67,3 +76,19 @@ class YoutubeChannel(db.Model):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+
+class VideoTag(db.Model):
+    """A tag of a video, normalized by video_tag_service.normalize_tag."""
+    __tablename__ = 'video_tags'
+    __table_args__ = (Index('ix_video_tags_tag', 'tag', 'video_id'),)
+
+    video_id: Mapped[str] = mapped_column(String(255), ForeignKey('youtube_videos.video_id', ondelete='CASCADE'), primary_key=True)
+    tag: Mapped[str] = mapped_column(String(255), primary_key=True)
+
+class VideoTagDailyCount(db.Model):
+    """Number of videos published on a day with a tag, kept up to date as videos are stored."""
+    __tablename__ = 'video_tag_daily_counts'
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    tag: Mapped[str] = mapped_column(String(255), primary_key=True)
+    videos: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,6 @@
+CREATE TABLE artefact_daily_stats (
+    day DATE NOT NULL,  -- Day the artefacts were created (UTC)
+    source VARCHAR(50) NOT NULL,  -- artefacts.source
+    artefacts INT NOT NULL DEFAULT 0,  -- Artefacts created that day
+    PRIMARY KEY (day, source)
+);
@@ -4,9 +4,15 @@ CREATE TABLE artefacts (
     source VARCHAR(50) NOT NULL,  -- e.g., 'youtube', 'twitter', etc.
     source_id VARCHAR(255) NOT NULL,  -- ID from the source platform
     full_text TEXT,
+    html TEXT,
+    full_text_hash CHAR(64),  -- SHA-256 of the full_text the html was rendered from
+    renderer_version INT,  -- md2html.RENDERER_VERSION the html was rendered with
     used SMALLINT DEFAULT 0,  -- 0: unused, 1: used
     published_at TIMESTAMP,  -- Publication date from the source content
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     UNIQUE(source_id)  -- Ensure no duplicate articles from the same source
-);
\ No newline at end of file
+);
+
+-- Existing databases:
+-- ALTER TABLE artefacts ADD COLUMN full_text_hash CHAR(64), ADD COLUMN renderer_version INT;
@@ -0,0 +1,11 @@
+CREATE TABLE channel_daily_stats (
+    day DATE NOT NULL,  -- Day the videos were published (UTC)
+    channel_id VARCHAR(255) NOT NULL,  -- youtube_videos.channel_id
+    videos INT NOT NULL DEFAULT 0,  -- Videos published that day
+    duration_seconds INT NOT NULL DEFAULT 0,  -- Their total duration
+    transcribed INT NOT NULL DEFAULT 0,  -- Those of them with a transcript
+    PRIMARY KEY (day, channel_id)
+);
+
+-- Existing databases: fill it and artefact_daily_stats with
+-- flask --app main stats rebuild
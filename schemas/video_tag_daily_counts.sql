@@ -0,0 +1,6 @@
+CREATE TABLE video_tag_daily_counts (
+    day DATE NOT NULL,  -- Day the videos were published (UTC)
+    tag VARCHAR(255) NOT NULL,  -- Same normalization as video_tags.tag
+    videos INT NOT NULL DEFAULT 0,  -- Videos published that day with the tag
+    PRIMARY KEY (day, tag)
+);
@@ -0,0 +1,10 @@
+CREATE TABLE video_tags (
+    video_id VARCHAR(255) NOT NULL,  -- youtube_videos.video_id
+    tag VARCHAR(255) NOT NULL,  -- Lowercased, whitespace-collapsed tag
+    PRIMARY KEY (video_id, tag),
+    INDEX ix_video_tags_tag (tag, video_id),
+    FOREIGN KEY (video_id) REFERENCES youtube_videos (video_id) ON DELETE CASCADE
+);
+
+-- Existing databases: fill it and video_tag_daily_counts with
+-- flask --app main youtube rebuild-tags
@@ -1,12 +1,18 @@
 from flask import current_app
 from models import db, Artefact, YoutubeVideo
+from models.db import read_only
 from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime
 from sqlalchemy.exc import IntegrityError
-import requests
 import services.youtube_video_service as YoutubeVideoService
-from utils.md2html import style_html
-from utils.main import load_api_key
+from services.stats_service import artefact_figures, record_artefact_change
+from utils.md2html import style_html, RENDERER_VERSION
+from utils.main import content_hash
+from utils.settings import get_settings
+from utils.metrics import track_outbound, ARTEFACTS_PRODUCED
+from utils.tracing import traced, inject_headers
 
+@traced
 def create_artefact(artefact_data: Dict[str, Any]) -> Dict[str, Any]:
     """创建新的 artefact 记录"""
     # Ensure source_id is an integer to match database schema
@@ -14,38 +20,51 @@ def create_artefact(artefact_data: Dict[str, Any]) -> Dict[str, Any]:
         artefact_data['source_id'] = int(artefact_data['source_id'])
     
     # 检查是否已存在相同 source_id 的记录
-    existing_artefact = Artefact.query.filter_by(source_id=artefact_data['source_id']).first()
+    # Locked until the commit, so its stats move from what is stored
+    existing_artefact = Artefact.query.filter_by(source_id=artefact_data['source_id']).with_for_update().populate_existing().first()
     
     if existing_artefact:
         # 更新现有记录
+        previous_figures = artefact_figures(existing_artefact)
         for key, value in artefact_data.items():
             setattr(existing_artefact, key, value)
+        record_artefact_change(previous_figures, artefact_figures(existing_artefact))
         db.session.commit()
         return existing_artefact.to_dict()
     else:
         # 创建新记录
         new_artefact = Artefact(**artefact_data)
+        if new_artefact.created_at is None:
+            # Rather than the column default at flush, so the day counted in the stats is the one stored
+            new_artefact.created_at = datetime.utcnow()
         db.session.add(new_artefact)
+        record_artefact_change(None, artefact_figures(new_artefact))
         db.session.commit()
         return new_artefact.to_dict()
 
+@traced
+@read_only
 def get_artefact(artefact_id: int) -> Optional[Dict[str, Any]]:
     """根据 ID 获取 artefact"""
     artefact = Artefact.query.get(artefact_id)
     return artefact.to_dict() if artefact else None
 
+@traced
 def get_artefact_by_source_id(source_id: str) -> Optional[Dict[str, Any]]:
     """根据 source_id 获取 artefact"""
     artefact = Artefact.query.filter_by(source_id=source_id).first()
     return artefact.to_dict() if artefact else None
 
+@traced
 def update_artefact(artefact_id: int, updated_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """更新 artefact 记录"""
-    artefact = Artefact.query.get(artefact_id)
+    artefact = Artefact.query.filter_by(id=artefact_id).with_for_update().populate_existing().first()
     if artefact:
+        previous_figures = artefact_figures(artefact)
         for key, value in updated_data.items():
             setattr(artefact, key, value)
         try:
+            record_artefact_change(previous_figures, artefact_figures(artefact))
             db.session.commit()
             return artefact.to_dict()
         except IntegrityError:
@@ -54,11 +73,13 @@ def update_artefact(artefact_id: int, updated_data: Dict[str, Any]) -> Optional[
             return None
     return None
 
+@traced
 def delete_artefact(artefact_id: int) -> Optional[Dict[str, Any]]:
     """删除 artefact 记录"""
-    artefact = Artefact.query.get(artefact_id)
+    artefact = Artefact.query.filter_by(id=artefact_id).with_for_update().populate_existing().first()
     if artefact:
         try:
+            record_artefact_change(artefact_figures(artefact), None)
             db.session.delete(artefact)
             db.session.commit()
             return artefact.to_dict()
@@ -68,6 +89,7 @@ def delete_artefact(artefact_id: int) -> Optional[Dict[str, Any]]:
             return None
     return None
 
+@traced
 def get_all_artefacts(source: Optional[str] = None, used: Optional[int] = None) -> List[Dict[str, Any]]:
     """获取所有 artefacts，可选按来源和使用状态筛选"""
     query = Artefact.query
@@ -80,10 +102,12 @@ def get_all_artefacts(source: Optional[str] = None, used: Optional[int] = None)
     artefacts = query.all()
     return [artefact.to_dict() for artefact in artefacts]
 
+@traced
 def mark_artefact_as_used(artefact_id: int) -> Optional[Dict[str, Any]]:
     """将 artefact 标记为已使用"""
     return update_artefact(artefact_id, {'used': 1})
 
+@traced
 def mark_artefact_as_unused(artefact_id: int) -> Optional[Dict[str, Any]]:
     """将 artefact 标记为未使用"""
     return update_artefact(artefact_id, {'used': 0})
@@ -94,9 +118,11 @@ SOURCE_MODEL_MAP = {
 }
 
 
+@traced
 def process_artefact_data(source: str, source_id: str) -> Optional[Dict[str, Any]]:
     """处理 artefact 数据，包括从源表获取数据和调用外部 API"""
-    api_host = load_api_key("WPA_LANGGRAPH_HOST")
+    import requests
+    api_host = get_settings().require('wpa_langgraph_host')
 
     try:
         if source not in SOURCE_MODEL_MAP:
@@ -115,11 +141,13 @@ def process_artefact_data(source: str, source_id: str) -> Optional[Dict[str, Any
         
         
         # 调用外部 API
-        response = requests.post(
-            f"{api_host}/process",
-            json= source_material
-        )
-        response.raise_for_status()
+        with track_outbound('wpa_langgraph', 'process'):
+            response = requests.post(
+                f"{api_host}/process",
+                json= source_material,
+                headers=inject_headers()
+            )
+            response.raise_for_status()
         response_data = response.json()
 
         # 准备 artefact 数据
@@ -131,10 +159,14 @@ def process_artefact_data(source: str, source_id: str) -> Optional[Dict[str, Any
             "html": "",
             "published_at": source_material["metadata"].get("published_at")  # Access published_at from metadata
         }
-        artefact_data["html"] = style_html(artefact_data["full_text"])
+        artefact_data["html"] = str(style_html(artefact_data["full_text"]))
+        artefact_data["full_text_hash"] = content_hash(artefact_data["full_text"])
+        artefact_data["renderer_version"] = RENDERER_VERSION
         
         # Store in database
-        return create_artefact(artefact_data)
+        artefact = create_artefact(artefact_data)
+        ARTEFACTS_PRODUCED.labels(source).inc()
+        return artefact
     except Exception as e:
         error_msg = f"Error processing artefact data: {str(e)}"
         current_app.logger.error(error_msg)
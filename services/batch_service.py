@@ -1,22 +1,27 @@
 from typing import List, Dict, Any
 from datetime import datetime
-import requests
-from utils.batch_request import run_batch_request
-from utils.main import load_api_key
+from utils.settings import get_settings
+from utils.metrics import track_outbound
+from utils.tracing import traced, inject_headers
 
+@traced
 def get_video_ids_by_date_range(start_date: str) -> List[str]:
     """Get video IDs from the API for a specific date."""
+    import requests
     print(f"Getting videos for {start_date}")
     
-    response = requests.get(
-        f"{load_api_key('NEWS_AGGR_HOST')}/youtube/videos",
-        params={'start_date': start_date, 'end_date': start_date}
-    )
-    
-    response.raise_for_status()
+    with track_outbound('news_aggr', 'videos'):
+        response = requests.get(
+            f"{get_settings().require('news_aggr_host')}/youtube/videos",
+            params={'start_date': start_date, 'end_date': start_date},
+            headers=inject_headers()
+        )
+
+        response.raise_for_status()
     data = response.json()
     return [video['id'] for video in data.get('videos', [])]
 
+@traced
 def process_videos_by_date(start_date: str) -> Dict[str, Any]:
     """Process all videos for a specific date using batch processing."""
     # Get video IDs for the specified date
@@ -31,9 +36,12 @@ def process_videos_by_date(start_date: str) -> Dict[str, Any]:
         for video_id in video_ids
     ]
     
+    # Imported here so that aiohttp is only loaded by batch runs
+    from utils.batch_request import run_batch_request
+
     # Run batch request with timestamp display
     results = run_batch_request(
-        f"{load_api_key('NEWS_AGGR_HOST')}/youtube/videos",
+        f"{get_settings().require('news_aggr_host')}/youtube/videos",
         params_list,
         concurrent_limit=10,
         show_timestamp=False
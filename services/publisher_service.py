@@ -1,19 +1,59 @@
 from flask import current_app
 from models import db, Artefact
+from models.db import read_only, iter_batches
 from datetime import datetime
 import os
 import re
-from git import Repo
-from typing import List, Dict, Any, Optional
+import hashlib
+import threading
+import multiprocessing
+from io import BytesIO
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import update
 import traceback
-from utils.main import load_api_key
+from utils.main import content_hash
+from utils.settings import get_settings
+from utils.md2html import RENDERER_VERSION
+from utils.publish_repo import open_publish_repo, publish_repo_path
+from utils.publish_queue import get_publish_queue
+from utils.metrics import track_outbound
+from utils.tracing import traced, in_current_context
+from utils.site_manifest import SITE_URL, MANIFEST_PATH, parse_manifest, update_manifest, build_site_files
 
-def get_artefacts_by_date_range(start_date: datetime) -> List[Dict[str, Any]]:
-    """Retrieve artefacts created on the specified date."""
+# GitPython is only imported once a publish runs
+if TYPE_CHECKING:
+    from git import Repo, Commit
+
+# Number of artefacts read, rendered and committed together by process_artefacts_html
+HTML_RENDER_BATCH_SIZE = 200
+# Threads writing files into the publish repository
+PUBLISH_WRITE_WORKERS = 8
+# How publish_artefacts_to_github produces commits: through a sparse working
+# tree, or by writing trees straight into a bare repository
+PUBLISH_BACKENDS = ('worktree', 'tree')
+# Start method of the render processes. Forking a gunicorn worker, with its
+# request, event loop and profiler threads, can leave locks held in the child
+RENDER_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+# Fewer stale artefacts than this are rendered in the current process, so
+# small runs never start the render processes
+RENDER_POOL_MIN_ITEMS = 20
+# Top-level directories holding a published date
+DATE_DIRECTORY = re.compile(r'\d{4}-\d{2}-\d{2}')
+BLOB_MODE = 0o100644
+TREE_MODE = 0o040000
+
+@traced
+@read_only
+def get_artefacts_by_date_range(start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Retrieve artefacts published from start_date through end_date (inclusive).
+    Only the start_date is covered when end_date is not provided.
+    """
     # Ensure start_date is set to midnight (00:00:00)
     start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    # Set end_date to the end of the start_date (23:59:59)
-    end_date = start_date.replace(hour=23, minute=59, second=59, microsecond=999999)
+    # Set end_date to the end of its day (23:59:59)
+    end_date = (end_date or start_date).replace(hour=23, minute=59, second=59, microsecond=999999)
     
     artefacts = Artefact.query.filter(
         Artefact.published_at >= start_date,
@@ -21,18 +61,83 @@ def get_artefacts_by_date_range(start_date: datetime) -> List[Dict[str, Any]]:
     ).all()
     return [artefact.to_dict() for artefact in artefacts]
 
-def process_artefacts_html(start_date: Optional[datetime] = None) -> Dict[str, Any]:
+def _render_artefact_html(item: Tuple[int, str]) -> Tuple[int, Optional[str], Optional[str]]:
+    """Render one artefact's full_text to styled HTML.
+
+    Runs inside a worker process, so it only takes and returns plain values.
+    Returns (id, html, error).
+    """
+    artefact_id, full_text = item
+    try:
+        from utils.md2html import style_html
+        return artefact_id, str(style_html(full_text)), None
+    except Exception:
+        return artefact_id, None, traceback.format_exc()
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_key: Optional[Tuple[int, int]] = None
+_render_pool_lock = threading.Lock()
+
+def _get_render_pool(workers: int) -> ProcessPoolExecutor:
+    """The process's render pool, started on first use and kept for later calls."""
+    global _render_pool, _render_pool_key
+    # A pool inherited through fork belongs to the parent
+    key = (os.getpid(), workers)
+    with _render_pool_lock:
+        if _render_pool_key != key:
+            if _render_pool is not None and _render_pool_key[0] == key[0]:
+                _render_pool.shutdown(wait=False)
+            _render_pool = ProcessPoolExecutor(max_workers=workers,
+                                               mp_context=multiprocessing.get_context(RENDER_START_METHOD))
+            _render_pool_key = key
+        return _render_pool
+
+def shutdown_render_pool() -> None:
+    """Stop the render processes of this process, if it started any."""
+    global _render_pool, _render_pool_key
+    with _render_pool_lock:
+        if _render_pool is not None and _render_pool_key[0] == os.getpid():
+            _render_pool.shutdown()
+        _render_pool = _render_pool_key = None
+
+@traced
+def process_artefacts_html(start_date: Optional[datetime] = None, force: bool = False,
+                           batch_size: int = HTML_RENDER_BATCH_SIZE,
+                           max_workers: Optional[int] = None) -> Dict[str, Any]:
     """Process artefacts and generate styled HTML content.
     
+    Artefacts are read in batches, rendered across a process pool and committed
+    per batch, so a failure only loses the batch it happened in. Only stale
+    artefacts are rendered: those whose full_text changed since their html was
+    rendered, or whose html came from an older RENDERER_VERSION.
+    
     Args:
         start_date: Optional date to filter artefacts. If not provided, processes all artefacts.
+        force: Re-render every matching artefact, stale or not.
+        batch_size: Number of artefacts read, rendered and committed together.
+        max_workers: Size of the render process pool. Defaults to the RENDER_WORKERS
+            setting, at most the CPU count; 1 renders in the current process.
         
     Returns:
         Dict containing processing results with count and status information.
     """
+    processed_count = 0
+    total = 0
+    skipped = 0
+    batches = 0
+    # Track processed and failed files
+    processed_files = []
+    failed_files = []
+
     try:
-        # Build query based on date filter
-        query = Artefact.query
+        # Only load the columns needed for rendering
+        query = db.session.query(
+            Artefact.id, Artefact.title, Artefact.full_text,
+            Artefact.full_text_hash, Artefact.renderer_version
+        ).filter(
+            Artefact.full_text.isnot(None),
+            Artefact.full_text != ''
+        )
         if start_date:
             # Set time range for the specified date
             start = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -41,50 +146,77 @@ def process_artefacts_html(start_date: Optional[datetime] = None) -> Dict[str, A
                 Artefact.published_at >= start,
                 Artefact.published_at <= end
             )
-        
-        # Get all matching artefacts
-        artefacts = query.all()
-        
-        if not artefacts:
-            return {"message": "No artefacts found to process", "count": 0}
-        
-        processed_count = 0
-        # Track processed and failed files
-        processed_files = []
-        failed_files = []
-        
-        for artefact in artefacts:
-            try:
-                # Generate styled HTML from full_text
-                if artefact.full_text:
-                    from utils.md2html import style_html
-                    styled_html = style_html(artefact.full_text)
-                    
-                    # Update artefact with styled HTML
-                    artefact.html = styled_html
-                    db.session.add(artefact)
-                    processed_count += 1
-                    processed_files.append({
-                        'id': artefact.id,
-                        'title': artefact.title if hasattr(artefact, 'title') else None
+
+        workers = max_workers or min(get_settings().render_workers, os.cpu_count() or 1)
+
+        for rows in iter_batches(query, Artefact.id, batch_size):
+            total += len(rows)
+            batches += 1
+            titles = {row.id: row.title for row in rows}
+            hashes = {row.id: content_hash(row.full_text) for row in rows}
+            items = [
+                (row.id, row.full_text) for row in rows
+                if force or row.renderer_version != RENDERER_VERSION or row.full_text_hash != hashes[row.id]
+            ]
+            skipped += len(rows) - len(items)
+            if not items:
+                continue
+
+            # Rendering is CPU bound, so spread it across processes for larger batches
+            if workers > 1 and len(items) >= RENDER_POOL_MIN_ITEMS:
+                executor = _get_render_pool(workers)
+                chunksize = max(1, len(items) // (workers * 4))
+                try:
+                    rendered = list(executor.map(_render_artefact_html, items, chunksize=chunksize))
+                except BrokenProcessPool:
+                    # A render process died; start a fresh pool next time
+                    shutdown_render_pool()
+                    raise
+            else:
+                rendered = [_render_artefact_html(item) for item in items]
+
+            updates = []
+            batch_processed = []
+            for artefact_id, html, error in rendered:
+                if error:
+                    current_app.logger.error(f"Error processing artefact {artefact_id}: {error}")
+                    failed_files.append({
+                        'id': artefact_id,
+                        'title': titles[artefact_id],
+                        'error': error.strip().splitlines()[-1]
                     })
-            except Exception as e:
-                error_msg = str(e)
-                current_app.logger.error(f"Error processing artefact {artefact.id}: {traceback.format_exc()}")
-                failed_files.append({
-                    'id': artefact.id,
-                    'title': artefact.title if hasattr(artefact, 'title') else None,
-                    'error': error_msg
+                    continue
+                updates.append({
+                    'id': artefact_id,
+                    'html': html,
+                    'full_text_hash': hashes[artefact_id],
+                    'renderer_version': RENDERER_VERSION
                 })
+                batch_processed.append({'id': artefact_id, 'title': titles[artefact_id]})
+
+            if not updates:
                 continue
-        
-        # Commit all changes
-        db.session.commit()
-        
+
+            # Commit each batch on its own
+            try:
+                db.session.execute(update(Artefact), updates)
+                db.session.commit()
+                processed_count += len(updates)
+                processed_files.extend(batch_processed)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Error committing artefact batch {batches}: {traceback.format_exc()}")
+                failed_files.extend({**item, 'error': str(e)} for item in batch_processed)
+
+        if not total:
+            return {"message": "No artefacts found to process", "count": 0}
+
         return {
             "message": "Successfully processed artefacts",
             "count": processed_count,
-            "total": len(artefacts),
+            "total": total,
+            "skipped": skipped,
+            "batches": batches,
             "processed": processed_files,
             "failed": failed_files
         }
@@ -128,107 +260,500 @@ def get_safe_filename(full_text: str) -> str:
     safe_name = safe_name[:100]  # Limit to 100 characters
     return f"{safe_name}.md"
 
-def publish_artefacts_to_github(start_date: datetime, repo_path: str) -> Dict[str, Any]:
-    """Process artefacts and publish them to GitHub for a specific date.
-    Creates separate directories for markdown and HTML content, and ensures clean overwrites.
+@traced
+def build_publish_files(artefacts: List[Dict[str, Any]], date_str: str) -> Dict[str, str]:
+    """Build the files published for one date, as {repo-relative path: content}."""
+    files = {}
+    html_links = []  # Track HTML files for index
+
+    for artefact in artefacts:
+        # Generate filename from first line of full_text
+        base_filename = get_safe_filename(artefact['full_text'])
+        md_filename = base_filename
+        html_filename = base_filename.replace('.md', '.html')
+
+        files[f"{date_str}/md/{md_filename}"] = artefact['full_text']
+
+        if artefact.get('html'):
+            files[f"{date_str}/html/{html_filename}"] = artefact['html']
+
+            # Add to HTML links for index
+            title = artefact['full_text'].split('\n')[0].strip().replace('#', '').strip()
+            html_links.append(f"- [{title}]({SITE_URL}/{date_str}/html/{html_filename})")
+
+    # Create index.md if there are HTML files
+    if html_links:
+        files[f"{date_str}/index.md"] = f"# Articles for {date_str}\n\n" + "\n".join(html_links)
+
+    return files
+
+@traced
+def build_manifest_articles(artefacts: List[Dict[str, Any]], date_str: str) -> List[Dict[str, Any]]:
+    """Build the manifest entries of the articles published for one date."""
+    articles = {}
+    for artefact in artefacts:
+        base_filename = get_safe_filename(artefact['full_text'])
+        md_path = f"{date_str}/md/{base_filename}"
+        articles[md_path] = {
+            'id': artefact['id'],
+            'title': artefact['full_text'].split('\n')[0].strip().replace('#', '').strip(),
+            'published_at': artefact['published_at'],
+            'md': md_path,
+            'html': f"{date_str}/html/{base_filename.replace('.md', '.html')}" if artefact.get('html') else None
+        }
+    return sorted(articles.values(), key=lambda article: article['md'])
+
+@traced
+def load_head_manifest(repo: 'Repo') -> Dict[str, Any]:
+    """Load manifest.json as of HEAD."""
+    data = None
+    if repo.head.is_valid():
+        try:
+            data = (repo.head.commit.tree / MANIFEST_PATH).data_stream.read()
+        except KeyError:
+            pass
+    return parse_manifest(data)
+
+def git_blob_sha(data: bytes) -> str:
+    """Return the git blob id of some content, as `git hash-object` would."""
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+def _head_blobs(repo: 'Repo', directory: str) -> Dict[str, str]:
+    """Return {path: blob sha} for every file under a directory at HEAD.
+    An empty directory stands for the files directly at the root.
     """
     try:
-        # Get artefacts for the specified date
-        artefacts = get_artefacts_by_date_range(start_date)
+        if not directory:
+            return {item.path: item.hexsha for item in repo.head.commit.tree.blobs}
+        tree = repo.head.commit.tree / directory
+    except (KeyError, ValueError):
+        # Directory not in HEAD yet, or the repository has no commits
+        return {}
+    return {item.path: item.hexsha for item in tree.traverse() if item.type == 'blob'}
+
+def _diff_publish_files(repo: 'Repo', directory: str, files: Dict[str, str], head_blobs: Dict[str, str]) -> Dict[str, Any]:
+    """Work out what it takes to make a directory match the given files.
+
+    Files are compared with the working tree by content hash to decide what
+    to write, and with HEAD to decide what to stage or remove.
+    """
+    repo_path = repo.working_tree_dir
+    writes = []
+    staged = []
+
+    for rel_path, content in files.items():
+        data = content.encode('utf-8')
+        sha = git_blob_sha(data)
+        abs_path = os.path.join(repo_path, rel_path)
+
+        on_disk = None
+        if os.path.isfile(abs_path):
+            with open(abs_path, 'rb') as f:
+                on_disk = git_blob_sha(f.read())
+        if on_disk != sha:
+            writes.append((abs_path, data))
+
+        if head_blobs.get(rel_path) != sha:
+            staged.append(rel_path)
+
+    if not directory:
+        # Root files are updated individually, never swept
+        return {'writes': writes, 'staged': staged, 'removed': [], 'untracked': []}
+
+    # Files at HEAD or left on disk that are no longer part of the directory
+    stale_tracked = [path for path in head_blobs if path not in files]
+    stale_untracked = []
+    for root, _, names in os.walk(os.path.join(repo_path, directory)):
+        for name in names:
+            rel_path = os.path.relpath(os.path.join(root, name), repo_path).replace(os.sep, '/')
+            if rel_path not in files and rel_path not in head_blobs:
+                stale_untracked.append(rel_path)
+
+    return {
+        'writes': writes,
+        'staged': staged,
+        'removed': stale_tracked,
+        'untracked': stale_untracked
+    }
+
+@traced
+def _write_file(write: Tuple[str, bytes]) -> None:
+    abs_path, data = write
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    with open(abs_path, 'wb') as f:
+        f.write(data)
+
+@traced
+def sync_publish_files(repo: 'Repo', files_by_directory: Dict[str, Dict[str, str]],
+                       root_files: Optional[Dict[str, str]] = None,
+                       max_workers: int = PUBLISH_WRITE_WORKERS) -> Dict[str, Dict[str, List[str]]]:
+    """Make directories of the working tree and index match the given files.
+
+    Files are only written when their content differs from the working tree,
+    and only staged or removed when they differ from HEAD. Writes for all
+    directories run on a thread pool, and staging and removal are one batched
+    git call each.
+
+    Args:
+        files_by_directory: {top-level directory: {repo-relative path: content}}.
+        root_files: {path: content} of files at the repository root. Other
+            root files are left alone.
+
+    Returns:
+        Per directory, a dict with the 'written', 'staged' and 'removed'
+        (from the index) repo-relative paths. Root files are reported under ''.
+    """
+    repo_path = repo.working_tree_dir
+    plans = {
+        directory: _diff_publish_files(repo, directory, files, _head_blobs(repo, directory))
+        for directory, files in files_by_directory.items()
+    }
+    if root_files:
+        plans[''] = _diff_publish_files(repo, '', root_files, _head_blobs(repo, ''))
+
+    writes = [write for plan in plans.values() for write in plan['writes']]
+    if len(writes) > 1 and max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(in_current_context(_write_file), writes))
+    else:
+        for write in writes:
+            _write_file(write)
+
+    staged = [path for plan in plans.values() for path in plan['staged']]
+    removed = [path for plan in plans.values() for path in plan['removed']]
+
+    # Go through git itself: GitPython cannot read the index of a sparse checkout
+    if staged:
+        repo.git.add('--', *staged)
+    if removed:
+        repo.git.rm('-q', '--', *removed)
+    for plan in plans.values():
+        for rel_path in plan['untracked']:
+            os.remove(os.path.join(repo_path, rel_path))
+
+    # Drop directories left empty by removals
+    for directory in files_by_directory:
+        for root, dirs, names in os.walk(os.path.join(repo_path, directory), topdown=False):
+            if not dirs and not names:
+                os.rmdir(root)
+
+    return {
+        directory: {
+            'written': [os.path.relpath(path, repo_path).replace(os.sep, '/') for path, _ in plan['writes']],
+            'staged': plan['staged'],
+            'removed': plan['removed']
+        }
+        for directory, plan in plans.items()
+    }
+
+@traced
+def commit_index(repo: 'Repo', message: str) -> 'Commit':
+    """Commit the index on top of HEAD and advance the current branch."""
+    from git import Commit
+    return Commit.create_from_tree(repo, repo.git.write_tree(), message, head=True)
+
+def _store_object(repo: 'Repo', type: str, data: bytes) -> bytes:
+    """Write an object to the repository's object database and return its binary sha."""
+    from gitdb import IStream
+    return repo.odb.store(IStream(type, len(data), BytesIO(data))).binsha
+
+def _store_tree(repo: 'Repo', entries: List[Tuple[bytes, int, str]]) -> bytes:
+    """Write a tree object from (binsha, mode, name) entries."""
+    from git.objects.fun import tree_to_stream
+    # Git orders tree entries by name, with directories compared as if they ended in '/'
+    entries = sorted(entries, key=lambda entry: entry[2] + '/' if entry[1] == TREE_MODE else entry[2])
+    stream = BytesIO()
+    tree_to_stream(entries, stream.write)
+    return _store_object(repo, 'tree', stream.getvalue())
+
+def _store_directory(repo: 'Repo', files: Dict[str, bytes], known_blobs: Dict[str, str]) -> bytes:
+    """Write the blobs and nested trees of a directory and return its tree's binary sha.
+
+    Args:
+        files: {path relative to the directory: content}.
+        known_blobs: {path relative to the directory: hex sha} of blobs that
+            already exist in the object database and need no write.
+    """
+    entries = []
+    subdirectories = {}
+    for rel_path, data in files.items():
+        name, _, rest = rel_path.partition('/')
+        if rest:
+            subdirectories.setdefault(name, {})[rest] = data
+            continue
+        sha = git_blob_sha(data)
+        if known_blobs.get(rel_path) != sha:
+            _store_object(repo, 'blob', data)
+        entries.append((bytes.fromhex(sha), BLOB_MODE, name))
+
+    for name, subfiles in subdirectories.items():
+        prefix = f"{name}/"
+        subknown = {path[len(prefix):]: sha for path, sha in known_blobs.items() if path.startswith(prefix)}
+        entries.append((_store_directory(repo, subfiles, subknown), TREE_MODE, name))
+
+    return _store_tree(repo, entries)
+
+@traced
+def build_publish_tree(repo: 'Repo', files_by_directory: Dict[str, Dict[str, str]],
+                       root_files: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, Dict[str, List[str]]]]:
+    """Build the root tree of HEAD with top-level directories replaced by the given files.
+
+    Blobs and trees are written straight into the object database, so no
+    working tree or index is involved.
+
+    Args:
+        files_by_directory: {top-level directory: {repo-relative path: content}}.
+        root_files: {path: content} of files at the repository root. Other
+            root files are left alone.
+
+    Returns:
+        The new root tree's hex sha (HEAD's own tree when nothing changed),
+        and per directory a dict with the 'staged' and 'removed' paths. Root
+        files are reported under ''.
+    """
+    parent_tree = repo.head.commit.tree if repo.head.is_valid() else None
+    root_entries = {item.name: (item.binsha, item.mode, item.name) for item in parent_tree} if parent_tree else {}
+    changes = {}
+
+    for directory, files in files_by_directory.items():
+        head_blobs = _head_blobs(repo, directory)
+        data_by_path = {path: content.encode('utf-8') for path, content in files.items()}
+        changes[directory] = {
+            'staged': [path for path, data in data_by_path.items() if head_blobs.get(path) != git_blob_sha(data)],
+            'removed': [path for path in head_blobs if path not in files]
+        }
+        if not changes[directory]['staged'] and not changes[directory]['removed']:
+            continue
+
+        prefix = f"{directory}/"
+        tree_sha = _store_directory(
+            repo,
+            {path[len(prefix):]: data for path, data in data_by_path.items()},
+            {path[len(prefix):]: sha for path, sha in head_blobs.items()}
+        )
+        root_entries[directory] = (tree_sha, TREE_MODE, directory)
+
+    if root_files:
+        head_blobs = _head_blobs(repo, '')
+        changes[''] = {'staged': [], 'removed': []}
+        for path, content in root_files.items():
+            data = content.encode('utf-8')
+            if head_blobs.get(path) == git_blob_sha(data):
+                continue
+            root_entries[path] = (_store_object(repo, 'blob', data), BLOB_MODE, path)
+            changes['']['staged'].append(path)
+
+    if parent_tree is not None and not any(change['staged'] or change['removed'] for change in changes.values()):
+        return parent_tree.hexsha, changes
+
+    return _store_tree(repo, list(root_entries.values())).hex(), changes
+
+@traced
+def commit_and_push(repo: 'Repo', backend: str, message: str, tree_sha: Optional[str] = None) -> None:
+    """Commit on top of HEAD and push the branch: the index, or with backend='tree' the given tree."""
+    if backend == 'tree':
+        from git import Commit
+        Commit.create_from_tree(repo, tree_sha, message, head=True)
+        branch = repo.active_branch.name
+        with track_outbound('git', 'push'):
+            repo.git.push('origin', f'refs/heads/{branch}:refs/heads/{branch}')
+    else:
+        commit_index(repo, message)
+        with track_outbound('git', 'push'):
+            repo.remotes.origin.push()
+
+@traced
+def publish_artefacts_to_github(start_date: datetime, repo_path: Optional[str] = None,
+                                end_date: Optional[datetime] = None, backend: str = 'worktree') -> Dict[str, Any]:
+    """Process artefacts and publish them to GitHub for a date or a range of dates.
+    Creates separate directories for markdown and HTML content under each date.
+    Only files whose content changed are written, staged or removed, all dates
+    go into a single commit and push, and nothing is committed or pushed when
+    every date is already up to date. The root manifest.json, archive.md and
+    feed.xml are updated from the published dates' entries only.
+
+    With backend='tree' the commit is built directly in a bare repository's
+    object database instead of going through a working tree and index.
+    """
+    if backend not in PUBLISH_BACKENDS:
+        raise ValueError(f"Invalid publish backend: {backend}")
+
+    try:
+        # Get artefacts for the specified dates
+        artefacts = get_artefacts_by_date_range(start_date, end_date)
         
         if not artefacts:
             return {"message": "No artefacts found for the specified date range", "count": 0}
 
         # Configure Git repo
-        repo_url = load_api_key('git_publish_repo')
+        repo_url = get_settings().require('git_publish_repo')
         if not repo_url:
             raise ValueError("Git repo not configured")
 
-        # Clone repository if it doesn't exist, otherwise open existing repo
-        if not os.path.exists(repo_path):
-            repo = Repo.clone_from(repo_url, repo_path)
+        # Group artefacts by the date directory they are published under
+        artefacts_by_date = {}
+        for artefact in artefacts:
+            date_str = artefact['published_at'][:10]
+            artefacts_by_date.setdefault(date_str, []).append(artefact)
+        date_strs = sorted(artefacts_by_date)
+
+        files_by_date = {
+            date_str: build_publish_files(artefacts_by_date[date_str], date_str)
+            for date_str in date_strs
+        }
+        if len(date_strs) == 1:
+            commit_message = f"Update artefacts for {date_strs[0]}"
         else:
-            repo = Repo(repo_path)
-            # Update remote URL with credentials
-            repo.remote().set_url(repo_url)
-        
-        # Ensure we're on main/master branch and pull latest changes
-        main_branch = repo.active_branch
-        repo.remotes.origin.pull()
+            commit_message = f"Update artefacts for {date_strs[0]} to {date_strs[-1]}"
 
-        files_created = []
-        html_links = []  # Track HTML files for index
-        
-        # Create date directory path
-        date_str = start_date.strftime('%Y-%m-%d')
-        date_path = os.path.join(repo_path, date_str)
-        
-        # Create md and html directories paths
-        md_dir = os.path.join(date_path, 'md')
-        html_dir = os.path.join(date_path, 'html')
-        
-        # Remove entire date directory if it exists (including any nested directories)
-        if os.path.exists(date_path):
-            # Stage deletions in git (using correct git rm parameters)
-            repo.index.remove(os.path.join(date_str, '**'), r=True, cached=True)
-            
-            # Remove files from filesystem
-            import shutil
-            shutil.rmtree(date_path)
-        
-        # Create fresh directories
-        os.makedirs(md_dir, exist_ok=True)
-        os.makedirs(html_dir, exist_ok=True)
+        if backend == 'tree':
+            repo = open_publish_repo(repo_url, repo_path, bare=True)
+        else:
+            repo = open_publish_repo(repo_url, repo_path, date_strs)
 
-        for artefact in artefacts:
-            # Generate filename from first line of full_text
-            base_filename = get_safe_filename(artefact['full_text'])
-            md_filename = base_filename
-            html_filename = base_filename.replace('.md', '.html')
-
-            # Write markdown content
-            md_path = os.path.join(md_dir, md_filename)
-            with open(md_path, 'w', encoding='utf-8') as f:
-                f.write(artefact['full_text'])
-            files_created.append(f"{date_str}/md/{md_filename}")
-
-            # Write HTML content if available
-            if artefact.get('html'):
-                html_path = os.path.join(html_dir, html_filename)
-                with open(html_path, 'w', encoding='utf-8') as f:
-                    f.write(artefact['html'])
-                files_created.append(f"{date_str}/html/{html_filename}")
-                
-                # Add to HTML links for index
-                title = artefact['full_text'].split('\n')[0].strip().replace('#', '').strip()
-                html_links.append(f"- [{title}](https://keithhchen.github.io/wpa-md-previews/{date_str}/html/{html_filename})")
-
-            # Stage the new files
-            repo.index.add([md_path])
-            if artefact.get('html'):
-                repo.index.add([html_path])
-
-        # Create index.md if there are HTML files
-        if html_links:
-            index_content = f"# Articles for {date_str}\n\n" + "\n".join(html_links)
-            index_path = os.path.join(date_path, 'index.md')
-            with open(index_path, 'w', encoding='utf-8') as f:
-                f.write(index_content)
-            files_created.append(f"{date_str}/index.md")
-            repo.index.add([index_path])
-
-        if files_created:
+        # Only the published dates' manifest entries change; the archive and
+        # feed are generated from the manifest without listing the repository
+        manifest = update_manifest(load_head_manifest(repo), {
+            date_str: build_manifest_articles(artefacts_by_date[date_str], date_str)
+            for date_str in date_strs
+        })
+        site_files = build_site_files(manifest)
+
+        if backend == 'tree':
+            tree_sha, changes = build_publish_tree(repo, files_by_date, site_files)
+        else:
+            changes = sync_publish_files(repo, files_by_date, site_files)
+
+        changed = [path for plan in changes.values() for path in plan['staged']]
+        removed = [path for plan in changes.values() for path in plan['removed']]
+        committed = bool(changed or removed)
+        if committed:
             # Commit and push all changes (both deletions and additions)
-            commit_message = f"Update artefacts for {start_date.strftime('%Y-%m-%d')}"
-            repo.index.commit(commit_message)
-            repo.remotes.origin.push()
+            commit_and_push(repo, backend, commit_message, tree_sha if backend == 'tree' else None)
 
+        files = [path for date_str in date_strs for path in files_by_date[date_str]]
         return {
-            "message": "Successfully published artefacts to GitHub",
-            "count": len(files_created),
-            "files": files_created
+            "message": "Successfully published artefacts to GitHub" if committed else "Artefacts already up to date",
+            "count": len(files),
+            "files": files,
+            "changed": changed,
+            "removed": removed,
+            "committed": committed,
+            "dates": {
+                date_str: {
+                    "artefacts": len(artefacts_by_date[date_str]),
+                    "count": len(files_by_date[date_str]),
+                    "changed": len(changes[date_str]['staged']),
+                    "removed": len(changes[date_str]['removed'])
+                }
+                for date_str in date_strs
+            }
         }
 
     except Exception as e:
         current_app.logger.error(f"Error publishing artefacts to GitHub: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+@traced
+def queue_publish_artefacts(start_date: datetime, repo_path: Optional[str] = None,
+                            end_date: Optional[datetime] = None, backend: str = 'worktree') -> Dict[str, Any]:
+    """Publish artefacts through the repository's publish queue.
+
+    Publishes to the same repository run one at a time, across threads and
+    worker processes, and a request for the same dates as an already queued
+    run is answered by that run. The result's 'coalesced' entry counts the
+    requests a run answered besides its own; requests that joined another
+    run get 'coalesced_into' set.
+    """
+    if backend not in PUBLISH_BACKENDS:
+        raise ValueError(f"Invalid publish backend: {backend}")
+    repo_path = repo_path or publish_repo_path(bare=backend == 'tree')
+    key = (start_date.date(), (end_date or start_date).date(), backend)
+
+    result, joined = get_publish_queue(repo_path).submit(
+        key,
+        lambda: publish_artefacts_to_github(start_date, repo_path, end_date, backend)
+    )
+    if joined:
+        result = dict(result, coalesced_into=True)
+    return result
+
+def _published_manifest_articles(repo: 'Repo', date_str: str, artefacts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Manifest entries of the articles in a date directory at HEAD.
+
+    Entries come from the date's artefacts where they still match a
+    published file; files without one get an entry from their first line.
+    """
+    md_blobs = _head_blobs(repo, f"{date_str}/md")
+    html_paths = set(_head_blobs(repo, f"{date_str}/html"))
+    from_artefacts = {article['md']: article for article in build_manifest_articles(artefacts, date_str)}
+    articles = []
+    for md_path in sorted(md_blobs):
+        article = from_artefacts.get(md_path)
+        if article is None:
+            first_line = (repo.head.commit.tree / md_path).data_stream.read().decode('utf-8').split('\n')[0]
+            article = {
+                'id': None,
+                'title': first_line.strip().replace('#', '').strip(),
+                'published_at': f"{date_str}T00:00:00",
+                'md': md_path,
+            }
+        html_path = f"{date_str}/html/{md_path.rsplit('/', 1)[-1].replace('.md', '.html')}"
+        articles.append(dict(article, html=html_path if html_path in html_paths else None))
+    return articles
+
+@traced
+def rebuild_site_manifest(repo_path: Optional[str] = None, backend: str = 'worktree') -> Dict[str, Any]:
+    """Rebuild manifest.json, archive.md and feed.xml from every date directory in the publish repository.
+
+    Dates published before the manifest existed only show up in the archive
+    and feed after this has run once. Commits and pushes only when the root
+    files change.
+    """
+    if backend not in PUBLISH_BACKENDS:
+        raise ValueError(f"Invalid publish backend: {backend}")
+    repo_url = get_settings().require('git_publish_repo')
+    repo_path = repo_path or publish_repo_path(bare=backend == 'tree')
+
+    def run() -> Dict[str, Any]:
+        if backend == 'tree':
+            repo = open_publish_repo(repo_url, repo_path, bare=True)
+        else:
+            # Only the root files are checked out
+            repo = open_publish_repo(repo_url, repo_path)
+        if not repo.head.is_valid():
+            return {"message": "Nothing published yet", "dates": 0, "committed": False}
+
+        date_strs = sorted(
+            (item.name for item in repo.head.commit.tree.trees if DATE_DIRECTORY.fullmatch(item.name)),
+            reverse=True
+        )
+        artefacts_by_date: Dict[str, List[Dict[str, Any]]] = {}
+        if date_strs:
+            artefacts = get_artefacts_by_date_range(datetime.strptime(date_strs[-1], '%Y-%m-%d'),
+                                                    datetime.strptime(date_strs[0], '%Y-%m-%d'))
+            for artefact in artefacts:
+                artefacts_by_date.setdefault(artefact['published_at'][:10], []).append(artefact)
+        manifest = update_manifest(parse_manifest(None), {
+            date_str: _published_manifest_articles(repo, date_str, artefacts_by_date.get(date_str, []))
+            for date_str in date_strs
+        })
+        site_files = build_site_files(manifest)
+
+        if backend == 'tree':
+            tree_sha, changes = build_publish_tree(repo, {}, site_files)
+        else:
+            changes = sync_publish_files(repo, {}, site_files)
+        changed = changes['']['staged']
+        if changed:
+            commit_and_push(repo, backend, "Rebuild site manifest", tree_sha if backend == 'tree' else None)
+        return {
+            "message": "Rebuilt site manifest" if changed else "Site manifest already up to date",
+            "dates": len(date_strs),
+            "articles": sum(len(entry['articles']) for entry in manifest['dates'].values()),
+            "changed": changed,
+            "committed": bool(changed),
+        }
+
+    result, _ = get_publish_queue(repo_path).submit(('rebuild-manifest', backend), run)
+    return result
@@ -0,0 +1,201 @@
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import delete, func
+from models import db, YoutubeVideo, Artefact, ChannelDailyStats, ArtefactDailyStats
+from models.db import read_only, increment_counters, iter_batches
+from utils.tracing import traced
+
+REBUILD_BATCH_SIZE = 1000
+
+Figures = Dict[str, Any]
+
+def _video_figures(channel_id: Optional[str], published_at: Optional[datetime], duration: Optional[int],
+                   transcribed: bool) -> Optional[Figures]:
+    if not published_at or not channel_id:
+        return None
+    return {
+        'day': published_at.date(),
+        'channel_id': channel_id,
+        'videos': 1,
+        'duration_seconds': int(duration or 0),
+        'transcribed': 1 if transcribed else 0,
+    }
+
+def video_figures(video: Optional[YoutubeVideo]) -> Optional[Figures]:
+    """What a video adds to channel_daily_stats. Take it before and after changing the video."""
+    if video is None:
+        return None
+    # Transcribed as update_missing_transcripts sees it: the column is set
+    return _video_figures(video.channel_id, video.published_at, video.duration, video.formatted_transcript is not None)
+
+def artefact_figures(artefact: Optional[Artefact]) -> Optional[Figures]:
+    """What an artefact adds to artefact_daily_stats. Take it before and after changing the artefact.
+
+    Artefacts without a created_at are not counted, as in rebuild_stats, so
+    set it on a new artefact before taking its figures.
+    """
+    if artefact is None or not artefact.source or artefact.created_at is None:
+        return None
+    return {'day': artefact.created_at.date(), 'source': artefact.source, 'artefacts': 1}
+
+def _add(totals: Dict[tuple, Figures], keys: Sequence[str], figures: Optional[Figures], sign: int = 1) -> None:
+    if figures is None:
+        return
+    row = totals.setdefault(tuple(figures[key] for key in keys), {key: figures[key] for key in keys})
+    for column, amount in figures.items():
+        if column not in keys:
+            row[column] = row.get(column, 0) + sign * amount
+
+def _record_change(model: Any, keys: Sequence[str], previous: Optional[Figures], current: Optional[Figures]) -> None:
+    rows: Dict[tuple, Figures] = {}
+    _add(rows, keys, previous, -1)
+    _add(rows, keys, current)
+    increment_counters(model, keys, [
+        row for row in rows.values() if any(amount for column, amount in row.items() if column not in keys)
+    ])
+
+def record_video_change(previous: Optional[Figures], current: Optional[Figures]) -> None:
+    """Move a video's figures in channel_daily_stats from before a change to after it, in the current transaction.
+
+    previous is None for a new video, current None for a deleted one. The
+    caller commits.
+    """
+    _record_change(ChannelDailyStats, ('day', 'channel_id'), previous, current)
+
+def record_artefact_change(previous: Optional[Figures], current: Optional[Figures]) -> None:
+    """Move an artefact's figures in artefact_daily_stats, like record_video_change."""
+    _record_change(ArtefactDailyStats, ('day', 'source'), previous, current)
+
+def _range(query: Any, day: Any, start_date: Optional[date], end_date: Optional[date]) -> Any:
+    if start_date:
+        query = query.filter(day >= start_date)
+    if end_date:
+        query = query.filter(day <= end_date)
+    return query
+
+def _minutes(seconds: int) -> float:
+    return round(seconds / 60, 1)
+
+def _coverage(transcribed: int, videos: int) -> Optional[float]:
+    return round(transcribed / videos, 4) if videos else None
+
+@traced
+@read_only
+def get_daily_stats(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                    channel_id: Optional[str] = None) -> Dict[str, Any]:
+    """Per-day dashboard figures for a date range (inclusive), with totals over the range.
+
+    Videos count by the day they were published, artefacts by the day they
+    were created; channel_id narrows the video figures only. Reads the daily
+    rollups, so the cost grows with the days in the range, not with the
+    number of videos and artefacts.
+    """
+    video_query = db.session.query(
+        ChannelDailyStats.day,
+        func.sum(ChannelDailyStats.videos),
+        func.sum(ChannelDailyStats.duration_seconds),
+        func.sum(ChannelDailyStats.transcribed),
+    )
+    if channel_id:
+        video_query = video_query.filter(ChannelDailyStats.channel_id == channel_id)
+    video_query = _range(video_query, ChannelDailyStats.day, start_date, end_date).group_by(ChannelDailyStats.day)
+    artefact_query = _range(
+        db.session.query(ArtefactDailyStats.day, ArtefactDailyStats.source, ArtefactDailyStats.artefacts),
+        ArtefactDailyStats.day, start_date, end_date
+    )
+
+    days: Dict[date, Dict[str, Any]] = {}
+
+    def day_row(day: date) -> Dict[str, Any]:
+        return days.setdefault(day, {'videos': 0, 'duration_seconds': 0, 'transcribed': 0, 'artefacts': {}})
+
+    for day, videos, duration_seconds, transcribed in video_query.all():
+        if videos:
+            day_row(day).update(videos=int(videos), duration_seconds=int(duration_seconds), transcribed=int(transcribed))
+    for day, source, artefacts in artefact_query.all():
+        if artefacts:
+            day_row(day)['artefacts'][source] = artefacts
+
+    rows = []
+    for day in sorted(days):
+        row = days[day]
+        rows.append({
+            'day': day.isoformat(),
+            'videos': row['videos'],
+            'minutes': _minutes(row['duration_seconds']),
+            'transcribed': row['transcribed'],
+            'transcript_coverage': _coverage(row['transcribed'], row['videos']),
+            'artefacts': sum(row['artefacts'].values()),
+            'artefacts_by_source': row['artefacts'],
+        })
+
+    videos = sum(row['videos'] for row in days.values())
+    transcribed = sum(row['transcribed'] for row in days.values())
+    artefacts = sum(row['artefacts'] for row in rows)
+    first, last = start_date or (min(days) if days else None), end_date or (max(days) if days else None)
+    span = (last - first).days + 1 if first and last and last >= first else 0
+    return {
+        'days': rows,
+        'totals': {
+            'videos': videos,
+            'minutes': _minutes(sum(row['duration_seconds'] for row in days.values())),
+            'transcribed': transcribed,
+            'transcript_coverage': _coverage(transcribed, videos),
+            'artefacts': artefacts,
+            'artefacts_per_day': round(artefacts / span, 2) if span else None,
+        },
+    }
+
+@traced
+@read_only
+def get_channel_daily_stats(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                            channel_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Videos, minutes and transcripts of each channel on each day of a date range (inclusive)."""
+    query = db.session.query(ChannelDailyStats).filter(ChannelDailyStats.videos > 0)
+    if channel_id:
+        query = query.filter(ChannelDailyStats.channel_id == channel_id)
+    query = _range(query, ChannelDailyStats.day, start_date, end_date)
+    return [{
+        'day': row.day.isoformat(),
+        'channel_id': row.channel_id,
+        'videos': row.videos,
+        'minutes': _minutes(row.duration_seconds),
+        'transcribed': row.transcribed,
+        'transcript_coverage': _coverage(row.transcribed, row.videos),
+    } for row in query.order_by(ChannelDailyStats.day, ChannelDailyStats.channel_id).all()]
+
+@traced
+def rebuild_stats(batch_size: int = REBUILD_BATCH_SIZE) -> Dict[str, int]:
+    """Rebuild channel_daily_stats and artefact_daily_stats from youtube_videos and artefacts, in one transaction."""
+    db.session.execute(delete(ChannelDailyStats))
+    db.session.execute(delete(ArtefactDailyStats))
+
+    channel_days: Dict[tuple, Figures] = {}
+    videos = 0
+    query = db.session.query(YoutubeVideo.id, YoutubeVideo.channel_id, YoutubeVideo.published_at, YoutubeVideo.duration,
+                             # Whether there is a transcript, without reading its text
+                             YoutubeVideo.formatted_transcript.isnot(None).label('transcribed'))
+    for rows in iter_batches(query, YoutubeVideo.id, batch_size):
+        videos += len(rows)
+        for row in rows:
+            _add(channel_days, ('day', 'channel_id'),
+                 _video_figures(row.channel_id, row.published_at, row.duration, row.transcribed))
+
+    artefact_days: Dict[tuple, Figures] = {}
+    artefacts = 0
+    query = db.session.query(Artefact.id, Artefact.source, Artefact.created_at)
+    for rows in iter_batches(query, Artefact.id, batch_size):
+        artefacts += len(rows)
+        for row in rows:
+            if row.created_at:
+                _add(artefact_days, ('day', 'source'), {'day': row.created_at.date(), 'source': row.source, 'artefacts': 1})
+
+    increment_counters(ChannelDailyStats, ('day', 'channel_id'), channel_days.values())
+    increment_counters(ArtefactDailyStats, ('day', 'source'), artefact_days.values())
+    db.session.commit()
+    return {
+        'videos': videos,
+        'artefacts': artefacts,
+        'channel_days': len(channel_days),
+        'artefact_days': len(artefact_days),
+    }
@@ -0,0 +1,107 @@
+import json
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, func
+from models import db, YoutubeVideo, VideoTag, VideoTagDailyCount
+from models.db import read_only, increment_counters, iter_batches
+from utils.tracing import traced
+
+# Longest tag kept, the width of the tag columns
+MAX_TAG_LENGTH = 255
+REBUILD_BATCH_SIZE = 1000
+
+def normalize_tag(tag: str) -> str:
+    """Lowercase a tag and collapse its whitespace, so 'AI ' and 'ai' are one tag."""
+    return ' '.join(str(tag).split()).lower()[:MAX_TAG_LENGTH]
+
+def normalize_tags(tags: Any) -> List[str]:
+    """Distinct normalized tags of a video's tags column (a list, or its JSON text)."""
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            tags = [tags]
+    return sorted({normalize_tag(tag) for tag in tags or [] if tag is not None and str(tag).strip()})
+
+def _day(published_at: Optional[datetime]) -> Optional[date]:
+    return published_at.date() if published_at else None
+
+def _count_changes(changes: Counter) -> None:
+    increment_counters(VideoTagDailyCount, ('day', 'tag'), [
+        {'day': day, 'tag': tag, 'videos': videos} for (day, tag), videos in changes.items() if videos and day
+    ])
+
+def sync_video_tags(video: YoutubeVideo, previous_tags: Any = None,
+                    previous_published_at: Optional[datetime] = None) -> None:
+    """Bring video_tags and the daily tag counts in line with a video, in the current transaction.
+
+    Pass the video's tags and published_at from before the change, or
+    nothing for a new video. The caller commits.
+    """
+    tags, old_tags = set(normalize_tags(video.tags)), set(normalize_tags(previous_tags))
+    day, old_day = _day(video.published_at), _day(previous_published_at)
+    if tags == old_tags and day == old_day:
+        return
+
+    removed, added = old_tags - tags, tags - old_tags
+    if removed:
+        db.session.execute(delete(VideoTag).where(VideoTag.video_id == video.video_id, VideoTag.tag.in_(removed)))
+    db.session.add_all(VideoTag(video_id=video.video_id, tag=tag) for tag in sorted(added))
+
+    changes: Counter = Counter()
+    for tag in old_tags:
+        changes[(old_day, tag)] -= 1
+    for tag in tags:
+        changes[(day, tag)] += 1
+    _count_changes(changes)
+
+def remove_video_tags(video: YoutubeVideo) -> None:
+    """Drop a video that is being deleted from video_tags and the daily tag counts."""
+    db.session.execute(delete(VideoTag).where(VideoTag.video_id == video.video_id))
+    _count_changes(Counter({(_day(video.published_at), tag): -1 for tag in normalize_tags(video.tags)}))
+
+@traced
+@read_only
+def get_tag_facets(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                   limit: int = 50) -> List[Dict[str, Any]]:
+    """Most used tags of the videos published in a date range (inclusive), with their video counts.
+
+    Reads the daily counts, so the cost grows with the days in the range,
+    not with the number of videos.
+    """
+    total = func.sum(VideoTagDailyCount.videos).label('videos')
+    query = db.session.query(VideoTagDailyCount.tag, total)
+    if start_date:
+        query = query.filter(VideoTagDailyCount.day >= start_date)
+    if end_date:
+        query = query.filter(VideoTagDailyCount.day <= end_date)
+    query = query.group_by(VideoTagDailyCount.tag).having(total > 0)
+    rows = query.order_by(total.desc(), VideoTagDailyCount.tag).limit(limit).all()
+    return [{'tag': tag, 'videos': int(videos)} for tag, videos in rows]
+
+@traced
+def rebuild_video_tags(batch_size: int = REBUILD_BATCH_SIZE) -> Dict[str, int]:
+    """Rebuild video_tags and the daily tag counts from youtube_videos, in one transaction."""
+    db.session.execute(delete(VideoTag))
+    db.session.execute(delete(VideoTagDailyCount))
+    counts: Counter = Counter()
+    pending: List[Dict[str, str]] = []
+    videos = 0
+    query = db.session.query(YoutubeVideo.id, YoutubeVideo.video_id, YoutubeVideo.tags, YoutubeVideo.published_at)
+    for rows in iter_batches(query, YoutubeVideo.id, batch_size):
+        videos += len(rows)
+        for row in rows:
+            day = _day(row.published_at)
+            for tag in normalize_tags(row.tags):
+                pending.append({'video_id': row.video_id, 'tag': tag})
+                if day:
+                    counts[(day, tag)] += 1
+        if len(pending) >= batch_size:
+            db.session.execute(VideoTag.__table__.insert(), pending)
+            pending = []
+    if pending:
+        db.session.execute(VideoTag.__table__.insert(), pending)
+    _count_changes(counts)
+    db.session.commit()
+    return {'videos': videos, 'tags': len({tag for _, tag in counts}), 'daily_counts': len(counts)}
@@ -1,15 +1,22 @@
 from flask import current_app
-from models import db, YoutubeChannel, YoutubeVideo
+from models import db, YoutubeChannel, YoutubeVideo, VideoTag
+from models.db import read_only
 from typing import Optional, Dict, Any, List
+from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
-import requests
 from urllib.parse import urlparse, parse_qs
-from utils.main import load_api_key, format_datetime
+from utils.main import format_datetime
+from utils.settings import get_settings
+from utils.async_runtime import run_async, request_json
+from utils.metrics import track_outbound, VIDEOS_INGESTED, TRANSCRIPTS_PRODUCED
+from utils.tracing import traced
+from services.video_tag_service import normalize_tag, sync_video_tags
+from services.stats_service import video_figures, record_video_change
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
-api_key = load_api_key("youtube_api_key")
-
+@traced
+@read_only
 def get_videos(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -18,9 +25,10 @@ def get_videos(
     duration_max: Optional[int] = None,
     limit: int = 50,
     offset: int = 0,
-    include_full_text: bool = False
+    include_full_text: bool = False,
+    tag: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Get videos with optional filters."""
+    """Get videos with optional filters. tag matches case-insensitively, through video_tags."""
     query = YoutubeVideo.query
 
     # Apply filters if provided
@@ -42,6 +50,9 @@ def get_videos(
     
     if duration_max is not None:
         query = query.filter(YoutubeVideo.duration <= duration_max)
+
+    if tag:
+        query = query.join(VideoTag, VideoTag.video_id == YoutubeVideo.video_id).filter(VideoTag.tag == normalize_tag(tag))
     
     # Get total count before pagination
     total_count = query.count()
@@ -80,6 +91,7 @@ def get_videos(
         'videos': video_list
     }
     
+@traced
 def create_channel(channel_data: Dict[str, Any]) -> Dict[str, Any]:
     # Check for existing channel by channel_id
     existing_channel = YoutubeChannel.query.filter_by(channel_id=channel_data['channel_id']).first()
@@ -97,66 +109,93 @@ def create_channel(channel_data: Dict[str, Any]) -> Dict[str, Any]:
         db.session.commit()
         return new_channel.to_dict()
 
+@traced
+@read_only
 def get_channel(channel_id: str) -> Optional[Dict[str, Any]]:
     channel = YoutubeChannel.query.filter_by(channel_id=channel_id).first()
     return channel.to_dict() if channel else None
 
+@traced
 def update_channel(channel_id: str, updated_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    channel = get_channel(channel_id)
+    # Loaded from the primary, unlike get_channel, since it is about to be written
+    channel = YoutubeChannel.query.filter_by(channel_id=channel_id).first()
     if channel:
         for key, value in updated_data.items():
             setattr(channel, key, value)
         db.session.commit()
     return channel.to_dict() if channel else None
 
+@traced
 def delete_channel(channel_id: str) -> Optional[Dict[str, Any]]:
-    channel = get_channel(channel_id)
+    channel = YoutubeChannel.query.filter_by(channel_id=channel_id).first()
     if channel:
         db.session.delete(channel)
         db.session.commit()
     return channel.to_dict() if channel else None
 
+@traced
 def get_all_channels() -> List[Dict[str, Any]]:
     """Retrieve all YouTube channels from the database."""
     channels = YoutubeChannel.query.all()
     return [channel.to_dict() for channel in channels]
 
+@traced
 def store_new_video(video_data: Dict[str, Any]) -> Dict[str, Any]:
     """Store a new video in the database or update if it already exists.
     Returns a dictionary containing the video data and its status (new/updated).
     """
-    # Check for existing video by video_id
-    existing_video = YoutubeVideo.query.filter_by(video_id=video_data['video_id']).first()
+    # Check for existing video by video_id, locked until the commit so that a
+    # concurrent update cannot change it between reading its previous tags and
+    # figures and writing the new ones
+    existing_video = YoutubeVideo.query.filter_by(video_id=video_data['video_id']).with_for_update().populate_existing().first()
     
     try:
         if existing_video:
+            previous_tags, previous_published_at = existing_video.tags, existing_video.published_at
+            previous_figures = video_figures(existing_video)
             # Update existing video's data
             for key, value in video_data.items():
                 setattr(existing_video, key, value)
             status = 'updated'
             video = existing_video
+            sync_video_tags(video, previous_tags, previous_published_at)
+            record_video_change(previous_figures, video_figures(video))
         else:
             # Create a new video if it doesn't exist
             new_video = YoutubeVideo(**video_data)
             db.session.add(new_video)
+            # video_tags rows reference the video, so it has to be inserted first
+            db.session.flush()
             status = 'new'
             video = new_video
+            sync_video_tags(video)
+            record_video_change(None, video_figures(video))
         
-        db.session.commit()  # Commit the changes
+        # The video, its tag index and counts and the daily stats are committed together
+        db.session.commit()
+        if status == 'new':
+            VIDEOS_INGESTED.inc()
         result = video.to_dict()
         result['status'] = status
         return result
     except IntegrityError:
         db.session.rollback()  # Rollback in case of any integrity errors
 
+@traced
 def update_missing_transcripts(limit: int = 2) -> Dict[str, Any]:
-    """Fetch and store transcripts for videos that don't have them."""
+    """Fetch and store transcripts for videos that don't have them.
+
+    Concurrent runs may pick the same video. Only the run that stores its
+    transcript first counts it, in the stats and metrics; the others report
+    it as skipped.
+    """
     videos = YoutubeVideo.query.filter(
         YoutubeVideo.formatted_transcript.is_(None)
     ).limit(limit).all()
     
     processed_videos = []
     success_count = 0
+    skipped_count = 0
     
     for video in videos:
         result = {
@@ -168,19 +207,38 @@ def update_missing_transcripts(limit: int = 2) -> Dict[str, Any]:
         
         try:
             data = get_transcription(video.url)
-            if 'error' not in data:
+            if 'error' in data:
+                result['error'] = data['error']
+            elif data.get('formatted_transcript') is None:
+                result['error'] = "No transcript returned"
+            else:
                 try:
-                    video.formatted_transcript = data.get('formatted_transcript')
-                    video.download_url = data.get('download_url')
-                    db.session.commit()
-                    success_count += 1
-                    result['status'] = 'success'
+                    # Store the transcript only if no other run has, which also
+                    # locks the row until the commit
+                    claimed = db.session.execute(
+                        update(YoutubeVideo)
+                        .where(YoutubeVideo.id == video.id, YoutubeVideo.formatted_transcript.is_(None))
+                        .values(formatted_transcript=data['formatted_transcript'])
+                    ).rowcount == 1
+                    if claimed:
+                        video.download_url = data.get('download_url')
+                        # The channel, day and duration as stored now, counted untranscribed before
+                        db.session.refresh(video, ['channel_id', 'published_at', 'duration'])
+                        current_figures = video_figures(video)
+                        previous_figures = current_figures and dict(current_figures, transcribed=0)
+                        record_video_change(previous_figures, current_figures)
+                        db.session.commit()
+                        TRANSCRIPTS_PRODUCED.inc()
+                        success_count += 1
+                        result['status'] = 'success'
+                    else:
+                        db.session.rollback()
+                        skipped_count += 1
+                        result['status'] = 'skipped'
                 except Exception as e:
                     db.session.rollback()
                     current_app.logger.error(f"Database error for video {video.video_id}: {str(e)}")
                     result['error'] = f"Database error: {str(e)}"
-            else:
-                result['error'] = data['error']
         except Exception as e:
             current_app.logger.error(f"Error processing video {video.video_id}: {str(e)}")
             result['error'] = str(e)
@@ -190,19 +248,20 @@ def update_missing_transcripts(limit: int = 2) -> Dict[str, Any]:
     return {
         "total": len(videos),
         "success_count": success_count,
-        "error_count": len(videos) - success_count,
+        "skipped_count": skipped_count,
+        "error_count": len(videos) - success_count - skipped_count,
         "videos": processed_videos
     }
 
+@traced
 def get_transcription(video_url):
     """Retrieve transcription and metadata for a given video URL."""
-    api_host = load_api_key("YT_DLP_HOST")
-    api_url = f"{api_host}/transcribe?url={video_url}"
+    api_host = get_settings().require('yt_dlp_host')
     
     try:
-        response = requests.get(api_url)
-        response.raise_for_status()  # Raise an error for bad responses
-        data = response.json()
+        # Goes through the shared session so repeated calls reuse connections
+        with track_outbound('yt_dlp', 'transcribe'):
+            data = run_async(request_json('GET', f"{api_host}/transcribe", params={'url': video_url}))
 
         return {
             "download_url": data.get("download_url"),
@@ -214,8 +273,10 @@ def get_transcription(video_url):
             'error': str(e)
         }
     
+@traced
 def get_youtube_video_metadata(video_url):
     """使用 YouTube Data API 获取视频元数据包括题、描述、缩略图、频道标题、发布时间、标签和是否包含转录。"""
+    import requests
     # Parse the URL and extract the video ID from the query parameters
     parsed_url = urlparse(video_url)
     video_id = parse_qs(parsed_url.query).get('v')
@@ -225,11 +286,13 @@ def get_youtube_video_metadata(video_url):
 
     video_id = video_id[0]  # Get the first video ID from the list
 
-    url = f"https://www.googleapis.com/youtube/v3/videos?id={video_id}&key={api_key}&part=snippet,contentDetails"
+    api_key = get_settings().require('youtube_api_key')
+    url = f"{get_settings().youtube_api_host}/youtube/v3/videos?id={video_id}&key={api_key}&part=snippet,contentDetails"
 
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an error for bad responses
+        with track_outbound('youtube_api', 'videos'):
+            response = requests.get(url)
+            response.raise_for_status()  # Raise an error for bad responses
         data = response.json()
 
         if 'items' not in data or not data['items']:
@@ -286,15 +349,20 @@ def parse_duration(duration: str) -> int:
     
     return hours * 3600 + minutes * 60 + seconds
 
+@traced
 def get_new_videos_from_youtuber(channel_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
     """获取指定 YouTuber 在给定日期范围内发布的新视频。"""
+    import requests
 
     new_videos = []
-    url = f"https://www.googleapis.com/youtube/v3/search?key={api_key}&channelId={channel_id}&part=snippet,id&order=date&publishedAfter={start_date}&publishedBefore={end_date}&maxResults=50"
+    api_key = get_settings().require('youtube_api_key')
+    api_host = get_settings().youtube_api_host
+    url = f"{api_host}/youtube/v3/search?key={api_key}&channelId={channel_id}&part=snippet,id&order=date&publishedAfter={start_date}&publishedBefore={end_date}&maxResults=50"
 
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        with track_outbound('youtube_api', 'search'):
+            response = requests.get(url)
+            response.raise_for_status()
         data = response.json()
 
         if 'items' in data:
@@ -302,9 +370,10 @@ def get_new_videos_from_youtuber(channel_id: str, start_date: str, end_date: str
             video_ids = [item['id']['videoId'] for item in data['items']]
             
             # Get details for all videos in one API call
-            videos_url = f"https://www.googleapis.com/youtube/v3/videos?key={api_key}&id={','.join(video_ids)}&part=snippet,contentDetails"
-            details_response = requests.get(videos_url)
-            details_response.raise_for_status()
+            videos_url = f"{api_host}/youtube/v3/videos?key={api_key}&id={','.join(video_ids)}&part=snippet,contentDetails"
+            with track_outbound('youtube_api', 'videos'):
+                details_response = requests.get(videos_url)
+                details_response.raise_for_status()
             details_data = details_response.json()
             
             # Create a mapping of video IDs to their search results
@@ -348,6 +417,7 @@ def get_new_videos_from_youtuber(channel_id: str, start_date: str, end_date: str
 
     return new_videos
 
+@traced
 def get_and_store_new_videos(start_date: str, end_date: str, handle: Optional[str] = None) -> Dict[str, Any]:
     """获取所有 YouTube 频道在给定日期范围内的新视频并存储到数据库。
     Returns a dictionary containing:
@@ -407,8 +477,10 @@ def get_and_store_new_videos(start_date: str, end_date: str, handle: Optional[st
 
     return result
 
+@traced
 def find_and_store_channel_by_name(handle: str) -> Optional[Dict[str, Any]]:
     """根据频道名称查找频道 ID 并存储新频道。"""
+    import requests
     # Ensure handle starts with @
     if not handle.startswith('@'):
         handle = f'@{handle}'
@@ -421,11 +493,13 @@ def find_and_store_channel_by_name(handle: str) -> Optional[Dict[str, Any]]:
 
     # Direct channel lookup using handle
     # custom_url = handle.replace('@', '')
-    channel_details_url = f"https://www.googleapis.com/youtube/v3/channels?key={api_key}&forHandle={handle}&part=snippet"
+    api_key = get_settings().require('youtube_api_key')
+    channel_details_url = f"{get_settings().youtube_api_host}/youtube/v3/channels?key={api_key}&forHandle={handle}&part=snippet"
     
     try:
-        details_response = requests.get(channel_details_url)
-        details_response.raise_for_status()
+        with track_outbound('youtube_api', 'channels'):
+            details_response = requests.get(channel_details_url)
+            details_response.raise_for_status()
         details_data = details_response.json()
 
         if 'items' in details_data and details_data['items']:
@@ -450,6 +524,7 @@ def find_and_store_channel_by_name(handle: str) -> Optional[Dict[str, Any]]:
         current_app.logger.error(f"Error finding channel by name '{handle}': {str(e)}")
         return None
 
+@traced
 def get_youtube_video_by_id(video_id: str) -> Optional[Dict[str, Any]]:
     """根据视频 ID 获取视频数据"""
     video = YoutubeVideo.query.filter_by(video_id=video_id).first()
@@ -3,42 +3,62 @@ from models import db, YoutubeVideo
 from typing import Optional, Dict, Any, List
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
+from utils.tracing import traced
+from services.video_tag_service import sync_video_tags, remove_video_tags
+from services.stats_service import video_figures, record_video_change
 
+@traced
 def create_video(video_data: Dict[str, Any]) -> Dict[str, Any]:
     """创建新的视频记录"""
-    # 检查是否已存在相同 video_id 的记录
-    existing_video = YoutubeVideo.query.filter_by(video_id=video_data['video_id']).first()
+    # 检查是否已存在相同 video_id 的记录, locked until the commit like in
+    # store_new_video, so its tag counts and stats move from what is stored
+    existing_video = YoutubeVideo.query.filter_by(video_id=video_data['video_id']).with_for_update().populate_existing().first()
     
     if existing_video:
         # 更新现有记录
+        previous_tags, previous_published_at = existing_video.tags, existing_video.published_at
+        previous_figures = video_figures(existing_video)
         for key, value in video_data.items():
             setattr(existing_video, key, value)
+        sync_video_tags(existing_video, previous_tags, previous_published_at)
+        record_video_change(previous_figures, video_figures(existing_video))
         db.session.commit()
         return existing_video.to_dict()
     else:
         # 创建新记录
         new_video = YoutubeVideo(**video_data)
         db.session.add(new_video)
+        # video_tags rows reference the video, so it has to be inserted first
+        db.session.flush()
+        sync_video_tags(new_video)
+        record_video_change(None, video_figures(new_video))
         db.session.commit()
         return new_video.to_dict()
 
+@traced
 def get_video(video_id: str) -> Optional[Dict[str, Any]]:
     """根据视频 ID 获取视频"""
     video = YoutubeVideo.query.filter_by(video_id=video_id).first()
     return video.to_dict() if video else None
 
+@traced
 def get_video_by_id(id: int) -> Optional[Dict[str, Any]]:
     """根据数据库 ID 获取视频"""
     video = YoutubeVideo.query.get(id)
     return video.to_dict() if video else None
 
+@traced
 def update_video(video_id: str, updated_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """更新视频记录"""
-    video = YoutubeVideo.query.filter_by(video_id=video_id).first()
+    video = YoutubeVideo.query.filter_by(video_id=video_id).with_for_update().populate_existing().first()
     if video:
+        previous_tags, previous_published_at = video.tags, video.published_at
+        previous_figures = video_figures(video)
         for key, value in updated_data.items():
             setattr(video, key, value)
         try:
+            sync_video_tags(video, previous_tags, previous_published_at)
+            record_video_change(previous_figures, video_figures(video))
             db.session.commit()
             return video.to_dict()
         except IntegrityError:
@@ -47,11 +67,14 @@ def update_video(video_id: str, updated_data: Dict[str, Any]) -> Optional[Dict[s
             return None
     return None
 
+@traced
 def delete_video(video_id: str) -> Optional[Dict[str, Any]]:
     """删除视频记录"""
-    video = YoutubeVideo.query.filter_by(video_id=video_id).first()
+    video = YoutubeVideo.query.filter_by(video_id=video_id).with_for_update().populate_existing().first()
     if video:
         try:
+            remove_video_tags(video)
+            record_video_change(video_figures(video), None)
             db.session.delete(video)
             db.session.commit()
             return video.to_dict()
@@ -61,11 +84,13 @@ def delete_video(video_id: str) -> Optional[Dict[str, Any]]:
             return None
     return None
 
+@traced
 def get_videos_by_channel(channel_id: str) -> List[Dict[str, Any]]:
     """获取指定频道的所有视频"""
     videos = YoutubeVideo.query.filter_by(channel_id=channel_id).all()
     return [video.to_dict() for video in videos]
 
+@traced
 def get_videos_by_date_range(start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
     """获取指定日期范围内的视频"""
     videos = YoutubeVideo.query.filter(
@@ -74,6 +99,7 @@ def get_videos_by_date_range(start_date: datetime, end_date: datetime) -> List[D
     ).all()
     return [video.to_dict() for video in videos]
 
+@traced
 def get_videos_without_transcript() -> List[Dict[str, Any]]:
     """获取所有没有转录文本的视频"""
     videos = YoutubeVideo.query.filter(
@@ -81,6 +107,7 @@ def get_videos_without_transcript() -> List[Dict[str, Any]]:
     ).all()
     return [video.to_dict() for video in videos]
 
+@traced
 def search_videos_by_title(title: str) -> List[Dict[str, Any]]:
     """根据标题搜索视频"""
     videos = YoutubeVideo.query.filter(
@@ -88,6 +115,7 @@ def search_videos_by_title(title: str) -> List[Dict[str, Any]]:
     ).all()
     return [video.to_dict() for video in videos]
 
+@traced
 def prepare_source_for_artefact(id: str) -> Optional[Dict[str, Any]]:
     """根据视频 ID 获取视频数据"""
     video = YoutubeVideo.query.filter_by(id=id).first()
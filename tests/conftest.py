@@ -0,0 +1,72 @@
+import os
+import sys
+import subprocess
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# main reads the settings on import, so point it at a scratch database first
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='news-aggr-tests-'), 'test.db')}"
+
+@pytest.fixture
+def app():
+    """The app with empty tables, inside an app context."""
+    from main import app
+    from models import db
+    from models.db import create_tables
+    with app.app_context():
+        create_tables()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def stub_server():
+    """Serves POST handlers on a local port: stub_server(handler) returns the URL.
+
+    Runs on the async runtime's loop, so clients on any loop can reach it.
+    """
+    from aiohttp import web
+    from utils.async_runtime import run_async
+    runners = []
+
+    async def start(handler):
+        app = web.Application()
+        app.router.add_post('/', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        runners.append(runner)
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/"
+
+    yield lambda handler: run_async(start(handler))
+    for runner in runners:
+        run_async(runner.cleanup())
+
+def git(*args, cwd=None):
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """A local bare repository with one commit, configured as the publish repository."""
+    path = str(tmp_path / 'remote.git')
+    work = str(tmp_path / 'init')
+    git('init', '--bare', '--initial-branch=main', path)
+    git('init', '--initial-branch=main', work)
+    with open(os.path.join(work, 'README.md'), 'w') as f:
+        f.write('# Published artefacts\n')
+    git('add', 'README.md', cwd=work)
+    git('-c', 'user.name=tests', '-c', 'user.email=tests@localhost', 'commit', '-m', 'Initial commit', cwd=work)
+    git('push', path, 'main', cwd=work)
+    for variable, value in (('GIT_AUTHOR_NAME', 'tests'), ('GIT_COMMITTER_NAME', 'tests'),
+                            ('GIT_AUTHOR_EMAIL', 'tests@localhost'), ('GIT_COMMITTER_EMAIL', 'tests@localhost'),
+                            ('GIT_PUBLISH_REPO', path)):
+        monkeypatch.setenv(variable, value)
+    from utils.settings import load_settings
+    load_settings()
+    yield path
+    monkeypatch.undo()
+    load_settings()
@@ -0,0 +1,28 @@
+import asyncio
+from aiohttp import web
+from utils.batch_request import iter_batch_request
+
+async def echo(request):
+    return web.json_response(await request.json())
+
+def test_closing_the_iterator_early_returns(stub_server):
+    url = stub_server(echo)
+
+    async def main():
+        results = iter_batch_request(url, [{'source_id': n} for n in range(200)], concurrent_limit=5, progress='off')
+        received = [await results.__anext__() for _ in range(3)]
+        # Workers blocked on the full results queue must not keep close waiting
+        await asyncio.wait_for(results.aclose(), timeout=5)
+        return received
+
+    received = asyncio.run(main())
+    assert len(received) == 3
+
+def test_iterator_yields_every_result(stub_server):
+    url = stub_server(echo)
+
+    async def main():
+        return [result async for result in iter_batch_request(url, [{'source_id': n} for n in range(50)], progress='off')]
+
+    results = asyncio.run(main())
+    assert len(results) == 50
@@ -0,0 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+def add_artefacts(count):
+    from models import db, Artefact
+    for n in range(count):
+        db.session.add(Artefact(title=f'Artefact {n}', source='tests', source_id=str(n), full_text=f'# Artefact {n}\n\nBody.',
+                                used=0, published_at=datetime(2024, 5, 1)))
+    db.session.commit()
+
+def test_render_pool_is_capped_and_skipped_for_small_runs(app, monkeypatch):
+    from models import Artefact
+    from services import publisher_service
+    pools = []
+    def fake_pool(workers):
+        pools.append(workers)
+        return ThreadPoolExecutor(workers)
+    monkeypatch.setattr(publisher_service, '_get_render_pool', fake_pool)
+    monkeypatch.setattr(publisher_service.os, 'cpu_count', lambda: 64)
+
+    add_artefacts(3)
+    assert publisher_service.process_artefacts_html()['count'] == 3
+    assert all(artefact.html for artefact in Artefact.query.all())
+    assert pools == []
+
+    monkeypatch.setattr(publisher_service, 'RENDER_POOL_MIN_ITEMS', 2)
+    assert publisher_service.process_artefacts_html(force=True)['count'] == 3
+    assert pools == [2]
@@ -0,0 +1,92 @@
+import os
+from datetime import datetime
+import pytest
+from conftest import git
+from utils.publish_repo import open_publish_repo, PublishRepoError
+
+def remote_files(remote):
+    return set(git('--git-dir', remote, 'ls-tree', '-r', '--name-only', 'main').split())
+
+def remote_commits(remote):
+    return int(git('--git-dir', remote, 'rev-list', '--count', 'main'))
+
+def add_artefact(source_id, title, published_at):
+    from models import db, Artefact
+    artefact = Artefact(title=title, source='tests', source_id=source_id, full_text=f'# {title}\n\nBody of {title}.',
+                        html=f'<h1>{title}</h1>', used=0, published_at=published_at)
+    db.session.add(artefact)
+    db.session.commit()
+    return artefact
+
+def test_tree_backend_publishes_skips_unchanged_and_removes_deleted(app, remote, tmp_path):
+    from models import db
+    from services.publisher_service import publish_artefacts_to_github
+    day = datetime(2024, 11, 1)
+    add_artefact(1, 'First story', day.replace(hour=8))
+    second = add_artefact(2, 'Second story', day.replace(hour=9))
+    cache = str(tmp_path / 'cache.git')
+    publish = lambda: publish_artefacts_to_github(day, repo_path=cache, backend='tree')
+
+    result = publish()
+    assert result['committed']
+    files = remote_files(remote)
+    assert {'2024-11-01/md/First-story.md', '2024-11-01/md/Second-story.md', 'manifest.json'} <= files
+    commits = remote_commits(remote)
+
+    result = publish()
+    assert not result['committed']
+    assert remote_commits(remote) == commits
+
+    db.session.delete(second)
+    db.session.commit()
+    result = publish()
+    assert result['committed']
+    assert '2024-11-01/md/Second-story.md' in result['removed']
+    files = remote_files(remote)
+    assert '2024-11-01/md/Second-story.md' not in files
+    assert '2024-11-01/md/First-story.md' in files
+    assert remote_commits(remote) == commits + 1
+
+def test_backend_mismatch_raises_and_keeps_the_cache(remote, tmp_path):
+    cache = str(tmp_path / 'cache')
+    open_publish_repo(remote, cache, ['2024-11-01'])
+    with pytest.raises(PublishRepoError):
+        open_publish_repo(remote, cache, bare=True)
+    assert os.path.exists(os.path.join(cache, 'README.md'))
+
+def test_foreign_checkout_is_left_alone(remote, tmp_path):
+    checkout = str(tmp_path / 'checkout')
+    git('clone', remote, checkout)
+    with open(os.path.join(checkout, 'notes.md'), 'w') as f:
+        f.write('unpushed work\n')
+    for bare in (False, True):
+        with pytest.raises(PublishRepoError):
+            open_publish_repo(remote, checkout, bare=bare)
+    assert os.path.exists(os.path.join(checkout, 'notes.md'))
+
+@pytest.mark.parametrize('backend', ['worktree', 'tree'])
+def test_rebuild_site_manifest_lists_dates_published_without_it(app, remote, tmp_path, backend):
+    from services.publisher_service import rebuild_site_manifest, publish_artefacts_to_github
+    # A date published before the manifest existed, with an artefact no longer in the database
+    work = str(tmp_path / 'legacy')
+    git('clone', remote, work)
+    os.makedirs(os.path.join(work, '2024-10-01', 'md'))
+    with open(os.path.join(work, '2024-10-01', 'md', 'Old-story.md'), 'w') as f:
+        f.write('# Old story\n\nBody.')
+    git('add', '.', cwd=work)
+    git('commit', '-m', 'Legacy publish', cwd=work)
+    git('push', 'origin', 'main', cwd=work)
+
+    day = datetime(2024, 11, 1)
+    add_artefact(1, 'First story', day.replace(hour=8))
+    cache = str(tmp_path / f'cache-{backend}')
+    publish_artefacts_to_github(day, repo_path=cache, backend=backend)
+    assert '2024-10-01' not in git('--git-dir', remote, 'show', 'main:archive.md')
+
+    result = rebuild_site_manifest(cache, backend)
+    assert result['committed'] and result['dates'] == 2 and result['articles'] == 2
+    archive = git('--git-dir', remote, 'show', 'main:archive.md')
+    assert '[2024-10-01]' in archive and '[2024-11-01]' in archive
+    assert 'Old story' in git('--git-dir', remote, 'show', 'main:manifest.json')
+
+    assert not rebuild_site_manifest(cache, backend)['committed']
@@ -0,0 +1,34 @@
+from utils import settings
+
+def test_server_defaults_yield_to_dotenv_and_environment(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, '_defaults', {})
+    monkeypatch.delenv('DB_POOL_SIZE', raising=False)
+    monkeypatch.delenv('DB_MAX_OVERFLOW', raising=False)
+    (tmp_path / '.env').write_text('DB_POOL_SIZE=7\n')
+
+    settings.set_defaults(db_pool_size=8, db_max_overflow=2)
+    loaded = settings.Settings.from_env(settings._read_env())
+    assert (loaded.db_pool_size, loaded.db_max_overflow) == (7, 2)
+
+    monkeypatch.setenv('DB_POOL_SIZE', '9')
+    assert settings.Settings.from_env(settings._read_env()).db_pool_size == 9
+
+def test_knobs_follow_dotenv_on_reload(tmp_path, monkeypatch):
+    from utils.publish_repo import publish_repo_path
+    from utils.webhook_outbox import summarize_payload
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, '_settings', None)
+    for name in ('PUBLISH_REPO_PATH', 'PUBLISH_BARE_REPO_PATH', 'WEBHOOK_PAYLOAD_BUDGET'):
+        monkeypatch.delenv(name, raising=False)
+    body = b'"' + b'x' * 1000 + b'"'
+
+    (tmp_path / '.env').write_text('PUBLISH_REPO_PATH=/srv/previews\nWEBHOOK_PAYLOAD_BUDGET=2000\n')
+    assert publish_repo_path() == '/srv/previews'
+    assert publish_repo_path(bare=True) == '/srv/previews.git'
+    assert len(summarize_payload(body)) == 1002
+
+    (tmp_path / '.env').write_text('PUBLISH_REPO_PATH=/srv/other\nWEBHOOK_PAYLOAD_BUDGET=600\n')
+    settings.reload_settings()
+    assert publish_repo_path() == '/srv/other'
+    assert summarize_payload(body).startswith('"' + 'x' * 199)
@@ -0,0 +1,66 @@
+def artefact(source_id, **fields):
+    return {'title': f'Artefact {source_id}', 'source': 'tests', 'source_id': source_id, 'full_text': 'Body.',
+            'html': '<p>Body.</p>', 'used': 0, **fields}
+
+def artefact_rows():
+    from models import ArtefactDailyStats
+    return sorted((row.day, row.source, row.artefacts) for row in ArtefactDailyStats.query.all() if row.artefacts)
+
+def test_artefact_stats_match_a_rebuild(app):
+    from models import Artefact
+    from services.artefact_service import create_artefact, update_artefact, delete_artefact
+    from services.stats_service import artefact_figures, rebuild_stats
+    create_artefact(artefact(1))
+    create_artefact(artefact(2, created_at='2024-05-01 10:00:00'))
+    create_artefact(artefact(3))
+    update_artefact(create_artefact(artefact(4))['id'], {'source': 'other'})
+    delete_artefact(Artefact.query.filter_by(source_id=3).one().id)
+
+    pending = Artefact(**artefact(5))
+    assert artefact_figures(pending) is None and pending.created_at is None
+
+    incremental = artefact_rows()
+    rebuild_stats()
+    assert artefact_rows() == incremental
+    assert sum(count for _, _, count in incremental) == 3
+
+def channel_rows():
+    from models import ChannelDailyStats
+    return sorted((row.day, row.channel_id, row.videos, row.duration_seconds, row.transcribed)
+                  for row in ChannelDailyStats.query.all() if row.videos)
+
+def test_concurrent_transcript_runs_count_each_video_once(app, monkeypatch):
+    import threading
+    from prometheus_client import REGISTRY
+    from services import youtube_service
+    from services.stats_service import rebuild_stats
+    for n in range(3):
+        youtube_service.store_new_video({'title': f'Video {n}', 'video_id': f'v{n}', 'published_at': f'2024-05-0{n + 1} 10:00:00',
+                                         'channel_title': 'Channel', 'channel_id': 'channel', 'url': f'https://youtu.be/v{n}',
+                                         'tags': [], 'duration': 60})
+    # Both runs pick the same videos before either stores a transcript
+    picked = threading.Barrier(2)
+    def get_transcription(url):
+        picked.wait(timeout=5)
+        return {'formatted_transcript': f'Transcript of {url}', 'download_url': None}
+    monkeypatch.setattr(youtube_service, 'get_transcription', get_transcription)
+    produced = lambda: REGISTRY.get_sample_value('transcripts_produced_total') or 0
+    before = produced()
+
+    results = []
+    def run():
+        with app.app_context():
+            results.append(youtube_service.update_missing_transcripts(limit=3))
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(result['success_count'] for result in results) == 3
+    assert sum(result['skipped_count'] for result in results) == 3
+    assert produced() - before == 3
+    incremental = channel_rows()
+    rebuild_stats()
+    assert channel_rows() == incremental
+    assert sum(row[-1] for row in incremental) == 3
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import event
+
+@pytest.fixture
+def foreign_keys(app):
+    """Enforce foreign keys on SQLite connections, as MySQL does."""
+    from models import db
+    engine = db.engine
+
+    def enable(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+    db.session.remove()
+    engine.dispose()
+    event.listen(engine, 'connect', enable)
+    yield
+    db.session.remove()
+    event.remove(engine, 'connect', enable)
+    engine.dispose()
+
+def video(video_id, tags, day=1):
+    return {'title': f'Video {video_id}', 'video_id': video_id, 'published_at': f'2024-05-{day:02d} 10:00:00',
+            'channel_title': 'Channel', 'channel_id': 'channel', 'url': f'https://youtu.be/{video_id}',
+            'tags': tags, 'duration': 60}
+
+def tag_rows():
+    from models import VideoTag
+    return sorted((row.video_id, row.tag) for row in VideoTag.query.all())
+
+def test_new_tagged_video_is_stored_with_foreign_keys_enforced(foreign_keys):
+    from sqlalchemy import text
+    from models import db
+    from services.youtube_service import store_new_video
+    from services import youtube_video_service
+    assert db.session.execute(text('PRAGMA foreign_keys')).scalar() == 1
+
+    result = store_new_video(video('a', ['AI', 'News']))
+    assert result is not None and result['status'] == 'new'
+    youtube_video_service.create_video(video('b', ['ai']))
+    assert tag_rows() == [('a', 'ai'), ('a', 'news'), ('b', 'ai')]
+
+def test_tag_facets_match_a_rebuild(app):
+    from services.youtube_service import store_new_video
+    from services.video_tag_service import get_tag_facets, rebuild_video_tags
+    from services import youtube_video_service
+    store_new_video(video('a', ['AI', 'Tech '], 1))
+    store_new_video(video('b', ['ai', 'news'], 1))
+    store_new_video(video('b', ['ai', 'Politics'], 3))
+    youtube_video_service.create_video(video('c', ['gone'], 2))
+    youtube_video_service.delete_video('c')
+
+    incremental = (get_tag_facets(), tag_rows())
+    rebuild_video_tags()
+    assert (get_tag_facets(), tag_rows()) == incremental
+    assert {facet['tag']: facet['videos'] for facet in incremental[0]} == {'ai': 2, 'tech': 1, 'politics': 1}
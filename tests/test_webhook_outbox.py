@@ -0,0 +1,22 @@
+import time
+from aiohttp import web
+from utils.webhook_outbox import WebhookOutbox, BATCH_WINDOW
+
+def test_flush_delivers_notifications_waiting_in_the_batch_window(stub_server):
+    cards = []
+
+    async def webhook(request):
+        cards.append(await request.json())
+        return web.json_response({'code': 0})
+
+    url = stub_server(webhook)
+    outbox = WebhookOutbox()
+    for status_code in (200, 200, 500):
+        outbox.enqueue(url, {'url': '/api', 'method': 'POST', 'status_code': status_code, 'body': b'{}'})
+    start = time.monotonic()
+    assert outbox.flush(timeout=5) == 0
+    assert time.monotonic() - start < BATCH_WINDOW
+    assert len(cards) == 1 and outbox.delivered == 3 and outbox.pending() == 0
+
+def test_flush_without_notifications_returns_at_once():
+    assert WebhookOutbox().flush(timeout=5) == 0
@@ -0,0 +1,125 @@
+import os
+import atexit
+import asyncio
+import threading
+import contextvars
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Optional, TypeVar
+from utils.tracing import inject_headers
+from utils.settings import get_settings
+
+# aiohttp is imported when the first session is created
+if TYPE_CHECKING:
+    import aiohttp
+
+T = TypeVar('T')
+
+# The shared session's pool is sized by the HTTP_*_CONNECTION_LIMIT settings
+KEEPALIVE_TIMEOUT = 60
+# Total seconds per request unless the caller says otherwise
+DEFAULT_TIMEOUT = 600
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_pid: Optional[int] = None
+_session: Optional['aiohttp.ClientSession'] = None
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the process's background event loop, starting it on first use.
+
+    The loop runs forever in a daemon thread. A forked worker process starts
+    its own, since threads do not survive a fork.
+    """
+    global _loop, _thread, _pid, _session
+    with _lock:
+        if _loop is None or _pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _session = None
+            _pid = os.getpid()
+            _thread = threading.Thread(target=_loop.run_forever, name='async-runtime', daemon=True)
+            _thread.start()
+        return _loop
+
+def run_async(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Run a coroutine on the background loop and wait for its result from sync code.
+
+    The coroutine runs in a copy of the caller's context, as asyncio.to_thread
+    does for threads, so the current span carries over to it and to the tasks
+    it creates.
+    """
+    loop = get_loop()
+    if threading.current_thread() is _thread:
+        raise RuntimeError("run_async cannot be called from the background loop itself")
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), loop).result(timeout)
+
+async def _in_context(coro: Awaitable[T], context: contextvars.Context) -> T:
+    return await asyncio.get_running_loop().create_task(coro, context=context)
+
+def runtime_thread_id() -> Optional[int]:
+    """Return the ident of this process's loop thread, if it has been started."""
+    if _thread is None or _pid != os.getpid():
+        return None
+    return _thread.ident
+
+def get_session() -> 'aiohttp.ClientSession':
+    """Return the shared aiohttp session. Must be called on the background loop.
+
+    Keeping one session per process lets batch requests, transcription calls
+    and webhooks reuse warm keep-alive connections.
+    """
+    import aiohttp
+    global _session
+    if _session is None or _session.closed:
+        settings = get_settings()
+        connector = aiohttp.TCPConnector(
+            limit=settings.http_connection_limit,
+            limit_per_host=settings.http_per_host_connection_limit,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT))
+    return _session
+
+@asynccontextmanager
+async def client_session() -> AsyncIterator['aiohttp.ClientSession']:
+    """Yield the shared session when running on the background loop.
+
+    Coroutines driven by some other loop (e.g. asyncio.run in a script) get a
+    session of their own, closed on exit, since sessions are tied to a loop.
+    """
+    if asyncio.get_running_loop() is _loop and _pid == os.getpid():
+        yield get_session()
+        return
+    import aiohttp
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT)) as session:
+        yield session
+
+async def request_json(method: str, url: str, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """Send a request on the shared session and return the decoded JSON body.
+    Raises aiohttp.ClientResponseError for error statuses.
+    """
+    import aiohttp
+    if timeout:
+        kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+    kwargs['headers'] = inject_headers(kwargs.get('headers'))
+    async with client_session() as session:
+        async with session.request(method, url, **kwargs) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+async def _close():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+@atexit.register
+def shutdown():
+    """Close the shared session and stop the background loop."""
+    global _loop
+    if _loop is None or _pid != os.getpid():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close(), _loop).result(5)
+    except Exception:
+        pass
+    _loop.call_soon_threadsafe(_loop.stop)
+    _loop = None
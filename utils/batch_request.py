@@ -1,110 +1,420 @@
 import aiohttp
 import asyncio
 import time
-from typing import List, Dict, Any
+import json
+import logging
+from collections import deque
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
-import threading
 import sys
+import random
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from utils.async_runtime import client_session, run_async
+from utils.metrics import track_outbound
+from utils.tracing import inject_headers, traced
+from utils.settings import get_settings
 
 # Add timeout constant (10 minutes)
 TIMEOUT = aiohttp.ClientTimeout(total=600)
 
-class RequestTimer:
-    def __init__(self, request_num, total, source_id):
-        self.request_num = request_num
+# Progress output: 'tty' rewrites one status line on stdout, 'log' emits
+# structured log records, 'off' disables it, 'auto' picks 'tty' on a terminal.
+# Defaults to the BATCH_PROGRESS setting.
+PROGRESS_INTERVAL = 1.0
+# Latencies kept for the percentile estimates
+LATENCY_WINDOW = 1000
+
+# Adaptive concurrency may grow up to this multiple of concurrent_limit
+MAX_CONCURRENCY_FACTOR = 4
+# A recent average latency above this multiple of the long-run average counts as overload
+LATENCY_TOLERANCE = 2.0
+# Smoothing of the recent and long-run latency averages
+RECENT_LATENCY_WEIGHT = 0.1
+BASELINE_LATENCY_WEIGHT = 0.01
+# Concurrency is multiplied by this on overload
+BACKOFF_RATIO = 0.5
+
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+# Statuses worth retrying; 429 and 503 mean the request was not processed at all
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+REJECTED_STATUSES = {429, 503}
+# Statuses that point at an overloaded downstream rather than a failing request
+OVERLOAD_STATUSES = {429, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+class BatchProgress:
+    """Progress of a whole batch, reported by a single asyncio task."""
+
+    def __init__(self, total: int, mode: Optional[str] = None, interval: float = PROGRESS_INTERVAL, limiter: Optional['AdaptiveLimiter'] = None):
+        mode = mode or get_settings().batch_progress
+        if mode == 'auto':
+            mode = 'tty' if sys.stdout.isatty() else 'log'
         self.total = total
-        self.source_id = source_id
+        self.mode = mode
+        self.interval = interval
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.limiter = limiter
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
         self.start_time = time.time()
-        self.is_running = True
-        self.thread = threading.Thread(target=self._run)
-        self.thread.daemon = True
-
-    def _run(self):
-        while self.is_running:
-            elapsed = time.time() - self.start_time
-            sys.stdout.write(f"\rRequest {self.request_num}/{self.total} ({self.source_id}): {elapsed:.1f}s elapsed")
+        self._task = None
+
+    def request_started(self):
+        self.in_flight += 1
+
+    def request_retried(self):
+        self.retries += 1
+
+    def request_finished(self, elapsed: float, success: bool):
+        self.in_flight -= 1
+        self.completed += 1
+        if not success:
+            self.failed += 1
+        self.latencies.append(elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.start_time
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        remaining = self.total - self.completed
+        return {
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retries': self.retries,
+            'in_flight': self.limiter.in_flight if self.limiter else self.in_flight,
+            'concurrency': int(self.limiter.limit) if self.limiter else None,
+            'rate': round(rate, 2),
+            'p50': round(percentile(0.5), 2) if latencies else None,
+            'p95': round(percentile(0.95), 2) if latencies else None,
+            'eta': round(remaining / rate, 1) if rate > 0 else None,
+            'elapsed': round(elapsed, 1)
+        }
+
+    def report(self):
+        stats = self.snapshot()
+        if self.mode == 'tty':
+            line = (f"{stats['completed']}/{stats['total']} done, {stats['failed']} failed, "
+                    f"{stats['retries']} retries, {stats['in_flight']} in flight (limit {stats['concurrency']}), {stats['rate']}/s, "
+                    f"p50 {stats['p50']}s p95 {stats['p95']}s, ETA {stats['eta']}s")
+            sys.stdout.write('\r' + line.ljust(100))
             sys.stdout.flush()
-            time.sleep(1)
-        sys.stdout.write('\r' + ' ' * 80 + '\r')  # Clear the line
-        sys.stdout.flush()
+        elif self.mode == 'log':
+            logger.info(json.dumps({'event': 'batch_progress', **stats}))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.report()
 
     def start(self):
-        self.thread.start()
-
-    def stop(self):
-        self.is_running = False
-        self.thread.join()
-
-async def batch_request(url: str, params_list: List[Dict[str, Any]], concurrent_limit: int = 5, method: str = 'POST', show_timestamp: bool = False) -> Dict[str, Any]:
-    """Process multiple requests asynchronously with rate limiting."""
-    def log_with_timestamp(message: str):
-        if show_timestamp:
-            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] {message}")
-        else:
-            print(f"\n{message}")
-
-    log_with_timestamp(f"Starting batch request processing...")
-    log_with_timestamp(f"Total requests to process: {len(params_list)}")
-    log_with_timestamp(f"Concurrent limit: {concurrent_limit}")
-    
-    batch_start_time = time.time()
-    async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
-        semaphore = asyncio.Semaphore(concurrent_limit)
-        total = len(params_list)
-        
-        async def bounded_request(params, request_num):
-            async with semaphore:
-                timer = RequestTimer(request_num, total, params['source_id'])
-                timer.start()
-                try:
-                    async with getattr(session, method.lower())(url, json=params) as response:
-                        response.raise_for_status()
-                        timer.stop()
-                        elapsed = time.time() - timer.start_time
-                        log_with_timestamp(f"✓ Request {request_num}/{total} completed successfully: {params['source_id']} ({elapsed:.2f}s)")
-                        return {
-                            'success': True,
-                            'params': params,
-                            'status': response.status,
-                            'data': await response.json(),
-                            'elapsed': elapsed
-                        }
-                except Exception as e:
-                    timer.stop()
-                    elapsed = time.time() - timer.start_time
-                    log_with_timestamp(f"✗ Request {request_num}/{total} failed: {params['source_id']} - Error: {str(e)} ({elapsed:.2f}s)")
-                    return {
-                        'success': False,
-                        'params': params,
-                        'error': str(e),
-                        'elapsed': elapsed
-                    }
-
-        tasks = [bounded_request(params, i+1) for i, params in enumerate(params_list)]
-        results = await asyncio.gather(*tasks)
-        
-        successful = [r for r in results if r['success']]
-        failed = [r for r in results if not r['success']]
-        
-        total_time = time.time() - batch_start_time
-        avg_time = sum(r['elapsed'] for r in results) / len(results) if results else 0
-        
-        print(f"\nBatch processing completed in {total_time:.2f}s:")
-        print(f"Average request time: {avg_time:.2f}s")
-        print(f"Total processed: {len(results)}")
-        print(f"Successful: {len(successful)}")
-        print(f"Failed: {len(failed)}\n")
-        
+        if self.mode != 'off':
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if self.mode == 'tty':
+            sys.stdout.write('\r' + ' ' * 100 + '\r')  # Clear the line
+            sys.stdout.flush()
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit driven by latency and errors.
+
+    Each request that completes without signs of overload raises the limit
+    by 1/limit, i.e. by one per window of requests. An overload error, or a
+    recent average latency above LATENCY_TOLERANCE times the long-run average,
+    multiplies it by BACKOFF_RATIO, at most once per typical request duration.
+    Comparing averages rather than single requests keeps a downstream with
+    noisy but steady latencies from looking overloaded.
+    """
+
+    def __init__(self, initial: int, max_limit: int, min_limit: int = 1):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.avg_latency = None
+        self.baseline_latency = None
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, overloaded: bool):
+        async with self._condition:
+            self.in_flight -= 1
+            if not overloaded:
+                # Only completed requests say how fast the downstream is; fast
+                # rejections would drag the baseline down
+                if self.avg_latency is None:
+                    self.avg_latency = self.baseline_latency = latency
+                else:
+                    self.avg_latency += RECENT_LATENCY_WEIGHT * (latency - self.avg_latency)
+                    # The baseline follows lasting changes, but slowly
+                    self.baseline_latency += BASELINE_LATENCY_WEIGHT * (latency - self.baseline_latency)
+
+            if overloaded or (self.avg_latency or 0) > (self.baseline_latency or 0) * LATENCY_TOLERANCE:
+                now = time.time()
+                if now - self._last_decrease > (self.avg_latency or 0):
+                    self.limit = max(self.min_limit, self.limit * BACKOFF_RATIO)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+def _retry_after(headers) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header, if any."""
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _retry_delay(attempt: int, retry_after: Optional[float]) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+def _log_with_timestamp(message: str, show_timestamp: bool):
+    if show_timestamp:
+        print(f"\n[{datetime.now().strftime('%H:%M:%S')}] {message}")
+    else:
+        print(f"\n{message}")
+
+async def _send_request(session: aiohttp.ClientSession, url: str, method: str, params: Dict[str, Any],
+                        request_num: int, total: int, batch_progress: BatchProgress, show_timestamp: bool,
+                        limiter: AdaptiveLimiter, max_retries: int, idempotent: bool) -> Dict[str, Any]:
+    """Send one request, retrying failures that are safe to retry."""
+    start_time = time.time()
+    batch_progress.request_started()
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        attempt_start = time.time()
+        status = None
+        headers = None
+        try:
+            # One client span per attempt, children of the span that started the batch
+            with track_outbound('batch_request', urlparse(url).path):
+                async with session.request(method, url, json=params, timeout=TIMEOUT, headers=inject_headers()) as response:
+                    status = response.status
+                    headers = response.headers
+                    response.raise_for_status()
+                    data = await response.json()
+            await limiter.release(time.time() - attempt_start, False)
+            elapsed = time.time() - start_time
+            batch_progress.request_finished(elapsed, True)
+            _log_with_timestamp(f"✓ Request {request_num}/{total} completed successfully: {params['source_id']} ({elapsed:.2f}s)", show_timestamp)
+            return {
+                'success': True,
+                'params': params,
+                'status': status,
+                'data': data,
+                'elapsed': elapsed,
+                'attempts': attempt + 1
+            }
+        except Exception as e:
+            error = e
+            # Errors that point at an overloaded downstream
+            connect_failed = isinstance(e, aiohttp.ClientConnectorError)
+            overloaded = status in OVERLOAD_STATUSES or isinstance(e, (asyncio.TimeoutError, aiohttp.ServerDisconnectedError)) or connect_failed
+            await limiter.release(time.time() - attempt_start, overloaded)
+
+        # Requests that were never processed can always be retried, others only if idempotent
+        retryable = status in REJECTED_STATUSES or connect_failed or (idempotent and (overloaded or status in RETRY_STATUSES))
+        if retryable and attempt < max_retries:
+            delay = _retry_delay(attempt, _retry_after(headers))
+            attempt += 1
+            batch_progress.request_retried()
+            _log_with_timestamp(f"↻ Request {request_num}/{total} retrying in {delay:.1f}s: {params['source_id']} - Error: {str(error)}", show_timestamp)
+            await asyncio.sleep(delay)
+            continue
+
+        elapsed = time.time() - start_time
+        batch_progress.request_finished(elapsed, False)
+        _log_with_timestamp(f"✗ Request {request_num}/{total} failed: {params['source_id']} - Error: {str(error)} ({elapsed:.2f}s)", show_timestamp)
         return {
-            'total': len(results),
-            'success_count': len(successful),
-            'error_count': len(failed),
-            'successful': successful,
-            'failed': failed,
-            'total_time': total_time,
-            'average_time': avg_time
+            'success': False,
+            'params': params,
+            'error': str(error),
+            'status': status,
+            'elapsed': elapsed,
+            'attempts': attempt + 1
         }
 
-def run_batch_request(url: str, params_list: List[Dict[str, Any]], concurrent_limit: int = 5, method: str = 'POST', show_timestamp: bool = False) -> Dict[str, Any]:
-    """Synchronous wrapper for batch_request."""
-    return asyncio.run(batch_request(url, params_list, concurrent_limit, method, show_timestamp))
\ No newline at end of file
+async def iter_batch_request(url: str, params_list: List[Dict[str, Any]], concurrent_limit: int = 5, method: str = 'POST', show_timestamp: bool = False, progress: Optional[str] = None,
+                             max_concurrency: Optional[int] = None, max_retries: int = MAX_RETRIES, idempotent: Optional[bool] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Process multiple requests asynchronously, yielding each result as it completes.
+
+    Concurrency starts at concurrent_limit and adapts between 1 and
+    max_concurrency (AIMD, see AdaptiveLimiter), so the batch settles on what
+    the downstream sustains. Overload failures are retried with jittered
+    exponential backoff, honouring Retry-After. Finished results wait in a
+    bounded queue, so a slow consumer holds back new requests instead of
+    letting results pile up in memory.
+
+    Args:
+        max_concurrency: Upper bound for the adaptive concurrency. Defaults to
+            MAX_CONCURRENCY_FACTOR times concurrent_limit.
+        max_retries: Retries per request.
+        idempotent: Whether failed requests may be repeated after they might
+            have been processed. Defaults to True for idempotent HTTP methods.
+            Requests rejected with 429/503 or that never connected are
+            retried regardless.
+    """
+    method = method.upper()
+    if max_concurrency is None:
+        max_concurrency = concurrent_limit * MAX_CONCURRENCY_FACTOR
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    total = len(params_list)
+    _log_with_timestamp(f"Starting batch request processing...", show_timestamp)
+    _log_with_timestamp(f"Total requests to process: {total}", show_timestamp)
+    _log_with_timestamp(f"Concurrent limit: {concurrent_limit} (adaptive up to {max_concurrency})", show_timestamp)
+
+    # The shared session's connector caps connections per host
+    async with client_session() as session:
+        limiter = AdaptiveLimiter(concurrent_limit, max_concurrency)
+        batch_progress = BatchProgress(total, progress, limiter=limiter)
+        pending = iter(enumerate(params_list, start=1))
+        results = asyncio.Queue(maxsize=max_concurrency)
+        done = object()
+        closed = False
+
+        async def worker():
+            try:
+                for request_num, params in pending:
+                    result = await _send_request(session, url, method, params, request_num, total, batch_progress, show_timestamp,
+                                                 limiter, max_retries, idempotent)
+                    await results.put(result)
+            finally:
+                # Once the consumer has stopped reading, a put into the full
+                # queue would never return and close would wait forever
+                if not closed:
+                    await results.put(done)
+
+        # Workers are only a ceiling, the limiter decides how many send at once
+        worker_count = max(1, min(max_concurrency, total))
+        batch_progress.start()
+        workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+        try:
+            finished = 0
+            while finished < worker_count:
+                result = await results.get()
+                if result is done:
+                    finished += 1
+                    continue
+                yield result
+        finally:
+            closed = True
+            for task in workers:
+                task.cancel()
+            outcomes = await asyncio.gather(*workers, return_exceptions=True)
+            await batch_progress.stop()
+        # A worker that failed outside _send_request dropped the rest of its requests
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                raise outcome
+
+async def batch_request(url: str, params_list: List[Dict[str, Any]], concurrent_limit: int = 5, method: str = 'POST', show_timestamp: bool = False, progress: Optional[str] = None, keep_results: Optional[int] = None, output_path: Optional[str] = None,
+                        max_concurrency: Optional[int] = None, max_retries: int = MAX_RETRIES, idempotent: Optional[bool] = None) -> Dict[str, Any]:
+    """Process multiple requests asynchronously with rate limiting.
+    Progress for the whole batch is reported by one task, see BatchProgress.
+
+    Args:
+        keep_results: Keep at most this many results in the returned
+            'successful' and 'failed' lists. Defaults to all of them, or none
+            when output_path is given. Counts and timings always cover the
+            whole batch.
+        output_path: Append every result to this file as one JSON line as soon
+            as it completes.
+        max_concurrency, max_retries, idempotent: See iter_batch_request.
+    """
+    if keep_results is None and output_path:
+        keep_results = 0
+
+    batch_start_time = time.time()
+    successful = []
+    failed = []
+    success_count = 0
+    error_count = 0
+    elapsed_sum = 0.0
+
+    output = open(output_path, 'a', encoding='utf-8') if output_path else None
+    try:
+        async for result in iter_batch_request(url, params_list, concurrent_limit, method, show_timestamp, progress,
+                                               max_concurrency, max_retries, idempotent):
+            elapsed_sum += result['elapsed']
+            if result['success']:
+                success_count += 1
+                kept = successful
+            else:
+                error_count += 1
+                kept = failed
+            if keep_results is None or len(successful) + len(failed) < keep_results:
+                kept.append(result)
+            if output is not None:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+    finally:
+        if output is not None:
+            output.close()
+
+    processed = success_count + error_count
+    total_time = time.time() - batch_start_time
+    avg_time = elapsed_sum / processed if processed else 0
+
+    print(f"\nBatch processing completed in {total_time:.2f}s:")
+    print(f"Average request time: {avg_time:.2f}s")
+    print(f"Total processed: {processed}")
+    print(f"Successful: {success_count}")
+    print(f"Failed: {error_count}\n")
+
+    return {
+        'total': processed,
+        'success_count': success_count,
+        'error_count': error_count,
+        'successful': successful,
+        'failed': failed,
+        'total_time': total_time,
+        'average_time': avg_time
+    }
+
+@traced
+def run_batch_request(url: str, params_list: List[Dict[str, Any]], concurrent_limit: int = 5, method: str = 'POST', show_timestamp: bool = False, progress: Optional[str] = None, keep_results: Optional[int] = None, output_path: Optional[str] = None,
+                      max_concurrency: Optional[int] = None, max_retries: int = MAX_RETRIES, idempotent: Optional[bool] = None) -> Dict[str, Any]:
+    """Synchronous wrapper for batch_request.
+    Runs on the process's background event loop, reusing its shared session.
+    Pass output_path to stream results to an NDJSON file instead of memory.
+    """
+    return run_async(batch_request(url, params_list, concurrent_limit, method, show_timestamp, progress, keep_results, output_path,
+                                   max_concurrency, max_retries, idempotent))
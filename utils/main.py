@@ -1,17 +1,8 @@
 import json
 import os
 import datetime
-
-def load_api_key(api_key_name):
-    
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    api_key_name = api_key_name.upper()
-    env_value = os.environ.get(api_key_name)
-    if not env_value:
-        raise ValueError(f"Environment variable {api_key_name} not found")    
-    return env_value
+import hashlib
+from typing import Dict, Mapping, Optional, Tuple
 
 def format_datetime(input_datetime_str: str, input_format: str = '%Y-%m-%dT%H:%M:%SZ', output_format: str = '%Y-%m-%d %H:%M:%S') -> str:
     """Convert a datetime string from one format to another."""
@@ -25,3 +16,27 @@ def format_datetime(input_datetime_str: str, input_format: str = '%Y-%m-%dT%H:%M
             # Handle parsing errors
             return None  # Return None if the input string is not valid
     return None  # Return None if the input string is empty
+
+def parse_datetime(value):
+    """Turn an ISO 8601 or 'YYYY-MM-DD HH:MM:SS' string into a datetime; other values pass through.
+
+    MySQL accepts such strings for DATETIME columns, SQLite only datetimes.
+    """
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+def parse_date_range(args: Mapping[str, str]) -> Tuple[Optional[Dict[str, Optional[datetime.date]]], Optional[str]]:
+    """The optional start_date and end_date (YYYY-MM-DD) of query arguments as dates, or an error message."""
+    dates = {}
+    for name in ('start_date', 'end_date'):
+        value = args.get(name)
+        try:
+            dates[name] = datetime.datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            return None, f"{name} must be in YYYY-MM-DD format"
+    return dates, None
+
+def content_hash(text: str) -> str:
+    """Return the SHA-256 hex digest of a text."""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
@@ -1,10 +1,18 @@
-import markdown
-from bs4 import BeautifulSoup
+from utils.tracing import traced
+
+# Bump whenever the markup or styles produced by style_html change, so that
+# process_artefacts_html re-renders artefacts rendered by an older version.
+RENDERER_VERSION = 1
 
 follow_pic = """<section style="text-align: center;margin-left: 16px;margin-right: 16px;"><img class="rich_pages wxw-img" data-type="jpeg" src="https://mmbiz.qpic.cn/mmbiz_jpg/ddoFEEahZice8askrD1Oe0v74LO9QiaiaDaaiabQdYgXicD7oP0jyia370MgjQhicJcHuVSNOtNiaHWTNkFiaIQrlNhFmMA/640?wx_fmt=jpeg&amp;from=appmsg&amp;tp=webp&amp;wxfrom=5&amp;wx_lazy=1&amp;wx_co=1" style="width: 100%; height: auto;" crossorigin="anonymous" alt="图片" data-fail="0"></section>
 <section style="text-align: center;background-color: rgb(255, 255, 255);line-height: 1.75em;margin-top: 24px;margin-bottom: 24px;margin-left: 16px;margin-right: 16px;"><span style="color: rgb(0, 0, 0);font-family: Optima-Regular, PingFangTC-light;font-size: 36px;">💬</span></section><section style="text-align: center;background-color: rgb(255, 255, 255);line-height: 1.75em;margin-bottom: 24px;margin-left: 16px;margin-right: 16px;"><span style="color: rgb(0, 0, 0);font-family: Optima-Regular, PingFangTC-light;letter-spacing: 1px;font-size: 14px;">如果你也是未来领域的关注者，请留言你的回声</span></section>"""
 
+@traced
 def style_html(md_text):
+    # Imported on first render, they are slow to load and most requests never render
+    import markdown
+    from bs4 import BeautifulSoup
+
     # Convert Markdown to HTML
     html = markdown.markdown(md_text)
     
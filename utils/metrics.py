@@ -0,0 +1,90 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+from prometheus_client import CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from utils.tracing import start_span
+
+# Metrics are recorded in process and only rendered when /metrics is scraped.
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) makes
+# every worker write its values to files there, and a scrape of any worker
+# sums them all.
+
+# Buckets for outbound calls, which range from a fast API call to a long
+# transcription or LLM run
+OUTBOUND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent serving a request, by route',
+    ['endpoint', 'method', 'status']
+)
+OUTBOUND_DURATION = Histogram(
+    'outbound_request_duration_seconds', 'Time spent in calls to external services',
+    ['dependency', 'endpoint', 'outcome'], buckets=OUTBOUND_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries made by a request, by route',
+    ['endpoint'], buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Time a request spent in database queries, by route',
+    ['endpoint']
+)
+VIDEOS_INGESTED = Counter('videos_ingested_total', 'New YouTube videos stored')
+TRANSCRIPTS_PRODUCED = Counter('transcripts_produced_total', 'Video transcripts fetched and stored')
+ARTEFACTS_PRODUCED = Counter('artefacts_produced_total', 'Artefacts created or regenerated', ['source'])
+
+# [query count, seconds in queries] of the request being served, if any
+_request_queries: ContextVar[Optional[List[float]]] = ContextVar('request_queries', default=None)
+
+@contextmanager
+def track_outbound(dependency: str, endpoint: str) -> Iterator[None]:
+    """Time a call to an external service. Failures are recorded with outcome="error".
+
+    The call also gets a client span when tracing is on.
+    """
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        with start_span(f"{dependency} {endpoint}", 'client', {'peer.service': dependency, 'endpoint': endpoint}):
+            yield
+        outcome = 'ok'
+    finally:
+        OUTBOUND_DURATION.labels(dependency, endpoint, outcome).observe(time.perf_counter() - start)
+
+def start_request_queries():
+    """Start counting the database queries of the current request."""
+    return _request_queries.set([0, 0.0])
+
+def finish_request_queries(token) -> Tuple[int, float]:
+    """Stop counting and return the request's query count and time in queries."""
+    queries = _request_queries.get()
+    _request_queries.reset(token)
+    return int(queries[0]), queries[1]
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_queries.get() is not None:
+        conn.info['query_start'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _request_queries.get()
+    start = conn.info.pop('query_start', None)
+    if queries is not None and start is not None:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - start
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render all metrics in the Prometheus text format, with their content type."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,368 @@
+"""On-demand CPU and memory profiling of a single request or job.
+
+A sampling profiler records the stacks of the profiled thread (and of the
+async runtime's loop thread, where outbound calls and batches run) every
+PROFILE_SAMPLE_INTERVAL_MS, while tracemalloc traces allocations. Samples are
+wall-clock time, so waiting on a service or the database shows up too. Nothing
+runs unless a profile is started. Each profile is saved to the profile directory as:
+
+    <name>.pstats   sampled times in pstats format (pstats.Stats, snakeviz);
+                    call counts are sample counts
+    <name>.folded   collapsed stacks, for flamegraph.pl or speedscope
+    <name>.svg      a flame graph of the samples
+    <name>.json     summary with the hottest functions and top allocation sites
+
+tracemalloc is process-wide, so only one profile runs per process at a time
+and its allocation sites include other threads' allocations.
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import marshal
+import tempfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from html import escape
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from utils.settings import get_settings
+
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), 'news-aggr-profiles')
+# Frames kept per allocation traceback; more make tracing and the analysis slower
+TRACEMALLOC_FRAMES = 5
+# A snapshot is taken once traced memory grew by this many bytes, and again
+# whenever growth reaches this multiple of the last snapshot's
+PEAK_SNAPSHOT_MIN_GROWTH = 4 * 1024 * 1024
+PEAK_SNAPSHOT_GROWTH = 2
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 25
+PROFILE_SUFFIXES = ('.json', '.pstats', '.folded', '.svg')
+
+# (filename, first line, function name), as pstats keys functions
+Func = Tuple[str, int, str]
+
+_lock = threading.Lock()
+
+def _is_idle(stack: Tuple[Func, ...]) -> bool:
+    # An event loop waiting for I/O
+    filename, _, name = stack[-1]
+    return name in ('select', 'poll') and filename.endswith('selectors.py')
+
+class SamplingProfiler:
+    """Samples the stacks of some threads from a background thread.
+
+    Threads other than the first are recorded under a root frame named after
+    them, e.g. '<async-runtime>', and only when not idle.
+    """
+
+    def __init__(self, threads: Dict[int, Optional[str]], interval: Optional[float] = None, on_sample=None):
+        self.threads = threads
+        self.interval = interval or get_settings().profile_sample_interval_ms / 1000
+        self.on_sample = on_sample
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, root in self.threads.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                # Stopping the profile is not part of the profiled work
+                if any(filename == __file__ for filename, _, _ in stack):
+                    continue
+                stack.reverse()
+                if root is not None:
+                    if _is_idle(tuple(stack)):
+                        continue
+                    stack.insert(0, ('~', 0, root))
+                self.samples[tuple(stack)] += 1
+            self.sample_count += 1
+            del frames
+            if self.on_sample is not None:
+                self.on_sample()
+
+def pstats_dict(samples: Counter, interval: float) -> Dict[Func, tuple]:
+    """Turn samples into the stats dict that cProfile dumps and pstats.Stats loads."""
+    stats: Dict[Func, list] = {}
+    for stack, count in samples.items():
+        seconds = count * interval
+        seen = set()
+        for i, func in enumerate(stack):
+            entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+            # Recursive frames count once towards the inclusive time
+            if func not in seen:
+                seen.add(func)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+            if i:
+                caller = entry[4].setdefault(stack[i - 1], [0, 0, 0.0, 0.0])
+                caller[0] += count
+                caller[1] += count
+                caller[3] += seconds
+                if i == len(stack) - 1:
+                    caller[2] += seconds
+        stats[stack[-1]][2] += seconds
+    return {
+        func: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+        for func, (cc, nc, tt, ct, callers) in stats.items()
+    }
+
+def _frame_label(func: Func) -> str:
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+def folded_stacks(samples: Counter) -> str:
+    """Samples as collapsed stacks, one 'frame;frame;frame count' line each."""
+    return ''.join(
+        f"{';'.join(_frame_label(func).replace(';', ':') for func in stack)} {count}\n"
+        for stack, count in samples.most_common()
+    )
+
+def flame_graph_svg(samples: Counter, title: str, width: int = 1200, row_height: int = 16) -> str:
+    """Render samples as a flame graph, callers below their callees."""
+    tree: Dict[str, Any] = {'count': 0, 'children': {}}
+    for stack, count in samples.items():
+        tree['count'] += count
+        node = tree
+        for func in stack:
+            node = node['children'].setdefault(_frame_label(func), {'count': 0, 'children': {}})
+            node['count'] += count
+
+    total = max(tree['count'], 1)
+    rects: List[Tuple[float, int, float, str, int]] = []
+    depth_max = [0]
+
+    def layout(node: Dict[str, Any], x: float, depth: int):
+        depth_max[0] = max(depth_max[0], depth)
+        for label, child in sorted(node['children'].items()):
+            w = child['count'] / total * width
+            if w >= 0.5:
+                rects.append((x, depth, w, label, child['count']))
+                layout(child, x, depth + 1)
+            x += w
+    layout(tree, 0.0, 0)
+
+    height = (depth_max[0] + 2) * row_height + 24
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="14">{escape(title)} ({total} samples)</text>',
+    ]
+    for x, depth, w, label, count in rects:
+        y = height - (depth + 1) * row_height
+        hue = zlib.crc32(label.encode('utf-8')) % 60
+        parts.append(
+            f'<g><title>{escape(label)}: {count} samples ({count / total:.1%})</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" fill="hsl({hue},85%,60%)"/>'
+        )
+        if w > 30:
+            text = label[:int(w / 7)]
+            parts.append(f'<text x="{x + 2:.1f}" y="{y + row_height - 4}">{escape(text)}</text>')
+        parts.append('</g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+def _top_functions(stats: Dict[Func, tuple]) -> List[Dict[str, Any]]:
+    rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {'function': _frame_label(func), 'self_ms': round(tt * 1000, 1), 'total_ms': round(ct * 1000, 1)}
+        for func, (_, _, tt, ct, _) in rows if tt
+    ]
+
+def _top_allocations(snapshot: Optional[tracemalloc.Snapshot]) -> List[Dict[str, Any]]:
+    """Largest allocation sites of a snapshot, each with the traceback that allocated most there."""
+    if snapshot is None:
+        return []
+    sites: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    # Sorted by size, so a site's first traceback is its largest
+    for stat in snapshot.statistics('traceback'):
+        frame = stat.traceback[-1]
+        if frame.filename in (tracemalloc.__file__, __file__):
+            continue
+        site = sites.get((frame.filename, frame.lineno))
+        if site is None:
+            sites[(frame.filename, frame.lineno)] = {
+                'site': f"{frame.filename}:{frame.lineno}",
+                'size': stat.size,
+                'count': stat.count,
+                'traceback': [f"{f.filename}:{f.lineno}" for f in reversed(stat.traceback)],
+            }
+        else:
+            site['size'] += stat.size
+            site['count'] += stat.count
+    top = sorted(sites.values(), key=lambda site: site['size'], reverse=True)[:TOP_ALLOCATIONS]
+    return [{'site': site['site'], 'size_kb': round(site['size'] / 1024, 1), 'count': site['count'],
+             'traceback': site['traceback']} for site in top]
+
+class ProfileRun:
+    """A running profile of one request or job, see start_profiling."""
+
+    def __init__(self, label: str, threads: Dict[int, Optional[str]]):
+        self.label = label
+        self.started = time.time()
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}-{os.getpid()}-{_slug(label)}"
+        self._start = time.perf_counter()
+        self._own_tracemalloc = not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        self._base_memory = tracemalloc.get_traced_memory()[0]
+        self._snapshot_growth = PEAK_SNAPSHOT_MIN_GROWTH
+        self._peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.profiler = SamplingProfiler(threads, on_sample=self._check_memory)
+        self.profiler.start()
+
+    def _check_memory(self) -> None:
+        # Keep a snapshot from close to the peak, which is what memory spikes
+        # are about. Snapshots are slow, so only take one when memory doubled.
+        growth = tracemalloc.get_traced_memory()[0] - self._base_memory
+        if growth >= self._snapshot_growth:
+            self._peak_snapshot = tracemalloc.take_snapshot()
+            self._snapshot_growth = growth * PEAK_SNAPSHOT_GROWTH
+
+    def stop(self, directory: str, background: bool = True) -> str:
+        """Stop profiling and save the profile files. Returns the profile's name.
+
+        Analysing the allocations takes seconds for large heaps, so by default
+        it is done in a background thread and the files appear once it is done.
+        """
+        try:
+            self.profiler.stop()
+            duration = time.perf_counter() - self._start
+            current, peak = tracemalloc.get_traced_memory()
+            end_snapshot = tracemalloc.take_snapshot()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+        finally:
+            _lock.release()
+        memory = {
+            'peak_kb': round((peak - self._base_memory) / 1024, 1),
+            'retained_kb': round((current - self._base_memory) / 1024, 1),
+        }
+        args = (directory, duration, memory, self._peak_snapshot or end_snapshot, end_snapshot)
+        self._peak_snapshot = None
+        if background:
+            threading.Thread(target=self._save, args=args, name='profile-save').start()
+        else:
+            self._save(*args)
+        return self.name
+
+    def _save(self, directory: str, duration: float, memory: Dict[str, float],
+              peak_snapshot: tracemalloc.Snapshot, end_snapshot: tracemalloc.Snapshot) -> None:
+        samples = self.profiler.samples
+        # The sampler falls behind its interval when the GIL is busy, so
+        # samples stand for an equal share of the measured time
+        interval = duration / max(self.profiler.sample_count, 1)
+        stats = pstats_dict(samples, interval)
+        summary = {
+            'name': self.name,
+            'label': self.label,
+            'pid': os.getpid(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'duration_ms': round(duration * 1000, 1),
+            'sample_interval_ms': round(interval * 1000, 2),
+            'samples': self.profiler.sample_count,
+            'memory': memory,
+            'top_functions': _top_functions(stats),
+            'peak_allocations': _top_allocations(peak_snapshot),
+            'retained_allocations': _top_allocations(end_snapshot),
+            'files': [self.name + suffix for suffix in PROFILE_SUFFIXES],
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.name)
+        with open(base + '.pstats', 'wb') as f:
+            marshal.dump(stats, f)
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            f.write(folded_stacks(samples))
+        with open(base + '.svg', 'w', encoding='utf-8') as f:
+            f.write(flame_graph_svg(samples, self.label))
+        # Written last, since list_profiles goes by the summaries
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        _prune(directory)
+
+def _slug(label: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')[:60] or 'profile'
+
+def start_profiling(label: str) -> Optional[ProfileRun]:
+    """Start profiling the calling thread. Returns None if a profile is already running in this process."""
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        threads: Dict[int, Optional[str]] = {threading.get_ident(): None}
+        from utils.async_runtime import runtime_thread_id
+        loop_thread = runtime_thread_id()
+        if loop_thread is not None and loop_thread != threading.get_ident():
+            threads[loop_thread] = '<async-runtime>'
+        return ProfileRun(label, threads)
+    except BaseException:
+        _lock.release()
+        raise
+
+@contextmanager
+def profiling(label: str, directory: str = DEFAULT_PROFILE_DIR) -> Iterator[Optional[ProfileRun]]:
+    """Profile a block, e.g. a job run outside a request. Yields None if another profile is running."""
+    run = start_profiling(label)
+    try:
+        yield run
+    finally:
+        if run is not None:
+            run.stop(directory, background=False)
+
+def _summaries(directory: str) -> List[Tuple[float, str]]:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (os.path.getmtime(os.path.join(directory, name)), name[:-len('.json')])
+        for name in names if name.endswith('.json')
+    )
+
+def _prune(directory: str) -> None:
+    # Older profiles are deleted beyond the PROFILE_KEEP setting
+    summaries = _summaries(directory)
+    for _, name in summaries[:max(0, len(summaries) - get_settings().profile_keep)]:
+        for suffix in PROFILE_SUFFIXES:
+            try:
+                os.remove(os.path.join(directory, name + suffix))
+            except FileNotFoundError:
+                pass
+
+def list_profiles(directory: str = DEFAULT_PROFILE_DIR) -> List[Dict[str, Any]]:
+    """Summaries of the saved profiles, newest first, without the allocation tracebacks."""
+    profiles = []
+    for _, name in reversed(_summaries(directory)):
+        try:
+            with open(os.path.join(directory, name + '.json'), encoding='utf-8') as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summary['top_functions'] = summary['top_functions'][:5]
+        summary['peak_allocations'] = [{k: v for k, v in a.items() if k != 'traceback'} for a in summary['peak_allocations'][:5]]
+        summary.pop('retained_allocations', None)
+        profiles.append(summary)
+    return profiles
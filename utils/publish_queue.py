@@ -0,0 +1,87 @@
+import os
+import fcntl
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Tuple
+
+@contextmanager
+def repo_file_lock(repo_path: str) -> Iterator[None]:
+    """Hold an exclusive cross-process lock on a repository directory.
+
+    The lock file sits next to the directory rather than inside it, so it
+    survives the directory being removed and cloned again.
+    """
+    lock_path = os.path.abspath(repo_path).rstrip(os.sep) + '.lock'
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class _PendingRun:
+    def __init__(self):
+        self.future = Future()
+        self.coalesced = 0
+
+class PublishQueue:
+    """Serializes publish runs against one repository and coalesces duplicates.
+
+    Runs execute one at a time, holding both an in-process lock and a file
+    lock, so threads and worker processes never share the checkout, index or
+    push. A request whose key matches a run that is queued but not yet started
+    waits for that run and shares its result instead of running again.
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = repo_path
+        self._pending: Dict[Hashable, _PendingRun] = {}
+        self._pending_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+
+    def submit(self, key: Hashable, run: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """Run or join a publish for a key.
+
+        Returns:
+            The run's result and whether this request was coalesced into
+            another request's run. The result's 'coalesced' entry counts the
+            requests that joined the run.
+        """
+        with self._pending_lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.coalesced += 1
+                joined = True
+            else:
+                pending = self._pending[key] = _PendingRun()
+                joined = False
+
+        if joined:
+            return pending.future.result(), True
+
+        with self._run_lock, repo_file_lock(self.repo_path):
+            # Once started, later requests must queue a new run to see newer data
+            with self._pending_lock:
+                del self._pending[key]
+            try:
+                result = run()
+            except Exception as e:
+                pending.future.set_exception(e)
+                raise
+            if isinstance(result, dict):
+                result['coalesced'] = pending.coalesced
+            pending.future.set_result(result)
+            return result, False
+
+_queues: Dict[str, PublishQueue] = {}
+_queues_lock = threading.Lock()
+
+def get_publish_queue(repo_path: str) -> PublishQueue:
+    """Return the process-wide publish queue for a repository path."""
+    repo_path = os.path.realpath(repo_path)
+    with _queues_lock:
+        if repo_path not in _queues:
+            _queues[repo_path] = PublishQueue(repo_path)
+        return _queues[repo_path]
@@ -0,0 +1,147 @@
+import os
+import shutil
+import logging
+import tempfile
+from typing import TYPE_CHECKING, List, Optional
+from utils.settings import get_settings
+
+# GitPython is only imported once a publish runs
+if TYPE_CHECKING:
+    from git import Repo
+
+logger = logging.getLogger(__name__)
+
+# Default location of the publish repository cache, unless PUBLISH_REPO_PATH
+# is set. Point it at a persistent volume so container restarts reuse the clone.
+DEFAULT_PUBLISH_REPO_PATH = os.path.join(tempfile.gettempdir(), 'wpa-md-previews')
+# File in the git directory of clones made by the cache. Only those are ever
+# reset, cleaned or deleted and cloned again.
+CACHE_MARKER = 'news-aggr-publish-cache'
+
+class PublishRepoError(Exception):
+    """The publish repository path holds something the cache must not touch."""
+
+def publish_repo_path(bare: bool = False) -> str:
+    """Configured path of the publish repository cache, or of the bare cache used without a working tree."""
+    settings = get_settings()
+    path = settings.publish_repo_path or DEFAULT_PUBLISH_REPO_PATH
+    if bare:
+        return settings.publish_bare_repo_path or path + '.git'
+    return path
+
+def _is_healthy(repo: 'Repo') -> bool:
+    """Check that the cached repository's metadata and HEAD tree are readable."""
+    from git.exc import GitCommandError
+    try:
+        repo.git.rev_parse('--git-dir')
+        if repo.head.is_valid():
+            repo.git.cat_file('-e', 'HEAD^{tree}')
+        return True
+    except (GitCommandError, ValueError):
+        return False
+
+def _set_sparse_directories(repo: 'Repo', directories: List[str]) -> None:
+    """Limit the working tree to the root files and the given directories."""
+    repo.git.sparse_checkout('set', '--cone', *directories)
+
+def _is_cache(path: str) -> bool:
+    """Whether a directory is a working tree or bare repository cloned by the cache, even a broken one."""
+    return (os.path.exists(os.path.join(path, '.git', CACHE_MARKER))
+            or os.path.exists(os.path.join(path, CACHE_MARKER)))
+
+def _clone(repo_url: str, repo_path: str, directories: List[str], bare: bool) -> 'Repo':
+    """Make a depth-1 clone of the publish repository, sparse or bare."""
+    from git import Repo
+    if os.path.exists(repo_path) and os.listdir(repo_path):
+        # Never delete a directory the cache did not clone, it may hold someone's work
+        if not _is_cache(repo_path):
+            raise PublishRepoError(f"{repo_path} is not empty and was not cloned by the publish cache")
+        shutil.rmtree(repo_path)
+
+    if bare:
+        repo = Repo.clone_from(repo_url, repo_path, depth=1, single_branch=True, bare=True)
+    else:
+        repo = Repo.clone_from(repo_url, repo_path, depth=1, single_branch=True, no_checkout=True)
+    with open(os.path.join(repo.git_dir, CACHE_MARKER), 'w'):
+        pass
+    if bare:
+        return repo
+
+    _set_sparse_directories(repo, directories)
+    if repo.head.is_valid():
+        repo.git.reset('--hard', 'HEAD')
+    return repo
+
+def open_publish_repo(repo_url: str, repo_path: Optional[str] = None, directories: Optional[List[str]] = None,
+                      bare: bool = False) -> 'Repo':
+    """Open the cached publish repository, up to date with the remote.
+
+    The cache is a depth-1 clone whose working tree is sparse-checked-out to
+    the root files plus the given directories, so clone and fetch cost stays
+    flat as the site history grows. A missing or corrupted cache is cloned
+    again, and any local state left over from a failed publish is reset to
+    the remote branch. Only clones made here are reset or replaced; any
+    other repository or directory at repo_path raises PublishRepoError.
+
+    Args:
+        repo_url: Remote URL (with credentials) of the publish repository.
+        repo_path: Directory of the cache. Defaults to publish_repo_path(bare).
+        directories: Top-level directories the caller is going to touch.
+        bare: Keep a bare cache with no working tree at all, for callers that
+            build trees directly in the object database.
+    """
+    from git import Repo
+    from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+    directories = directories or []
+    repo_path = repo_path or publish_repo_path(bare)
+
+    try:
+        repo = Repo(repo_path)
+    except (InvalidGitRepositoryError, NoSuchPathError):
+        repo = None
+
+    if repo is not None and not _is_healthy(repo):
+        logger.warning(f"Publish repository cache at {repo_path} is corrupted, cloning it again")
+        repo = None
+
+    if repo is None:
+        return _clone(repo_url, repo_path, directories, bare)
+    if not _is_cache(repo_path):
+        raise PublishRepoError(f"{repo_path} is a git repository that was not cloned by the publish cache")
+    if repo.bare != bare:
+        kind = 'bare' if repo.bare else 'non-bare'
+        raise PublishRepoError(f"Publish repository cache at {repo_path} is {kind}; "
+                               f"use a separate path for the {'tree' if bare else 'worktree'} backend")
+
+    # A crashed publish can leave the index locked
+    index_lock = os.path.join(repo.git_dir, 'index.lock')
+    if os.path.exists(index_lock):
+        os.remove(index_lock)
+
+    # Update remote URL with credentials
+    repo.remote().set_url(repo_url)
+
+    try:
+        branch = repo.active_branch.name
+        if bare:
+            # Bare clones have no remote-tracking refs, fetch straight into the branch
+            repo.git.fetch('--depth', '1', 'origin', f'+refs/heads/{branch}:refs/heads/{branch}')
+        else:
+            repo.git.fetch('--depth', '1', 'origin', branch)
+    except GitCommandError:
+        if repo.head.is_valid():
+            raise
+        # The remote branch does not exist yet, the first publish creates it
+        if not bare:
+            _set_sparse_directories(repo, directories)
+        return repo
+
+    if bare:
+        repo.git.gc('--auto', '--quiet')
+        return repo
+
+    _set_sparse_directories(repo, directories)
+    repo.git.reset('--hard', 'FETCH_HEAD')
+    repo.git.clean('-fdq')
+    repo.git.gc('--auto', '--quiet')
+    return repo
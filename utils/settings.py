@@ -0,0 +1,163 @@
+import os
+import signal
+import logging
+import threading
+from dataclasses import dataclass, fields
+from typing import Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Settings:
+    """Service configuration, read from the environment and .env once.
+
+    Environment variables take precedence over .env entries. Values needed by
+    only some endpoints are optional here and checked with require() where
+    they are used.
+    """
+    database_url: str
+    # Comma-separated URLs of read replicas, used by read_only service calls
+    database_replica_urls: Optional[str] = None
+    youtube_api_key: Optional[str] = None
+    # Base URL of the YouTube Data API; pointed at benchmarks/standin.py for load tests
+    youtube_api_host: str = 'https://www.googleapis.com'
+    yt_dlp_host: Optional[str] = None
+    wpa_langgraph_host: Optional[str] = None
+    news_aggr_host: Optional[str] = None
+    git_publish_repo: Optional[str] = None
+    # Connections each worker process keeps open, sized by the WSGI server config
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # Seconds to wait for a connection, and to keep one before replacing it
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Per-request SQL profiling: 'header' for requests sending X-SQL-Profile, 'all' for every request
+    sql_profile: Optional[str] = None
+    # Span export: 'file' (to TRACE_FILE), 'otlp' (to OTEL_EXPORTER_OTLP_ENDPOINT) or 'console'; off if unset
+    otel_traces_exporter: Optional[str] = None
+    otel_service_name: str = 'news-aggr'
+    otel_exporter_otlp_endpoint: Optional[str] = None
+    trace_file: Optional[str] = None
+    # Sent as X-Admin-Token to use admin-only features; they are off while unset
+    admin_token: Optional[str] = None
+    # Where on-demand CPU and memory profiles are saved, by default in the temp directory
+    profile_dir: Optional[str] = None
+    # Sampling interval of on-demand profiles, and how many profiles are kept
+    profile_sample_interval_ms: float = 5.0
+    profile_keep: int = 100
+    # Statements run more often than this in one request are reported as N+1 queries
+    sql_profile_n_plus_one: int = 5
+    sql_profile_slow_ms: float = 100.0
+    # Publish repository caches, by default wpa-md-previews(.git) in the temp directory
+    publish_repo_path: Optional[str] = None
+    publish_bare_repo_path: Optional[str] = None
+    # Batch progress: 'tty', 'log', 'off' or 'auto' ('tty' on a terminal, else 'log')
+    batch_progress: str = 'auto'
+    # Connection pool of the shared HTTP session
+    http_connection_limit: int = 200
+    http_per_host_connection_limit: int = 100
+    # Webhook notifications kept for delivery, response text per card, and
+    # seconds spent delivering the rest when a worker exits
+    webhook_outbox_max_size: int = 1000
+    webhook_payload_budget: int = 8000
+    webhook_flush_timeout: float = 10.0
+    # Render processes each web worker keeps for process_artefacts_html
+    render_workers: int = 2
+    # Debugger and reloader of the development server (python main.py)
+    flask_debug: bool = False
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str]) -> 'Settings':
+        values = {}
+        for field in fields(cls):
+            value = env.get(field.name.upper())
+            if not value:
+                continue
+            if field.type is bool:
+                value = value.lower() in ('1', 'true', 'yes')
+            elif field.type is int:
+                try:
+                    value = int(value)
+                except ValueError:
+                    raise ValueError(f"Environment variable {field.name.upper()} must be an integer")
+            elif field.type is float:
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise ValueError(f"Environment variable {field.name.upper()} must be a number")
+            elif field.name.endswith('_host'):
+                value = value.rstrip('/')
+            values[field.name] = value
+        if 'database_url' not in values:
+            raise ValueError("Environment variable DATABASE_URL not found")
+        return cls(**values)
+
+    @property
+    def replica_urls(self) -> List[str]:
+        return [url.strip() for url in (self.database_replica_urls or '').split(',') if url.strip()]
+
+    def require(self, name: str) -> str:
+        """Return a setting that the caller cannot work without."""
+        value = getattr(self, name)
+        if not value:
+            raise ValueError(f"Environment variable {name.upper()} not found")
+        return value
+
+    def redacted(self) -> Dict[str, Optional[str]]:
+        """Settings safe to log: hosts as they are, keys and URLs masked."""
+        redacted = {}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if isinstance(value, str) and not field.name.endswith('_host'):
+                value = '***'
+            redacted[field.name] = value
+        return redacted
+
+_settings: Optional[Settings] = None
+
+_defaults: Dict[str, str] = {}
+
+def set_defaults(**values) -> None:
+    """Set fallbacks for settings that neither the environment nor .env sets.
+
+    For defaults that depend on how the app is served, e.g. the pool size on
+    the WSGI server's threads. Takes effect on the next load.
+    """
+    _defaults.update({name.upper(): str(value) for name, value in values.items()})
+
+def _read_env() -> Dict[str, str]:
+    from dotenv import dotenv_values, find_dotenv
+    env = dict(_defaults)
+    # Read .env without exporting it, so a reload sees edits to it
+    env.update({key: value for key, value in dotenv_values(find_dotenv(usecwd=True)).items() if value is not None})
+    env.update(os.environ)
+    return env
+
+def load_settings() -> Settings:
+    """Read and validate the settings, replacing the current ones."""
+    global _settings
+    _settings = Settings.from_env(_read_env())
+    return _settings
+
+def get_settings() -> Settings:
+    """Return the current settings, loading them on first use."""
+    settings = _settings
+    if settings is None:
+        settings = load_settings()
+    return settings
+
+def reload_settings(*_) -> None:
+    """Reload the settings, keeping the current ones if the new ones are invalid."""
+    try:
+        settings = load_settings()
+        logger.info(f"Settings reloaded: {settings.redacted()}")
+    except Exception as e:
+        logger.error(f"Settings reload failed, keeping the current settings: {str(e)}")
+
+def install_reload_handler() -> bool:
+    """Reload the settings on SIGHUP. Only possible from the main thread."""
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signal.SIGHUP, reload_settings)
+    return True
@@ -0,0 +1,81 @@
+import json
+from typing import Any, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+SITE_URL = 'https://keithhchen.github.io/wpa-md-previews'
+SITE_TITLE = 'WPA Articles'
+
+# Files kept at the root of the publish repository
+MANIFEST_PATH = 'manifest.json'
+ARCHIVE_PATH = 'archive.md'
+FEED_PATH = 'feed.xml'
+
+MANIFEST_VERSION = 1
+# Number of most recent articles in the feed
+FEED_SIZE = 50
+
+def parse_manifest(data: Optional[bytes]) -> Dict[str, Any]:
+    """Parse manifest.json content, starting a new manifest if there is none."""
+    if data:
+        manifest = json.loads(data.decode('utf-8'))
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    return {'version': MANIFEST_VERSION, 'dates': {}}
+
+def update_manifest(manifest: Dict[str, Any], articles_by_date: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Replace the entries of the given dates, leaving every other date as is."""
+    for date_str, articles in articles_by_date.items():
+        manifest['dates'][date_str] = {'articles': articles}
+    # Keep dates newest first so the feed only has to look at the head
+    manifest['dates'] = dict(sorted(manifest['dates'].items(), reverse=True))
+    return manifest
+
+def render_archive(manifest: Dict[str, Any]) -> str:
+    """Render the global index: one line per published date."""
+    lines = [f"# {SITE_TITLE}", ""]
+    for date_str, entry in manifest['dates'].items():
+        lines.append(f"- [{date_str}]({SITE_URL}/{date_str}/) ({len(entry['articles'])})")
+    return "\n".join(lines) + "\n"
+
+def render_feed(manifest: Dict[str, Any]) -> str:
+    """Render an Atom feed of the most recent articles."""
+    entries = []
+    for date_str, entry in manifest['dates'].items():
+        for article in sorted(entry['articles'], key=lambda a: a['published_at'] or '', reverse=True):
+            if not article.get('html'):
+                continue
+            entries.append(article)
+        if len(entries) >= FEED_SIZE:
+            break
+    entries = entries[:FEED_SIZE]
+
+    updated = entries[0]['published_at'] if entries else '1970-01-01T00:00:00'
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        f'  <title>{escape(SITE_TITLE)}</title>',
+        f'  <id>{SITE_URL}/</id>',
+        f'  <link href="{SITE_URL}/" />',
+        f'  <link rel="self" href="{SITE_URL}/{FEED_PATH}" />',
+        f'  <updated>{updated}Z</updated>',
+    ]
+    for article in entries:
+        url = f"{SITE_URL}/{article['html']}"
+        lines.extend([
+            '  <entry>',
+            f'    <title>{escape(article["title"])}</title>',
+            f'    <id>{escape(url)}</id>',
+            f'    <link href="{escape(url)}" />',
+            f'    <updated>{article["published_at"]}Z</updated>',
+            '  </entry>',
+        ])
+    lines.append('</feed>')
+    return "\n".join(lines) + "\n"
+
+def build_site_files(manifest: Dict[str, Any]) -> Dict[str, str]:
+    """Build the root files generated from the manifest, as {path: content}."""
+    return {
+        MANIFEST_PATH: json.dumps(manifest, ensure_ascii=False, indent=1) + "\n",
+        ARCHIVE_PATH: render_archive(manifest),
+        FEED_PATH: render_feed(manifest),
+    }
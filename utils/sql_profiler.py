@@ -0,0 +1,146 @@
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from utils.settings import get_settings
+
+# Slowest statements reported per profile; each shape is explained once
+MAX_SLOW_QUERIES = 10
+# Call sites are the innermost frames in these directories
+SOURCE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIPPED_FILES = (os.path.abspath(__file__),)
+
+_whitespace = re.compile(r'\s+')
+# Expanded IN lists and multi-row VALUES, so they share a shape whatever their length
+_repeated_params = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s)\s*,)+\s*(?:\?|%s|%\(\w+\)s)\s*\)')
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so that runs differing only in parameters compare equal."""
+    return _repeated_params.sub('(?…)', _whitespace.sub(' ', statement).strip())
+
+def _call_site() -> str:
+    """The innermost application frame, outside SQLAlchemy and this module."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(SOURCE_ROOT) and filename not in _SKIPPED_FILES and '/site-packages/' not in filename:
+            return f"{os.path.relpath(filename, SOURCE_ROOT)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return 'unknown'
+
+class SqlProfile:
+    """Statements run while a profile is active, with their durations and call sites."""
+
+    def __init__(self):
+        self.queries: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+
+    def record(self, engine: Engine, statement: str, parameters: Any, duration: float, call_site: str):
+        self.queries.append({
+            'engine': engine,
+            'statement': statement,
+            'parameters': parameters,
+            'duration': duration,
+            'call_site': call_site
+        })
+
+    def summary(self, explain: bool = True) -> Dict[str, Any]:
+        """Totals, N+1 candidates and slow queries, with EXPLAIN output for the latter."""
+        settings = get_settings()
+        shapes: Dict[str, Dict[str, Any]] = {}
+        for query in self.queries:
+            shape = shapes.setdefault(statement_shape(query['statement']), {'count': 0, 'total_ms': 0.0, 'call_sites': set()})
+            shape['count'] += 1
+            shape['total_ms'] += query['duration'] * 1000
+            shape['call_sites'].add(query['call_site'])
+
+        # A statement shape run more often than SQL_PROFILE_N_PLUS_ONE is
+        # reported as N+1, statements slower than SQL_PROFILE_SLOW_MS with
+        # their query plan
+        n_plus_one = [
+            {'statement': statement, 'count': shape['count'], 'total_ms': round(shape['total_ms'], 2),
+             'call_sites': sorted(shape['call_sites'])}
+            for statement, shape in shapes.items() if shape['count'] > settings.sql_profile_n_plus_one
+        ]
+        n_plus_one.sort(key=lambda item: item['count'], reverse=True)
+
+        slow = []
+        plans: Dict[str, Optional[List[str]]] = {}
+        slowest = sorted(self.queries, key=lambda query: query['duration'], reverse=True)[:MAX_SLOW_QUERIES]
+        for query in slowest:
+            if query['duration'] * 1000 < settings.sql_profile_slow_ms:
+                break
+            shape = statement_shape(query['statement'])
+            if explain and shape not in plans:
+                plans[shape] = explain_query(query['engine'], query['statement'], query['parameters'])
+            slow.append({
+                'statement': _whitespace.sub(' ', query['statement']).strip(),
+                'duration_ms': round(query['duration'] * 1000, 2),
+                'call_site': query['call_site'],
+                'plan': plans.get(shape)
+            })
+
+        return {
+            'queries': len(self.queries),
+            'query_ms': round(sum(query['duration'] for query in self.queries) * 1000, 2),
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'distinct_statements': len(shapes),
+            'n_plus_one': n_plus_one,
+            'slow': slow
+        }
+
+_profile: ContextVar[Optional[SqlProfile]] = ContextVar('sql_profile', default=None)
+
+@contextmanager
+def profile_sql() -> Iterator[SqlProfile]:
+    """Record the statements run in this block, e.g. around a job or a request."""
+    profile = SqlProfile()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+def start_profile():
+    """Start profiling the current request; pass the result to stop_profile."""
+    return _profile.set(SqlProfile())
+
+def stop_profile(token) -> SqlProfile:
+    profile = _profile.get()
+    _profile.reset(token)
+    return profile
+
+def explain_query(engine: Engine, statement: str, parameters: Any) -> Optional[List[str]]:
+    """Query plan of a SELECT, on a connection of its own, as text rows."""
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    # The EXPLAIN itself must not be recorded
+    token = _profile.set(None)
+    try:
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+        return [' | '.join(str(value) for value in row) for row in rows]
+    except Exception as e:
+        return [f"EXPLAIN failed: {str(e)}"]
+    finally:
+        _profile.reset(token)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _profile.get() is not None:
+        conn.info['profile_start'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('profile_start', None)
+    profile = _profile.get()
+    if profile is not None and start is not None:
+        duration = time.perf_counter() - start
+        # executemany parameters are a list of rows and cannot be explained
+        profile.record(conn.engine, statement, None if executemany else parameters, duration, _call_site())
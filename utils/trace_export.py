@@ -0,0 +1,210 @@
+"""Span exporters that need no collector, and a waterfall view of their output.
+
+Both exporters encode spans as OTLP/JSON: FileSpanExporter appends each export
+batch to a file as one line, OtlpJsonSpanExporter posts it to an OTLP/HTTP
+collector. To print a trace from the file:
+
+    python -m utils.trace_export [--file news-aggr-traces.jsonl] [--list N] [trace_id]
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import urllib.request
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.trace import StatusCode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = os.path.join(tempfile.gettempdir(), 'news-aggr-traces.jsonl')
+DEFAULT_OTLP_ENDPOINT = 'http://localhost:4318'
+OTLP_TIMEOUT = 10
+WATERFALL_WIDTH = 40
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otlp_value(item) for item in value]}}
+    return {'stringValue': str(value)}
+
+def _otlp_attributes(attributes: Optional[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in (attributes or {}).items()]
+
+def _otlp_span(span: ReadableSpan) -> Dict[str, Any]:
+    return {
+        'traceId': format(span.context.trace_id, '032x'),
+        'spanId': format(span.context.span_id, '016x'),
+        'parentSpanId': format(span.parent.span_id, '016x') if span.parent else '',
+        'name': span.name,
+        # OTLP numbers kinds from 1, leaving 0 for unspecified
+        'kind': span.kind.value + 1,
+        'startTimeUnixNano': str(span.start_time),
+        'endTimeUnixNano': str(span.end_time),
+        'attributes': _otlp_attributes(span.attributes),
+        'events': [
+            {'timeUnixNano': str(e.timestamp), 'name': e.name, 'attributes': _otlp_attributes(e.attributes)}
+            for e in span.events
+        ],
+        'status': {'code': span.status.status_code.value, 'message': span.status.description or ''},
+    }
+
+def encode_spans(spans: Sequence[ReadableSpan]) -> Dict[str, Any]:
+    """Encode finished spans as an OTLP/JSON ExportTraceServiceRequest."""
+    resources: Dict[int, Tuple[Resource, Dict[Any, List[ReadableSpan]]]] = {}
+    for span in spans:
+        scopes = resources.setdefault(id(span.resource), (span.resource, {}))[1]
+        scopes.setdefault(span.instrumentation_scope, []).append(span)
+    return {'resourceSpans': [
+        {
+            'resource': {'attributes': _otlp_attributes(resource.attributes)},
+            'scopeSpans': [
+                {
+                    'scope': {'name': scope.name if scope else '', 'version': (scope.version if scope else '') or ''},
+                    'spans': [_otlp_span(span) for span in scope_spans],
+                }
+                for scope, scope_spans in scopes.items()
+            ],
+        }
+        for resource, scopes in resources.values()
+    ]}
+
+class FileSpanExporter(SpanExporter):
+    """Append each export batch to a file as one line of OTLP/JSON.
+
+    Every line is written with a single append, so worker processes can share
+    the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_FILE):
+        self.path = path
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        line = (json.dumps(encode_spans(spans), ensure_ascii=False) + '\n').encode('utf-8')
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.error(f"Writing spans to {self.path} failed: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+class OtlpJsonSpanExporter(SpanExporter):
+    """Post spans to an OTLP/HTTP collector in the JSON encoding."""
+
+    def __init__(self, endpoint: str = DEFAULT_OTLP_ENDPOINT, timeout: float = OTLP_TIMEOUT):
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        body = json.dumps(encode_spans(spans)).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except Exception as e:
+            logger.error(f"Exporting spans to {self.url} failed: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+def _attribute_value(value: Dict[str, Any]) -> Any:
+    for key in ('stringValue', 'boolValue', 'doubleValue'):
+        if key in value:
+            return value[key]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    if 'arrayValue' in value:
+        return [_attribute_value(item) for item in value['arrayValue'].get('values', [])]
+    return None
+
+def read_traces(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read a trace file into {trace id: spans}, with each span's service name and plain attributes."""
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line).get('resourceSpans', []):
+                resource = {a['key']: _attribute_value(a['value']) for a in resource_spans.get('resource', {}).get('attributes', [])}
+                for scope_spans in resource_spans.get('scopeSpans', []):
+                    for span in scope_spans.get('spans', []):
+                        span = dict(span)
+                        span['service'] = resource.get('service.name', '')
+                        span['attributes'] = {a['key']: _attribute_value(a['value']) for a in span.get('attributes', [])}
+                        traces.setdefault(span['traceId'], []).append(span)
+    return traces
+
+def _start(span: Dict[str, Any]) -> int:
+    return int(span['startTimeUnixNano'])
+
+def _end(span: Dict[str, Any]) -> int:
+    return int(span['endTimeUnixNano'])
+
+def _root(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ids = {span['spanId'] for span in spans}
+    return min((span for span in spans if span.get('parentSpanId') not in ids), key=_start)
+
+def format_waterfall(spans: List[Dict[str, Any]], width: int = WATERFALL_WIDTH) -> str:
+    """Render the spans of one trace as a waterfall, children indented under their parents."""
+    start = min(_start(span) for span in spans)
+    total = max(max(_end(span) for span in spans) - start, 1)
+    ids = {span['spanId'] for span in spans}
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        # Spans whose parent is in another process's trace file start a tree of their own
+        parent = span.get('parentSpanId') if span.get('parentSpanId') in ids else ''
+        children.setdefault(parent, []).append(span)
+
+    lines = [f"trace {spans[0]['traceId']}: {len(spans)} spans, {total / 1e6:.1f} ms"]
+
+    def render(parent: str, depth: int):
+        for span in sorted(children.get(parent, []), key=_start):
+            offset = _start(span) - start
+            duration = _end(span) - _start(span)
+            bar = ' ' * int(offset / total * width) + '█' * max(1, int(duration / total * width))
+            failed = ' ✗' if span.get('status', {}).get('code') == StatusCode.ERROR.value else ''
+            lines.append(f"{offset / 1e6:>9.1f} {duration / 1e6:>9.1f} ms |{bar:<{width}}| {'  ' * depth}{span['name']}{failed}")
+            render(span['spanId'], depth + 1)
+    render('', 0)
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Print a trace from a trace file as a waterfall.')
+    parser.add_argument('trace_id', nargs='?', help='trace to print; defaults to the latest one')
+    parser.add_argument('--file', default=os.environ.get('TRACE_FILE', DEFAULT_TRACE_FILE))
+    parser.add_argument('--list', type=int, metavar='N', help='list the latest N traces instead')
+    args = parser.parse_args()
+
+    traces = read_traces(args.file)
+    if not traces:
+        raise SystemExit(f"No spans in {args.file}")
+    by_start = sorted(traces, key=lambda trace_id: min(_start(span) for span in traces[trace_id]))
+
+    if args.list:
+        for trace_id in by_start[-args.list:]:
+            spans = traces[trace_id]
+            root = _root(spans)
+            started = time.strftime('%H:%M:%S', time.localtime(_start(root) / 1e9))
+            duration = (max(_end(span) for span in spans) - _start(root)) / 1e6
+            print(f"{trace_id}  {started}  {duration:>9.1f} ms  {len(spans):>4} spans  {root['name']}")
+        return
+
+    trace_id = args.trace_id or by_start[-1]
+    if trace_id not in traces:
+        raise SystemExit(f"Trace {trace_id} not found in {args.file}")
+    print(format_waterfall(traces[trace_id]))
+
+if __name__ == '__main__':
+    main()
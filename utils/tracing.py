@@ -0,0 +1,169 @@
+"""Span-based tracing of requests, service functions and outbound calls.
+
+Spans are OpenTelemetry spans. With OTEL_TRACES_EXPORTER unset nothing is set
+up or even imported, and the decorators and context managers here call
+straight through. Exporters:
+
+    file     OTLP/JSON lines appended to TRACE_FILE (see utils.trace_export)
+    otlp     the same encoding posted to OTEL_EXPORTER_OTLP_ENDPOINT/v1/traces
+    console  spans printed to stdout
+"""
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# The SDK takes a while to import, so it is only loaded once tracing is set up
+if TYPE_CHECKING:
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.trace import Span, Tracer
+
+TRACE_EXPORTERS = ('file', 'otlp', 'console')
+# Longest SQL statement kept on a database span
+MAX_STATEMENT_LENGTH = 500
+
+_provider: Optional['TracerProvider'] = None
+_tracer: Optional['Tracer'] = None
+
+def setup_tracing(exporter: Optional[str], service_name: str = 'news-aggr', trace_file: Optional[str] = None,
+                  otlp_endpoint: Optional[str] = None) -> bool:
+    """Start exporting spans with one of TRACE_EXPORTERS. Returns whether tracing is on.
+
+    Spans are exported in batches from a background thread, which the SDK
+    restarts in forked worker processes.
+    """
+    global _provider, _tracer
+    if not exporter or exporter == 'none':
+        return False
+    if exporter not in TRACE_EXPORTERS:
+        raise ValueError(f"OTEL_TRACES_EXPORTER must be one of {', '.join(TRACE_EXPORTERS)} or none")
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from utils.trace_export import FileSpanExporter, OtlpJsonSpanExporter, DEFAULT_TRACE_FILE, DEFAULT_OTLP_ENDPOINT
+    if exporter == 'file':
+        span_exporter = FileSpanExporter(trace_file or DEFAULT_TRACE_FILE)
+    elif exporter == 'otlp':
+        span_exporter = OtlpJsonSpanExporter(otlp_endpoint or DEFAULT_OTLP_ENDPOINT)
+    else:
+        span_exporter = ConsoleSpanExporter()
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    _provider = provider
+    _tracer = provider.get_tracer('news-aggr')
+    return True
+
+def shutdown_tracing() -> None:
+    """Export the spans still queued and stop tracing."""
+    global _provider, _tracer
+    if _provider is not None:
+        _provider.shutdown()
+    _provider = _tracer = None
+
+def tracing_enabled() -> bool:
+    return _tracer is not None
+
+def traced(func: Optional[Callable] = None, *, name: Optional[str] = None) -> Callable:
+    """Run each call of a function in a span named after it, e.g. 'youtube_service.get_videos'.
+
+    Exceptions are recorded on the span and mark it as failed.
+    """
+    def decorate(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.start_as_current_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate(func) if func is not None else decorate
+
+@contextmanager
+def start_span(name: str, kind: str = 'internal', attributes: Optional[Dict[str, Any]] = None) -> Iterator[Optional['Span']]:
+    """Run a block in a child span of the current one. Yields None when tracing is off.
+
+    kind is an OpenTelemetry span kind, e.g. 'client' for outbound calls.
+    """
+    if _tracer is None:
+        yield None
+        return
+    from opentelemetry.trace import SpanKind
+    with _tracer.start_as_current_span(name, kind=SpanKind[kind.upper()], attributes=attributes) as span:
+        yield span
+
+def inject_headers(headers: Optional[Mapping[str, str]] = None) -> Dict[str, str]:
+    """Return request headers with the current trace context (traceparent) added."""
+    headers = dict(headers or {})
+    if _tracer is not None:
+        from opentelemetry import propagate
+        propagate.inject(headers)
+    return headers
+
+def start_server_span(name: str, headers: Mapping[str, str],
+                      attributes: Optional[Dict[str, Any]] = None) -> Tuple['Span', object]:
+    """Start the span of an incoming request, continuing the caller's trace if it sent one.
+
+    The span stays current until end_server_span is called with the returned
+    token, from the same context.
+    """
+    from opentelemetry import context, propagate, trace
+    parent = propagate.extract(headers)
+    span = _tracer.start_span(name, context=parent, kind=trace.SpanKind.SERVER, attributes=attributes)
+    token = context.attach(trace.set_span_in_context(span, parent))
+    return span, token
+
+def end_server_span(span: 'Span', token: object, error: Optional[BaseException] = None) -> None:
+    from opentelemetry import context
+    if error is not None:
+        _record_error(span, error)
+    span.end()
+    context.detach(token)
+
+def _record_error(span: 'Span', error: BaseException) -> None:
+    from opentelemetry.trace import Status, StatusCode
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
+def in_current_context(func: Callable) -> Callable:
+    """Wrap a function so calls from other threads (e.g. an executor) run in the caller's context.
+
+    Context variables, and with them the current span, do not carry over to
+    threads by themselves.
+    """
+    context = contextvars.copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _tracer is not None:
+        from opentelemetry.trace import SpanKind
+        words = statement.split(None, 1)
+        conn.info['trace_span'] = _tracer.start_span(f"db {words[0].upper() if words else 'SQL'}", kind=SpanKind.CLIENT, attributes={
+            'db.system': conn.dialect.name,
+            'db.statement': ' '.join(statement.split())[:MAX_STATEMENT_LENGTH],
+        })
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = conn.info.pop('trace_span', None)
+    if span is not None:
+        span.end()
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    span = connection.info.pop('trace_span', None) if connection is not None else None
+    if span is not None:
+        _record_error(span, exception_context.original_exception)
+        span.end()
@@ -0,0 +1,252 @@
+import os
+import json
+import random
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from utils.async_runtime import get_loop, request_json
+from utils.metrics import track_outbound
+from utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Notifications to the same URL within this window are sent as one card
+BATCH_WINDOW = 2.0
+MAX_BATCH_SIZE = 10
+# Strings and lists longer than this are shortened when summarizing
+SUMMARY_STRING_LENGTH = 200
+SUMMARY_LIST_ITEMS = 3
+
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+SEND_TIMEOUT = 5
+
+
+def _summarize(value: Any, depth: int = 0) -> Any:
+    """Shrink a JSON value: long strings cut, long lists reduced to a few items and a count."""
+    if isinstance(value, str):
+        if len(value) > SUMMARY_STRING_LENGTH:
+            return value[:SUMMARY_STRING_LENGTH] + f"… ({len(value)} chars)"
+        return value
+    if isinstance(value, list):
+        if depth >= 2:
+            return f"<{len(value)} items>"
+        items = [_summarize(item, depth + 1) for item in value[:SUMMARY_LIST_ITEMS]]
+        if len(value) > SUMMARY_LIST_ITEMS:
+            items.append(f"… {len(value) - SUMMARY_LIST_ITEMS} more items")
+        return items
+    if isinstance(value, dict):
+        if depth >= 3:
+            return f"<{len(value)} keys>"
+        return {key: _summarize(item, depth + 1) for key, item in value.items()}
+    return value
+
+def summarize_payload(body: Optional[bytes], budget: Optional[int] = None) -> str:
+    """Render a response body for a card within a character budget.
+
+    JSON bodies are dumped compactly, summarized if that is over budget, and
+    truncated as a last resort. Other bodies are only described. The budget
+    defaults to the WEBHOOK_PAYLOAD_BUDGET setting.
+    """
+    budget = budget or get_settings().webhook_payload_budget
+    if not body:
+        return "(empty response)"
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return f"(non-json response, {len(body)} bytes)"
+
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    if len(text) > budget:
+        text = json.dumps(_summarize(data), ensure_ascii=False, separators=(',', ':'))
+    if len(text) > budget:
+        text = text[:budget] + f"… (truncated, {len(body)} bytes)"
+    return text
+
+def build_card(notifications: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a Feishu interactive message for one or more notifications."""
+    budget = max(500, get_settings().webhook_payload_budget // len(notifications))
+    elements = []
+    for notification in notifications:
+        if elements:
+            elements.append({"tag": "hr"})
+        elements.extend([
+            {
+                "tag": "div",
+                "text": {
+                    "content": f"**Request URL:** {notification['url']}\n**Method:** {notification['method']}\n**Status Code:** {notification['status_code']}",
+                    "tag": "lark_md"
+                }
+            },
+            {
+                "tag": "div",
+                "text": {
+                    "content": f"**Response:**\n```json\n{summarize_payload(notification['body'], budget)}\n```",
+                    "tag": "lark_md"
+                }
+            }
+        ])
+
+    failed = any(notification['status_code'] >= 400 for notification in notifications)
+    if len(notifications) == 1:
+        title = f"API Notification - {notifications[0]['status_code']}"
+    else:
+        title = f"API Notifications - {len(notifications)} requests"
+    return {
+        "msg_type": "interactive",
+        "card": {
+            "config": {
+                "wide_screen_mode": True
+            },
+            "elements": elements,
+            "header": {
+                "template": "red" if failed else "blue",
+                "title": {
+                    "content": title,
+                    "tag": "plain_text"
+                }
+            }
+        }
+    }
+
+class WebhookOutbox:
+    """Queue of webhook notifications delivered by a task on the background loop.
+
+    enqueue() only appends to a deque, so the request path never waits on the
+    webhook. The worker groups notifications per URL, renders them into
+    cards and retries failed deliveries with backoff. Notifications live in
+    memory: flush() delivers them when a worker exits, and they are only lost
+    if the process dies without exiting cleanly.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        max_size = max_size or get_settings().webhook_outbox_max_size
+        self._queue: Deque[Tuple[str, Dict[str, Any]]] = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid = None
+        self._deliveries = set()
+        self.dropped = 0
+        self.delivered = 0
+        self.failed = 0
+
+    def enqueue(self, webhook_url: str, notification: Dict[str, Any]):
+        """Add a notification for a webhook URL. Never blocks on delivery."""
+        loop = self._ensure_worker()
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((webhook_url, notification))
+        loop.call_soon_threadsafe(self._wakeup.set)
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def _ensure_worker(self) -> asyncio.AbstractEventLoop:
+        loop = get_loop()
+        with self._lock:
+            # The loop is replaced after a fork, and the worker with it
+            if self._loop is not loop or self._pid != os.getpid():
+                self._loop = loop
+                self._pid = os.getpid()
+                self._queue.clear()
+                self._wakeup = asyncio.Event()
+                asyncio.run_coroutine_threadsafe(self._run(), loop)
+        return loop
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        """Deliver the queued notifications without waiting out the batch window.
+
+        Also waits for deliveries already in flight, retries included, for at
+        most timeout seconds (the WEBHOOK_FLUSH_TIMEOUT setting by default).
+        Returns the number of cards still undelivered.
+        """
+        timeout = timeout or get_settings().webhook_flush_timeout
+        with self._lock:
+            loop = self._loop if self._pid == os.getpid() else None
+        if loop is None or loop.is_closed():
+            # Nothing was enqueued in this process
+            return 0
+        future = asyncio.run_coroutine_threadsafe(self._flush(timeout), loop)
+        try:
+            undelivered = future.result(timeout + 1)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            undelivered = len(self._deliveries)
+        if undelivered:
+            logger.warning(f"{undelivered} webhook notification cards undelivered after {timeout}s")
+        return undelivered
+
+    async def _flush(self, timeout: float) -> int:
+        self._dispatch()
+        if self._deliveries:
+            await asyncio.wait(set(self._deliveries), timeout=timeout)
+        return len(self._deliveries)
+
+    def _take_batches(self) -> Dict[str, List[Dict[str, Any]]]:
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            while self._queue:
+                webhook_url, notification = self._queue.popleft()
+                batches.setdefault(webhook_url, []).append(notification)
+        return batches
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Let notifications that arrive close together share a card
+            await asyncio.sleep(BATCH_WINDOW)
+            self._wakeup.clear()
+            self._dispatch()
+
+    def _dispatch(self):
+        """Start delivering everything queued, one card per URL and batch."""
+        for webhook_url, notifications in self._take_batches().items():
+            for i in range(0, len(notifications), MAX_BATCH_SIZE):
+                task = asyncio.create_task(self._deliver(webhook_url, notifications[i:i + MAX_BATCH_SIZE]))
+                # The loop only keeps weak references to tasks
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, webhook_url: str, notifications: List[Dict[str, Any]]):
+        message = build_card(notifications)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with track_outbound('feishu', 'webhook'):
+                    data = await request_json('POST', webhook_url, json=message, timeout=SEND_TIMEOUT)
+                    # Feishu reports errors such as rate limiting in the body with a 200
+                    if isinstance(data, dict) and data.get('code', 0) != 0:
+                        raise RuntimeError(f"webhook error {data.get('code')}: {data.get('msg')}")
+                self.delivered += len(notifications)
+                logger.info(f"Webhook notification sent to {webhook_url} ({len(notifications)} requests)")
+                return
+            except Exception as e:
+                if attempt == MAX_RETRIES:
+                    self.failed += len(notifications)
+                    logger.error(f"Failed to send webhook notification to {webhook_url}: {str(e)}")
+                    return
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                logger.warning(f"Webhook notification to {webhook_url} failed, retrying in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
+
+_outbox: Optional[WebhookOutbox] = None
+_outbox_lock = threading.Lock()
+
+def get_webhook_outbox() -> WebhookOutbox:
+    """Return the process-wide webhook outbox."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = WebhookOutbox()
+        return _outbox
+
+def flush_webhook_outbox(timeout: Optional[float] = None) -> int:
+    """Flush the process's webhook outbox, if it has one. See WebhookOutbox.flush."""
+    with _outbox_lock:
+        outbox = _outbox
+    return outbox.flush(timeout) if outbox is not None else 0